@@ -1,11 +1,18 @@
 import asyncio
+import inspect
+from memory.retrieval import retriever
 from memory.shared_memory import shared_memory
 from abc import ABC, abstractmethod
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Dict, Optional, List, Any
 from utils.project_manager import ProjectManager
-import google.generativeai as genai
-from utils.config import get_gemini_config, get_gemini_response
+from utils.config import get_context_budget_config, get_retention_config
+from utils.llm_manager import llm_manager
+from utils.metrics import AGENT_CONTEXT_TOKENS, AGENT_ERRORS, AGENT_REQUEST_DURATION
+from utils.provider_sessions import provider_sessions
+from utils.state_store import state_store
+from utils.token_budget import ContextBudget
+from utils.tracing import tracer
 
 class BaseAgent(ABC, BaseModel):
     """Base class for all agents in the system."""
@@ -14,9 +21,10 @@ class BaseAgent(ABC, BaseModel):
     goal: str = Field(..., description="The goal of the agent")
     backstory: str = Field(..., description="The backstory of the agent")
     project_manager: Optional[ProjectManager] = Field(None, description="Project manager instance")
-    memory: Any = Field(default=shared_memory, description="Shared memory instance")
-    conversations: List[Dict[str, Any]] = Field(default_factory=list, description="List of conversations")
+    memory: Any = Field(default_factory=lambda: shared_memory, description="Shared memory instance")
     gemini_config: Dict[str, Any] = Field(default_factory=dict, description="Gemini API configuration")
+    # Rendered other-agent context keyed by the memory version and settings it was built from
+    _rendered_context: Dict[str, Any] = PrivateAttr(default_factory=dict)
     
     model_config = {
         "arbitrary_types_allowed": True,
@@ -28,64 +36,179 @@ class BaseAgent(ABC, BaseModel):
                     "backstory": "Experienced software engineer with expertise in multiple programming languages",
                     "project_manager": None,
                     "memory": None,
-                    "conversations": [],
                     "gemini_config": {}
                 }
             ]
         }
     }
     
-    def __init__(self, **data):
-        super().__init__(**data)
-        # Initialize Gemini configuration
-        self.gemini_config = get_gemini_config()
+    def get_gemini_config(self) -> Dict[str, Any]:
+        """Get the Gemini configuration, loading it (and the Gemini SDK) on first use."""
+        if not self.gemini_config:
+            self.gemini_config = provider_sessions.get_config("gemini")
+        return self.gemini_config
     
     @abstractmethod
     def _generate_response(self, message: str, context: Dict[str, Any] = None) -> str:
-        """Generate a response based on the input message and context."""
+        """Generate a response based on the input message and context.
+        
+        Implementations may be coroutines so that LLM calls do not block the event loop.
+        """
         pass
     
+    def _build_other_context(self, context: Dict[str, Any] = None, link: str = " → ") -> str:
+        """Summarize the latest exchange of every other agent within this agent's context token budget.
+        
+        The most recent exchanges are kept first; long ones are trimmed and the oldest are dropped
+        once the budget is used up, so prompt size stays bounded as history grows. Summaries of the
+        other agents' trimmed history fill what is left of the budget. The result is reused until
+        another agent adds a message, when the memory provides context versions.
+        
+        When snippets relevant to the message were retrieved, only those are used instead.
+        """
+        if not context:
+            return ""
+        
+        config = get_context_budget_config(self.role)
+        provider = llm_manager.get_current_provider()
+        model = llm_manager.get_current_model(provider)
+        if context.get("retrieved"):
+            return self._build_retrieved_context(context["retrieved"], config, provider, model)
+        if "all_conversations" not in context:
+            return ""
+        
+        cache_key = None
+        if "versions" in context:
+            cache_key = (context["versions"]["others"], link, provider, model, config["max_tokens"], config["max_entry_tokens"])
+            if self._rendered_context.get("key") == cache_key:
+                AGENT_CONTEXT_TOKENS.observe(self._rendered_context["used_tokens"], role=self.role)
+                return self._rendered_context["text"]
+        
+        latest_exchanges = [
+            (agent, convos[-1]) for agent, convos in context["all_conversations"].items()
+            if agent != self.role and convos
+        ]
+        latest_exchanges.sort(key=lambda item: item[1].get("timestamp", ""), reverse=True)
+        
+        budget = ContextBudget(
+            config["max_tokens"],
+            provider=provider,
+            model=model,
+            max_section_tokens=config["max_entry_tokens"]
+        )
+        for priority, (agent, latest) in enumerate(latest_exchanges):
+            budget.add(agent, f"{agent} discussed: {latest['user_message']}{link}{latest['agent_response']}", priority)
+        summaries = sorted(
+            ((agent, summary) for agent, summary in (context.get("summaries") or {}).items() if agent != self.role),
+            key=lambda item: item[1].get("last_timestamp", ""), reverse=True
+        )
+        for priority, (agent, summary) in enumerate(summaries, start=len(latest_exchanges)):
+            budget.add(f"{agent} summary", f"Earlier with {agent} ({summary['messages']} exchanges):\n{summary['text']}", priority)
+        
+        other_context = budget.build()
+        other_context = other_context + "\n" if other_context else ""
+        AGENT_CONTEXT_TOKENS.observe(budget.stats["used_tokens"], role=self.role)
+        if cache_key is not None:
+            self._rendered_context = {"key": cache_key, "text": other_context, "used_tokens": budget.stats["used_tokens"]}
+        return other_context
+    
+    def _build_retrieved_context(self, retrieved: List[Dict[str, Any]], config: Dict[str, Any],
+                                 provider: str, model: str) -> str:
+        """Fit the retrieved snippets, most relevant first, into the context token budget."""
+        budget = ContextBudget(config["max_tokens"], provider=provider, model=model,
+                               max_section_tokens=config["max_entry_tokens"])
+        for priority, snippet in enumerate(retrieved):
+            budget.add(snippet["id"], snippet["document"], priority)
+        
+        other_context = budget.build()
+        AGENT_CONTEXT_TOKENS.observe(budget.stats["used_tokens"], role=self.role)
+        return other_context + "\n" if other_context else ""
+    
+    async def _with_retrieved(self, message: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Add the indexed snippets most relevant to message to the context, when retrieval is enabled."""
+        if not retriever.enabled:
+            return context
+        # The memory snapshot is shared, so add the retrieved snippets to a copy
+        return {**(context or {}), "retrieved": await retriever.aretrieve(message, exclude_agent=self.role)}
+    
+    async def add_retrieved_context(self, message: str) -> str:
+        """Prefix a message with the retrieved snippets, for callers that send it to the LLM directly."""
+        context = await self._with_retrieved(message)
+        if not context or not context.get("retrieved"):
+            return message
+        config = get_context_budget_config(self.role)
+        provider = llm_manager.get_current_provider()
+        model = llm_manager.get_current_model(provider)
+        retrieved = self._build_retrieved_context(context["retrieved"], config, provider, model)
+        return f"Relevant context from the team:\n{retrieved}\n{message}" if retrieved else message
+    
+    async def _respond(self, message: str, context: Dict[str, Any] = None) -> str:
+        """Call _generate_response with the retrieved context and await it if the agent implements it asynchronously."""
+        context = await self._with_retrieved(message, context)
+        response = self._generate_response(message, context)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+    
     async def execute(self, task: str):
         """Execute a task."""
-        try:
-            response = self._generate_response(f"Please execute this task: {task}")
-            self.add_conversation("system", f"Task: {task}")
-            self.add_conversation("agent", response)
-            return response
-        except Exception:
-            return False
+        with tracer.span("BaseAgent.execute", role=self.role) as span, \
+                AGENT_REQUEST_DURATION.time(role=self.role, operation="execute"):
+            try:
+                response = await self._respond(f"Please execute this task: {task}")
+                self.add_conversation("system", f"Task: {task}")
+                self.add_conversation("agent", response)
+                retriever.index_exchange(self.role, f"Task: {task}", response)
+                return response
+            except Exception as e:
+                AGENT_ERRORS.inc(role=self.role, operation="execute")
+                if span is not None:
+                    span.record_error(e)
+                return False
     
     async def chat(self, message: str):
         """Process a chat message and return a response"""
-        # Get context for this agent including shared knowledge
-        context = self.memory.get_agent_context(self.role)
-        
-        # Generate a response based on the message and context
-        response = self._generate_response(message, context)
-        
-        # Store the conversation in memory
-        self.memory.add_message(self.role, message, response)
-        
-        return response
+        with tracer.span("BaseAgent.chat", role=self.role), \
+                AGENT_REQUEST_DURATION.time(role=self.role, operation="chat"):
+            try:
+                # Get context for this agent including shared knowledge
+                context = self.memory.get_agent_context(self.role)
+                
+                # Generate a response based on the message and context
+                response = await self._respond(message, context)
+            except Exception:
+                AGENT_ERRORS.inc(role=self.role, operation="chat")
+                raise
+            
+            # Store the conversation in memory
+            self.memory.add_message(self.role, message, response)
+            retriever.index_exchange(self.role, message, response)
+            
+            return response
     
     def set_project_manager(self, project_manager: ProjectManager):
         """Set the project manager for this agent"""
         self.project_manager = project_manager
 
+    @property
+    def conversations(self) -> List[Dict[str, Any]]:
+        """The agent's conversation history, shared by all API workers."""
+        return self.get_conversations()
+
     def add_conversation(self, role: str, content: str):
         """Add a conversation entry to the agent's history."""
-        self.conversations.append({
+        state_store.append("agent_conversations", self.role, {
             "role": role,
             "content": content
-        })
+        }, max_length=get_retention_config()["agent_conversations_max"])
     
     def get_conversations(self) -> List[Dict[str, Any]]:
         """Get the agent's conversation history."""
-        return self.conversations
+        return state_store.get_list("agent_conversations", self.role)
     
     def clear_conversations(self):
         """Clear the agent's conversation history."""
-        self.conversations = []
+        state_store.clear_list("agent_conversations", self.role)
     
     # File operations methods (can be used by any agent)
     def create_file(self, project_name: str, file_path: str, content: str) -> Dict[str, Any]:
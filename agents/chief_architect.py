@@ -1,10 +1,9 @@
 from agents.base_agent import BaseAgent
-from utils.config import get_gemini_response
+from utils.llm_manager import llm_manager
 from utils.project_manager import ProjectManager
 import os
 import uuid
 from typing import Dict, Any, List
-import google.generativeai as genai
 
 class ChiefArchitect(BaseAgent):
     """Chief Architect agent responsible for high-level system design and architecture."""
@@ -21,25 +20,20 @@ class ChiefArchitect(BaseAgent):
         if not self.project_manager:
             self.project_manager = ProjectManager("projects")
     
-    def _generate_response(self, message: str, context: Dict = None) -> str:
+    async def _generate_response(self, message: str, context: Dict = None) -> str:
         """Generate a response based on the input message."""
         # Get relevant context from other agents
-        other_context = ""
-        if context and "all_conversations" in context:
-            for agent, convos in context["all_conversations"].items():
-                if agent != self.role and convos:
-                    latest = convos[-1]
-                    other_context += f"{agent} discussed: {latest['user_message']} → {latest['agent_response']}\n"
+        other_context = self._build_other_context(context)
         
         # Check if the message is about project management
         if "create project" in message.lower() or "new project" in message.lower():
-            return self._handle_project_creation(message)
+            return await self._handle_project_creation(message)
         elif "plan" in message.lower() or "architecture" in message.lower():
             return self._handle_project_planning(message)
         elif "assign" in message.lower() or "task" in message.lower():
             return self._handle_task_assignment(message)
             
-        # Generate response using Gemini
+        # Generate response using the configured LLM provider
         prompt = f"""As the Chief Architect, respond to the following message:
         {message}
         
@@ -48,16 +42,16 @@ class ChiefArchitect(BaseAgent):
         
         Provide a professional and technical response focusing on architecture, system design, and technical decisions."""
         
-        return get_gemini_response(prompt)
+        return await llm_manager.generate_response(prompt, agent=self.role)
     
-    def _handle_project_creation(self, message):
+    async def _handle_project_creation(self, message):
         """Handle project creation request"""
         try:
             # Extract project details from message
             prompt = f"""Extract project name and description from this message: {message}
             Return in format: {{"name": "project_name", "description": "project_description"}}"""
             
-            project_info = get_gemini_response(prompt)
+            project_info = await llm_manager.generate_response(prompt, agent=self.role)
             project_info = eval(project_info)  # Convert string to dict
             
             # Create project
@@ -1,5 +1,5 @@
 from agents.base_agent import BaseAgent
-from config.gemini_config import get_gemini_response
+from utils.llm_manager import llm_manager
 
 class FrontendEngineer(BaseAgent):
     def __init__(self):
@@ -9,14 +9,10 @@ class FrontendEngineer(BaseAgent):
             backstory="Expert in modern frontend frameworks like React, Next.js, and UI/UX best practices."
         )
     
-    def _generate_response(self, message, context):
-        """Generate a response based on the message and context using Gemini API"""
+    async def _generate_response(self, message, context=None):
+        """Generate a response based on the message and context using the configured LLM provider"""
         # Get context from other agents
-        other_context = ""
-        for agent, convos in context["all_conversations"].items():
-            if agent != self.role and convos:
-                latest = convos[-1]
-                other_context += f"{agent} discussed: {latest['user_message']} → {latest['agent_response']}\n"
+        other_context = self._build_other_context(context)
         
         # Create a professional prompt for Gemini
         prompt = f"""You are an expert Frontend Engineer specializing in modern web development. 
@@ -30,6 +26,6 @@ class FrontendEngineer(BaseAgent):
         Please provide a professional and detailed response focusing on frontend development best practices, 
         modern frameworks, and practical implementation advice. Include specific technical details and code examples when relevant."""
         
-        # Get response from Gemini
-        response = get_gemini_response(prompt)
+        # Get response from the configured LLM provider
+        response = await llm_manager.generate_response(prompt, agent=self.role)
         return response
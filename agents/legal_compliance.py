@@ -1,5 +1,5 @@
 from agents.base_agent import BaseAgent
-from utils.config import get_gemini_response
+from utils.llm_manager import llm_manager
 
 class LegalCompliance(BaseAgent):
     def __init__(self, **data):
@@ -10,15 +10,10 @@ class LegalCompliance(BaseAgent):
         })
         super().__init__(**data)
     
-    def _generate_response(self, message, context=None):
-        """Generate a response based on the message and context using Gemini API"""
+    async def _generate_response(self, message, context=None):
+        """Generate a response based on the message and context using the configured LLM provider"""
         # Get context from other agents
-        other_context = ""
-        if context and "all_conversations" in context:
-            for agent, convos in context["all_conversations"].items():
-                if agent != self.role and convos:
-                    latest = convos[-1]
-                    other_context += f"{agent} discussed: {latest['user_message']} → {latest['agent_response']}\n"
+        other_context = self._build_other_context(context)
         
         # Create a professional prompt for Gemini
         prompt = f"""You are an expert Legal Compliance Officer specializing in legal requirements and data protection.
@@ -33,6 +28,6 @@ class LegalCompliance(BaseAgent):
         data protection requirements, regulatory frameworks, and practical implementation guidance. Include specific
         legal considerations, compliance strategies, and risk management approaches when relevant."""
         
-        # Get response from Gemini
-        response = get_gemini_response(prompt)
+        # Get response from the configured LLM provider
+        response = await llm_manager.generate_response(prompt, agent=self.role)
         return response
@@ -8,17 +8,13 @@ class MarketingSales(BaseAgent):
             backstory="Expert in digital marketing, lead generation, and enterprise sales."
         )
     
-    def _generate_response(self, message, context):
+    def _generate_response(self, message, context=None):
         """Generate a response based on the message and context"""
         # In a real implementation, this would use an LLM
         # For now, we're using a simple response
         
         # Check if we have relevant context from other agents
-        other_context = ""
-        for agent, convos in context["all_conversations"].items():
-            if agent != self.role and convos:
-                latest = convos[-1]
-                other_context += f"{agent} discussed: {latest['user_message']} - {latest['agent_response']}\n"
+        other_context = self._build_other_context(context, link=" - ")
         
         if "campaign" in message.lower():
             return f"For marketing campaigns, I recommend a multi-channel approach aligned with our target audience personas. {other_context}"
@@ -1,5 +1,5 @@
 from agents.base_agent import BaseAgent
-from config.gemini_config import get_gemini_response
+from utils.llm_manager import llm_manager
 
 class ProductManager(BaseAgent):
     def __init__(self):
@@ -9,14 +9,10 @@ class ProductManager(BaseAgent):
             backstory="Expert in product management, user research, and agile methodologies."
         )
 
-    def _generate_response(self, message, context):
-        """Generate a response based on the message and context using Gemini API"""
+    async def _generate_response(self, message, context=None):
+        """Generate a response based on the message and context using the configured LLM provider"""
         # Get context from other agents
-        other_context = ""
-        for agent, convos in context["all_conversations"].items():
-            if agent != self.role and convos:
-                latest = convos[-1]
-                other_context += f"{agent} discussed: {latest['user_message']} → {latest['agent_response']}\n"
+        other_context = self._build_other_context(context)
         
         # Create a professional prompt for Gemini
         prompt = f"""You are an expert Product Manager specializing in product strategy, requirements gathering, and roadmap planning.
@@ -31,6 +27,6 @@ class ProductManager(BaseAgent):
         requirement analysis, roadmap planning, and stakeholder communication. Include specific
         methodologies, tools, and strategic insights when relevant."""
         
-        # Get response from Gemini
-        response = get_gemini_response(prompt)
+        # Get response from the configured LLM provider
+        response = await llm_manager.generate_response(prompt, agent=self.role)
         return response
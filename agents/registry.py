@@ -0,0 +1,83 @@
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+# Agent name -> "module:Class"; classes are imported only when the agent is first needed
+AGENT_CLASSES = {
+    "chiefArchitect": "agents.chief_architect:ChiefArchitect",
+    "frontendEngineer": "agents.frontend_engineer:FrontendEngineer",
+    "backendEngineer": "agents.backend_engineer:BackendEngineer",
+    "devopsEngineer": "agents.devops_engineer:DevOpsEngineer",
+    "aiMlEngineer": "agents.ai_ml_engineer:aIMLEngineer",
+    "productManager": "agents.product_manager:ProductManager",
+    "uiUxDesigner": "agents.ui_ux_designer:uIUXDesigner",
+    "technicalWriter": "agents.technical_writer:TechnicalWriter",
+    "customerSuccess": "agents.customer_success:CustomerSuccess",
+    "legalCompliance": "agents.legal_compliance:LegalCompliance",
+    "marketingSales": "agents.marketing_sales:MarketingSales",
+}
+
+
+class AgentRegistry(Mapping):
+    """Read-only mapping of agent name to agent instance that builds each agent on first access.
+
+    Membership checks and key listings never build an agent; iterating values() or items()
+    builds all of them.
+    """
+
+    def __init__(self, project_manager=None, agent_classes: Optional[Dict[str, str]] = None, lazy: bool = True):
+        self.project_manager = project_manager
+        self.agent_classes = dict(agent_classes or AGENT_CLASSES)
+        self.lazy = lazy
+        self._agents: Dict[str, Any] = {}
+        self._build_times: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        if not lazy:
+            self.preload(list(self.agent_classes))
+
+    def _build(self, name: str):
+        module_name, _, class_name = self.agent_classes[name].partition(":")
+        started = time.perf_counter()
+        agent_class = getattr(importlib.import_module(module_name), class_name)
+        agent = agent_class()
+        # Keep the manager an agent creates for itself (ChiefArchitect) when the registry has none
+        if self.project_manager is not None:
+            agent.project_manager = self.project_manager
+        self._build_times[name] = round(time.perf_counter() - started, 4)
+        return agent
+
+    def __getitem__(self, name: str):
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self.agent_classes:
+            raise KeyError(name)
+        with self._lock:
+            if name not in self._agents:
+                self._agents[name] = self._build(name)
+            return self._agents[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.agent_classes
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.agent_classes)
+
+    def __len__(self) -> int:
+        return len(self.agent_classes)
+
+    def preload(self, names: List[str]):
+        """Build the named agents now, e.g. to warm the ones that serve most traffic"""
+        for name in names:
+            if name in self.agent_classes:
+                self[name]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "lazy": self.lazy,
+            "registered": len(self.agent_classes),
+            "initialized": list(self._agents.keys()),
+            "build_seconds": dict(self._build_times),
+        }
@@ -0,0 +1,370 @@
+"""End-to-end HTTP load test for the FastAPI app in main.py.
+
+Runs every scenario against the real app (in-process over ASGI by default, or a running
+server with --base-url) with LLM calls served by the local mock provider, then prints
+throughput, latency percentiles and error rates as JSON.
+
+    python -m benchmarks.load_test                          # run and compare with baseline.json
+    python -m benchmarks.load_test --scenarios chat,execute --requests 500 --concurrency 50
+    python -m benchmarks.load_test --update-baseline        # store the results as the new baseline
+
+Exits with status 1 when any scenario regresses past --tolerance relative to the baseline.
+The committed baseline.json is specific to the machine and code it was measured on; rerun with
+--update-baseline on your own machine before comparing, and again after changing a measured path.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_provider(latency: str) -> str:
+    """Start the mock LLM provider on a background thread and return its base URL"""
+    import uvicorn
+    from utils.mock_llm_server import create_app, get_mock_server_config
+
+    config = get_mock_server_config()
+    config["latency"] = latency
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Mock LLM provider did not start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def make_fixture_directory(root: str, files: int = 20) -> str:
+    """Create a small source tree used by the project import scenarios"""
+    source = os.path.join(root, "fixture_project")
+    for i in range(files):
+        path = os.path.join(source, "src" if i % 2 else "docs", f"module_{i}.py")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(f"# module {i}\n" + "value = 1\n" * 50)
+    return source
+
+
+def make_fixture_zip(source: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for root, _, filenames in os.walk(source):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                archive.write(path, os.path.relpath(path, os.path.dirname(source)))
+    return buffer.getvalue()
+
+
+class Scenario:
+    """One benchmarked operation: an optional setup and a request issued once per iteration"""
+
+    def __init__(self, name: str, request: Callable[[Any, int], Awaitable[Any]],
+                 setup: Optional[Callable[[Any, int], Awaitable[None]]] = None):
+        self.name = name
+        self.request = request
+        self.setup = setup
+
+
+def build_scenarios(fixture_dir: str, fixture_zip: bytes) -> Dict[str, Scenario]:
+    """Define the scenarios; each request coroutine returns the httpx response"""
+    run_id = uuid.uuid4().hex[:8]
+    project = f"bench_{run_id}"
+    state: Dict[str, Any] = {"task_ids": []}
+
+    async def ensure_project(client, total):
+        if state.get("project_ready"):
+            return
+        response = await client.post("/api/projects", json={"name": project, "description": "Load test project"})
+        response.raise_for_status()
+        state["project_ready"] = True
+
+    async def setup_files(client, total):
+        await ensure_project(client, total)
+        for i in range(total):
+            for prefix in ("read", "update", "delete"):
+                await client.post("/api/files", json={
+                    "project_name": project,
+                    "file_path": f"src/{prefix}_{i}.txt",
+                    "content": "seed content\n" * 20
+                })
+
+    async def setup_tasks(client, total):
+        await ensure_project(client, total)
+        for i in range(total):
+            response = await client.post(f"/api/tasks?project_name={project}", json={
+                "name": f"Seed task {i}",
+                "assigned_to": "backendEngineer"
+            })
+            state["task_ids"].append(response.json()["task"]["id"])
+
+    async def chat(client, i):
+        return await client.post("/api/chat", json={"message": f"Benchmark question {run_id}-{i}", "agent": "backendEngineer"})
+
+    async def execute(client, i):
+        return await client.post("/api/execute", json={"task": f"Benchmark task {run_id}-{i}", "agent": "frontendEngineer"})
+
+    async def file_create(client, i):
+        return await client.post("/api/files", json={
+            "project_name": project,
+            "file_path": f"src/create_{i}.txt",
+            "content": "created content\n" * 20
+        })
+
+    async def file_read(client, i):
+        return await client.get("/api/files", params={"project_name": project, "file_path": f"src/read_{i}.txt"})
+
+    async def file_update(client, i):
+        return await client.put("/api/files", json={
+            "project_name": project,
+            "file_path": f"src/update_{i}.txt",
+            "content": f"updated content {i}\n" * 20
+        })
+
+    async def file_delete(client, i):
+        return await client.request("DELETE", "/api/files", json={
+            "project_name": project,
+            "file_path": f"src/delete_{i}.txt"
+        })
+
+    async def file_list(client, i):
+        return await client.get(f"/api/files/{project}")
+
+    async def task_add(client, i):
+        return await client.post(f"/api/tasks?project_name={project}", json={
+            "name": f"Task {i}",
+            "description": "Created by the load test",
+            "assigned_to": "devopsEngineer"
+        })
+
+    async def task_update(client, i):
+        task_id = state["task_ids"][i % len(state["task_ids"])]
+        return await client.put("/api/tasks", json={"project_name": project, "task_id": task_id, "status": "in_progress"})
+
+    async def task_list(client, i):
+        return await client.get(f"/api/tasks/{project}")
+
+    async def project_import(client, i):
+        return await client.post("/api/projects/import", json={
+            "source_directory": fixture_dir,
+            "project_name": f"bench_import_{run_id}_{i}",
+            "description": "Imported by the load test"
+        })
+
+    async def zip_upload(client, i):
+        return await client.post(
+            "/api/projects/upload",
+            data={"project_name": f"bench_upload_{run_id}_{i}", "description": "Uploaded by the load test"},
+            files={"project_file": ("project.zip", fixture_zip, "application/zip")}
+        )
+
+    scenarios = [
+        Scenario("chat", chat),
+        Scenario("execute", execute),
+        Scenario("file_create", file_create, ensure_project),
+        Scenario("file_read", file_read, setup_files),
+        Scenario("file_update", file_update, setup_files),
+        Scenario("file_delete", file_delete, setup_files),
+        Scenario("file_list", file_list, ensure_project),
+        Scenario("task_add", task_add, ensure_project),
+        Scenario("task_update", task_update, setup_tasks),
+        Scenario("task_list", task_list, ensure_project),
+        Scenario("project_import", project_import),
+        Scenario("zip_upload", zip_upload),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
+
+
+async def run_scenario(client, scenario: Scenario, total: int, concurrency: int) -> Dict[str, Any]:
+    """Issue total requests with the given number of concurrent clients and summarise them"""
+    if scenario.setup:
+        await scenario.setup(client, total)
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await scenario.request(client, i)
+                failed = response.status_code >= 400
+                reason = f"HTTP {response.status_code}"
+            except Exception as e:
+                failed = True
+                reason = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            if failed:
+                errors[reason] = errors.get(reason, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, total)))])
+    elapsed = time.perf_counter() - started
+
+    error_count = sum(errors.values())
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "duration_seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p90": round(percentile(latencies, 90) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "error_rate": round(error_count / total, 4) if total else 0.0,
+        "errors": errors,
+    }
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List regressions: slower p95, lower throughput or more errors than the baseline allows"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        expected = baseline.get("scenarios", {}).get(name)
+        if not expected:
+            continue
+        p95, base_p95 = current["latency_ms"]["p95"], expected["latency_ms"]["p95"]
+        if base_p95 and p95 > base_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 {p95:.1f}ms > baseline {base_p95:.1f}ms (+{tolerance:.0%} allowed)")
+        rps, base_rps = current["throughput_rps"], expected["throughput_rps"]
+        if base_rps and rps < base_rps * (1 - tolerance):
+            regressions.append(f"{name}: throughput {rps:.1f} req/s < baseline {base_rps:.1f} req/s (-{tolerance:.0%} allowed)")
+        if current["error_rate"] > expected["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {current['error_rate']:.2%} > baseline {expected['error_rate']:.2%}")
+    return regressions
+
+
+async def run_benchmarks(args) -> Dict[str, Any]:
+    import httpx
+
+    work_dir = tempfile.mkdtemp(prefix="avatar_bench_")
+    fixture_dir = make_fixture_directory(work_dir)
+    fixture_zip = make_fixture_zip(fixture_dir)
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=120)
+    else:
+        # Import the app from inside the scratch directory so projects/ is created there
+        os.chdir(work_dir)
+        import main
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=120)
+
+    scenarios = build_scenarios(fixture_dir, fixture_zip)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios.keys())
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}. Available: {', '.join(scenarios)}")
+
+    results = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mock_latency": args.mock_latency,
+            "target": args.base_url or "in-process",
+        },
+        "scenarios": {},
+    }
+    async with client:
+        for name in selected:
+            total = args.requests if name not in ("project_import", "zip_upload") else max(1, args.requests // 10)
+            results["scenarios"][name] = await run_scenario(client, scenarios[name], total, args.concurrency)
+            summary = results["scenarios"][name]
+            print(
+                f"{name:>15}: {summary['throughput_rps']:>9.1f} req/s  "
+                f"p50 {summary['latency_ms']['p50']:>8.1f}ms  p95 {summary['latency_ms']['p95']:>8.1f}ms  "
+                f"p99 {summary['latency_ms']['p99']:>8.1f}ms  errors {summary['error_rate']:.2%}",
+                file=sys.stderr
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Avatar Team API")
+    parser.add_argument("--scenarios", help="Comma-separated scenario names (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario (imports/uploads run a tenth)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients per scenario")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--mock-url", help="Use an already running mock provider instead of starting one")
+    parser.add_argument("--mock-latency", default="fixed:0.02", help="Latency distribution for the mock provider")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative regression (0.5 = 50%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    if not args.base_url:
+        # Route every LLM call to the mock provider and keep the measurement free of cache hits
+        os.environ["DEFAULT_LLM_PROVIDER"] = "mock"
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+        os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+        # Retrieval runs on the chat path; the built-in index needs no embedding model download
+        os.environ.setdefault("MEMORY_STORAGE_BACKEND", "numpy")
+        os.environ["MOCK_LLM_BASE_URL"] = args.mock_url or start_mock_provider(args.mock_latency)
+
+    results = asyncio.run(run_benchmarks(args))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ PERFORMANCE REGRESSION against baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  - {regression}", file=sys.stderr)
+            sys.exit(1)
+        print("\n✅ No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,35 @@
+from utils.startup import startup_report
 import sys
 import os
+import json
+import math
+import time
 import asyncio
 import zipfile
 import tempfile
-from fastapi import FastAPI, Body, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Body, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
 from typing import Dict, List, Any, Optional
-import uvicorn
-from agents.chief_architect import ChiefArchitect
-from agents.frontend_engineer import FrontendEngineer
-from agents.backend_engineer import BackendEngineer
-from agents.devops_engineer import DevOpsEngineer
-from agents.ai_ml_engineer import aIMLEngineer
-from agents.product_manager import ProductManager
-from agents.ui_ux_designer import uIUXDesigner
-from agents.technical_writer import TechnicalWriter
-from agents.customer_success import CustomerSuccess
-from agents.legal_compliance import LegalCompliance
-from agents.marketing_sales import MarketingSales
+from agents.registry import AgentRegistry
 from utils.project_manager import ProjectManager
+from utils.project_config_cache import project_config_cache
+from memory.shared_memory import shared_memory
+from memory.retrieval import retriever
 from utils.llm_manager import llm_manager, ModelProvider
+from utils.rate_limiter import ProviderError, RateLimitError
+from utils.task_executor import AgentTaskExecutor
+from utils.tracing import tracer
+from utils.profiling import profiler, timed, PROFILE_MODES
+from utils.config import get_startup_config, get_state_config
+from utils.metrics import metrics, HTTP_REQUESTS, HTTP_REQUEST_DURATION, AGENT_REQUEST_DURATION, AGENT_ERRORS
 
 # Ensure Python recognizes the current directory
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+startup_report.mark("imports")
+
 app = FastAPI()
 
 # Add CORS middleware to allow cross-origin requests from the frontend
@@ -37,32 +41,78 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    """Trace each request and record request counts and latency per route template."""
+    started = time.perf_counter()
+    status = 500
+    llm_manager.begin_request()
+    with tracer.span(f"{request.method} {request.url.path}", traceparent=request.headers.get("traceparent"),
+                     method=request.method, path=request.url.path) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if span is not None:
+                response.headers["X-Trace-Id"] = span.trace_id
+            return response
+        finally:
+            # Use the route template (e.g. /api/projects/{project_name}) to keep label cardinality bounded
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            if span is not None:
+                span.name = f"{request.method} {route_path}"
+                span.set_attribute("status_code", status)
+            HTTP_REQUESTS.inc(method=request.method, route=route_path, status=str(status))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=request.method, route=route_path)
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Profile a single request when it carries an X-Profile header ("cprofile" or "sample")."""
+    mode = request.headers.get("x-profile")
+    if not mode or not profiler.is_authorized(request.headers.get("x-profile-token")):
+        return await call_next(request)
+    if mode not in PROFILE_MODES:
+        return JSONResponse(status_code=400, content={"detail": f"Unknown profile mode: {mode}"})
+    
+    session = profiler.begin(mode, f"{request.method} {request.url.path}")
+    if session is None:
+        response = await call_next(request)
+        response.headers["X-Profile-Status"] = "busy"
+        return response
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.end(session)
+    response.headers["X-Profile-Id"] = session.id
+    return response
+
+@app.on_event("startup")
+async def report_startup():
+    """Print how long startup took and what was initialized."""
+    startup_report.finish(agents=agents.get_stats())
+    startup_report.print_report()
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """Release pooled provider connections and write pending memory and project changes on shutdown."""
+    await llm_manager.close()
+    shared_memory.close()
+    project_config_cache.close()
+
 # Initialize project manager
 project_manager = ProjectManager("projects")
 
-# Initialize agents
-agents = {
-    "chiefArchitect": ChiefArchitect(),
-    "frontendEngineer": FrontendEngineer(),
-    "backendEngineer": BackendEngineer(),
-    "devopsEngineer": DevOpsEngineer(),
-    "aiMlEngineer": aIMLEngineer(),
-    "productManager": ProductManager(),
-    "uiUxDesigner": uIUXDesigner(),
-    "technicalWriter": TechnicalWriter(),
-    "customerSuccess": CustomerSuccess(),
-    "legalCompliance": LegalCompliance(),
-    "marketingSales": MarketingSales()
-}
-
-# Set project manager for all agents
-for agent in agents.values():
-    agent.project_manager = project_manager
+# Initialize agents (built on first use unless AGENT_LAZY_INIT is disabled)
+startup_config = get_startup_config()
+agents = AgentRegistry(project_manager, lazy=startup_config["lazy_agents"])
+agents.preload(startup_config["preload_agents"])
+startup_report.mark("agents")
 
 # Define request models
 class ChatRequest(BaseModel):
     message: str
     agent: str
+    use_cache: bool = True
 
 class TaskRequest(BaseModel):
     task: str
@@ -99,6 +149,16 @@ class LLMModelRequest(BaseModel):
     provider: str
     model: str
 
+class LLMHedgingRequest(BaseModel):
+    enabled: bool
+    fallback_provider: Optional[str] = None
+    fallback_model: Optional[str] = None
+    percentile: Optional[float] = None
+
+class ProfileWindowRequest(BaseModel):
+    mode: str = "sample"
+    seconds: float = 10.0
+
 # Define tasks for each agent
 tasks = {
     "chiefArchitect": "Design the microservices architecture.",
@@ -156,6 +216,7 @@ async def plan_project(project_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/projects/import")
+@timed()
 async def import_project(request: ImportProjectRequest):
     """Import an existing project directory."""
     try:
@@ -213,6 +274,7 @@ async def import_project(request: ImportProjectRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/projects/upload")
+@timed()
 async def upload_project(
     project_name: str = Form(...),
     description: str = Form(...),
@@ -294,6 +356,7 @@ async def upload_project(
 
 # API Endpoints for File Operations
 @app.post("/api/files")
+@timed()
 async def create_file(request: FileRequest):
     """Create a new file in a project."""
     try:
@@ -318,6 +381,7 @@ async def get_file(project_name: str, file_path: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/files")
+@timed()
 async def update_file(request: FileRequest):
     """Update the content of a file."""
     try:
@@ -391,23 +455,23 @@ async def get_tasks(project_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 # Original API Endpoints
-async def execute_tasks():
-    results = {}
-    for role, agent in agents.items():
-        task = tasks.get(role, "No specific task assigned.")
-        print(f"🛠️ [{role}] Task: {task} ...")
-        result = await agent.execute(task)
-        results[role] = result
-        print(f"✅ [{role}] Task completed!")
-    return results
+@timed()
+async def execute_tasks(max_concurrency: Optional[int] = None, task_timeout: Optional[float] = None):
+    executor = AgentTaskExecutor(max_concurrency=max_concurrency, task_timeout=task_timeout)
+    return await executor.run(agents, tasks)
 
 @app.get("/")
-async def run_avatar_team():
-    """API Endpoint to execute all agent tasks asynchronously."""
-    results = await execute_tasks()
-    return {"status": "All agents executed successfully!", "results": results}
+async def run_avatar_team(concurrency: Optional[int] = None, timeout: Optional[float] = None):
+    """API Endpoint to execute all agent tasks concurrently."""
+    execution = await execute_tasks(max_concurrency=concurrency, task_timeout=timeout)
+    if execution["errors"]:
+        status = f"{len(execution['results'])} of {len(agents)} agents completed; some failed or timed out."
+    else:
+        status = "All agents executed successfully!"
+    return {"status": status, **execution}
 
 @app.post("/api/execute")
+@timed()
 async def execute_task(request: TaskRequest):
     try:
         agent = agents.get(request.agent)
@@ -420,6 +484,7 @@ async def execute_task(request: TaskRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/chat")
+@timed()
 async def chat_with_agent(request: ChatRequest):
     """Chat with a specific agent."""
     try:
@@ -434,15 +499,24 @@ async def chat_with_agent(request: ChatRequest):
         model = llm_manager.get_current_model(provider)
         
         # Generate response using the selected provider/model
-        response = llm_manager.generate_response(
-            request.message,
-            provider=provider,
-            model=model
-        )
+        with AGENT_REQUEST_DURATION.time(role=agent_obj.role, operation="api_chat"):
+            try:
+                prompt = await agent_obj.add_retrieved_context(request.message)
+                response = await llm_manager.generate_response(
+                    prompt,
+                    provider=provider,
+                    model=model,
+                    use_cache=request.use_cache,
+                    agent=agent_obj.role
+                )
+            except Exception:
+                AGENT_ERRORS.inc(role=agent_obj.role, operation="api_chat")
+                raise
         
         # Store the conversation in the agent
         agent_obj.add_conversation("user", request.message)
         agent_obj.add_conversation("agent", response)
+        retriever.index_exchange(agent_obj.role, request.message, response)
         
         return {
             "status": "success", 
@@ -454,9 +528,98 @@ async def chat_with_agent(request: ChatRequest):
                 "provider_display_name": llm_manager.get_provider_display_name(provider)
             }
         }
+    except HTTPException:
+        raise
+    except RateLimitError as e:
+        headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after is not None else None
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
+    except ProviderError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def stream_chat_events(agent_name: str, message: str, use_cache: bool = True):
+    """Yield token, done and error events for a streamed chat with an agent."""
+    agent_obj = agents[agent_name]
+    provider = llm_manager.get_current_provider()
+    model = llm_manager.get_current_model(provider)
+    
+    chunks = []
+    started = time.perf_counter()
+    try:
+        prompt = await agent_obj.add_retrieved_context(message)
+        async for token in llm_manager.stream_response(prompt, provider=provider, model=model, use_cache=use_cache, agent=agent_obj.role):
+            chunks.append(token)
+            yield {"type": "token", "token": token}
+    except Exception as e:
+        AGENT_ERRORS.inc(role=agent_obj.role, operation="api_chat_stream")
+        yield {"type": "error", "detail": str(e)}
+        return
+    AGENT_REQUEST_DURATION.observe(time.perf_counter() - started, role=agent_obj.role, operation="api_chat_stream")
+    
+    # Store the full exchange once the stream has finished
+    response = "".join(chunks)
+    agent_obj.add_conversation("user", message)
+    agent_obj.add_conversation("agent", response)
+    retriever.index_exchange(agent_obj.role, message, response)
+    
+    yield {
+        "type": "done",
+        "response": response,
+        "agent": agent_name,
+        "llm_info": {
+            "provider": provider,
+            "model": model,
+            "provider_display_name": llm_manager.get_provider_display_name(provider)
+        }
+    }
+
+@app.post("/api/chat/stream")
+async def chat_with_agent_stream(request: ChatRequest):
+    """Chat with a specific agent, streaming tokens as Server-Sent Events."""
+    if request.agent not in agents:
+        raise HTTPException(status_code=404, detail=f"Agent {request.agent} not found")
+    
+    async def event_stream():
+        async for event in stream_chat_events(request.agent, request.message, request.use_cache):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/chat")
+async def chat_with_agent_ws(websocket: WebSocket):
+    """Chat with agents over a WebSocket, streaming tokens as they are generated."""
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                request = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Request must be a JSON object"})
+                continue
+            if not isinstance(request, dict):
+                await websocket.send_json({"type": "error", "detail": "Request must be a JSON object"})
+                continue
+            llm_manager.begin_request()
+            agent_name = request.get("agent")
+            message = request.get("message")
+            
+            if agent_name not in agents:
+                await websocket.send_json({"type": "error", "detail": f"Agent {agent_name} not found"})
+                continue
+            if not message:
+                await websocket.send_json({"type": "error", "detail": "Message is required"})
+                continue
+            
+            async for event in stream_chat_events(agent_name, message, request.get("use_cache", True)):
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+
 @app.get("/api/conversations/{agent}")
 async def get_conversations(agent: str):
     try:
@@ -556,6 +719,156 @@ async def set_llm_model(request: LLMModelRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/llm/cache")
+async def get_llm_cache_stats():
+    """Get LLM response cache statistics."""
+    try:
+        return {"status": "success", "cache": llm_manager.get_cache_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/llm/cache")
+async def clear_llm_cache():
+    """Clear the LLM response cache."""
+    try:
+        llm_manager.clear_cache()
+        return {"status": "success", "cache": llm_manager.get_cache_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/llm/rate-limits")
+async def get_llm_rate_limits():
+    """Get per-provider rate limits, throttling and retry statistics."""
+    try:
+        return {"status": "success", "rate_limits": llm_manager.get_rate_limit_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/llm/hedging")
+async def get_llm_hedging():
+    """Get hedging settings and rolling per-provider latency statistics."""
+    try:
+        return {"status": "success", "hedging": llm_manager.get_hedging_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/llm/hedging")
+async def set_llm_hedging(request: LLMHedgingRequest):
+    """Enable or disable hedged requests to a fallback provider/model."""
+    success = llm_manager.configure_hedging(
+        request.enabled,
+        fallback_provider=request.fallback_provider,
+        fallback_model=request.fallback_model,
+        percentile=request.percentile
+    )
+    if not success:
+        raise HTTPException(status_code=400, detail="Invalid hedging configuration")
+    return {"status": "success", "hedging": llm_manager.get_hedging_stats()}
+
+@app.get("/api/llm/coalescing")
+async def get_llm_coalescing_stats():
+    """Get statistics on LLM requests that shared an in-flight provider call."""
+    try:
+        return {"status": "success", "coalescing": llm_manager.get_coalescing_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/llm/tokens")
+async def get_llm_token_usage():
+    """Get prompt and completion token usage per provider/model and per agent."""
+    try:
+        return {"status": "success", "tokens": llm_manager.get_token_usage_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/traces")
+async def get_traces():
+    """Get tracing settings, counters and the most recent slow requests with their span breakdown."""
+    try:
+        return {"status": "success", "tracing": tracer.get_stats(), "slow_requests": tracer.recent_slow}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def check_profiling_access(request: Request):
+    """Reject profiling requests unless profiling is enabled and the token matches."""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiler.is_authorized(request.headers.get("x-profile-token")):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+@app.post("/api/admin/profile")
+async def profile_time_window(request: Request, body: ProfileWindowRequest):
+    """Profile everything the server does for a time window."""
+    check_profiling_access(request)
+    if body.mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile mode: {body.mode}")
+    
+    seconds = min(max(body.seconds, 0.1), profiler.config["max_window_seconds"])
+    session = profiler.begin(body.mode, f"window {seconds:g}s")
+    if session is None:
+        raise HTTPException(status_code=409, detail="Another profile is already running")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.end(session)
+    return {"status": "success", "profile": session.summary()}
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """List recent profiles."""
+    check_profiling_access(request)
+    return {"status": "success", "profiles": profiler.list_profiles()}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str, format: Optional[str] = None):
+    """Download a profile as pstats (cProfile), text (cProfile) or collapsed stacks (sampling)."""
+    check_profiling_access(request)
+    session = profiler.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    
+    output_format = format or ("pstats" if session.mode == "cprofile" else "collapsed")
+    try:
+        result = session.render(output_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if output_format == "pstats":
+        return Response(
+            content=result,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
+        )
+    return PlainTextResponse(result)
+
+@app.get("/api/memory/stats")
+async def get_memory_stats():
+    """Get statistics for the agents' shared memory storage."""
+    try:
+        return {"status": "success", "memory": shared_memory.get_stats(), "retrieval": retriever.get_stats(),
+                "project_configs": project_config_cache.get_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/startup")
+async def get_startup_report():
+    """Get startup phase timings, heavy modules loaded and which agents are initialized."""
+    return {"status": "success", "startup": {**startup_report.get_report(), "agents": agents.get_stats()}}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose request, agent, provider, cache and storage metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
+    import uvicorn
+    
+    state_config = get_state_config()
     print("🚀 AI Avatar Team Execution Started!")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if state_config["workers"] > 1:
+        if state_config["backend"] == "memory":
+            print("⚠️ STATE_BACKEND=memory with multiple workers: agent history and LLM settings will diverge per worker")
+        # Workers are separate processes, so uvicorn needs the app as an import string
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=state_config["workers"])
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,21 +1,121 @@
-import chromadb
+import asyncio
+import importlib.util
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.config import get_chroma_config
+
 
 class MemoryStorage:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path="memory/")
-        self.collection = self.client.get_or_create_collection("avatar_project")
+    """Task results and documents in a persistent Chroma collection.
+
+    The client is opened on first use, and bulk operations are split into batches of
+    CHROMA_BATCH_SIZE so large result sets are embedded and indexed in a few calls. The a*
+    methods run the same operations in a worker thread for use from async code.
+    """
+
+    def __init__(self, collection_name: Optional[str] = None, path: Optional[str] = None,
+                 batch_size: Optional[int] = None):
+        config = get_chroma_config()
+        self.collection_name = collection_name or config["collection"]
+        self.path = path or config["path"]
+        self.batch_size = batch_size or config["batch_size"]
+        self._client = None
+        self._collection = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # chromadb is slow to import, so only load it when the store is actually used
+                    import chromadb
+                    self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            client = self.client
+            with self._lock:
+                if self._collection is None:
+                    self._collection = client.get_or_create_collection(self.collection_name)
+        return self._collection
+
+    def _batches(self, count: int):
+        # Chroma rejects calls larger than the client's own limit
+        batch_size = min(self.batch_size, self.client.get_max_batch_size())
+        for start in range(0, count, batch_size):
+            yield slice(start, start + batch_size)
 
     def save_task_result(self, task_name, result):
-        self.collection.add(ids=[task_name], documents=[result])
+        self.save_task_results({task_name: result})
+
+    def save_task_results(self, results: Dict[str, str]):
+        """Store many task results at once, replacing earlier results for the same tasks"""
+        self.upsert(list(results.keys()), [str(result) for result in results.values()])
 
     def get_task_result(self, task_name):
-        results = self.collection.get(ids=[task_name])
-        return results["documents"][0] if results["documents"] else None
+        return self.get_task_results([task_name]).get(task_name)
+
+    def get_task_results(self, task_names: List[str]) -> Dict[str, str]:
+        """Get the stored results for many tasks; missing tasks are left out"""
+        found = {}
+        for batch in self._batches(len(task_names)):
+            results = self.collection.get(ids=task_names[batch])
+            found.update(zip(results["ids"], results["documents"]))
+        return found
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Add or replace documents, embedding them with the collection's embedding function"""
+        for batch in self._batches(len(ids)):
+            self.collection.upsert(
+                ids=ids[batch],
+                documents=documents[batch],
+                metadatas=metadatas[batch] if metadatas else None
+            )
+
+    def delete(self, where: Dict[str, Any]):
+        self.collection.delete(where=where)
+
+    def query(self, text: str, n_results: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Get the documents closest to text, nearest first"""
+        results = self.collection.query(query_texts=[text], n_results=n_results, where=where)
+        return [
+            {"id": doc_id, "document": document, "metadata": metadata or {}, "distance": distance}
+            for doc_id, document, metadata, distance in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            )
+        ]
+
+    async def asave_task_results(self, results: Dict[str, str]):
+        await asyncio.to_thread(self.save_task_results, results)
+
+    async def aget_task_results(self, task_names: List[str]) -> Dict[str, str]:
+        return await asyncio.to_thread(self.get_task_results, task_names)
+
+    async def aupsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        await asyncio.to_thread(self.upsert, ids, documents, metadatas)
+
+    async def aquery(self, text: str, n_results: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.query, text, n_results, where)
+
 
+def create_memory_storage(collection_name: Optional[str] = None, path: Optional[str] = None) -> MemoryStorage:
+    """Create the vector store selected by MEMORY_STORAGE_BACKEND ("chroma", "numpy" or "auto")"""
+    backend = get_chroma_config()["backend"]
+    if backend == "auto":
+        backend = "chroma" if importlib.util.find_spec("chromadb") is not None else "numpy"
+    if backend == "chroma":
+        return MemoryStorage(collection_name, path)
+    if backend == "numpy":
+        from memory.vector_index import VectorMemoryStorage
+        return VectorMemoryStorage(collection_name, path)
+    raise ValueError(f"Unknown memory storage backend: {backend}")
 
-client = chromadb.PersistentClient(path="path/to/chromadb")
 
-# List collections
-collections = client.list_collections()
-for col in collections:
-    print(col.name)
\ No newline at end of file
+if __name__ == "__main__":
+    # List collections
+    for col in MemoryStorage().client.list_collections():
+        print(col.name)
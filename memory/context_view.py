@@ -0,0 +1,130 @@
+"""Incrementally maintained per-agent context for the shared memory engines.
+
+get_agent_context used to rebuild every agent's recent conversations and copy the shared context
+on each chat request. The storage engines now keep a ContextView up to date as they write, so a
+request returns a prebuilt snapshot. Snapshots carry version numbers that only change when data
+an agent depends on changes, letting agents reuse the prompt context they rendered from them.
+"""
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Match the default limits of get_conversation_history and get_all_conversations
+HISTORY_LIMIT = 10
+RECENT_LIMIT = 5
+
+
+class ContextView:
+    def __init__(self, history_limit: int = HISTORY_LIMIT, recent_limit: int = RECENT_LIMIT):
+        self.history_limit = history_limit
+        self.recent_limit = recent_limit
+        self._lock = threading.Lock()
+        self._histories: Dict[str, deque] = {}
+        self._message_counts: Dict[str, int] = {}
+        self._context: Dict[str, Any] = {}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self.messages_version = 0
+        self.context_version = 0
+        # Snapshots shared by every agent until the next write
+        self._all_conversations = None
+        self._shared_context = None
+        self._summaries_snapshot = None
+        self._agent_snapshots: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"rebuilds": 0, "snapshot_hits": 0, "snapshot_builds": 0}
+
+    def rebuild(self, conversations: Dict[str, List[Dict[str, Any]]], context: Dict[str, Any],
+                summaries: Optional[Dict[str, Dict[str, Any]]] = None):
+        """Replace the view, e.g. after loading the store or detecting an external change"""
+        with self._lock:
+            self._histories = {
+                agent: deque(convos[-self.history_limit:], maxlen=self.history_limit)
+                for agent, convos in conversations.items()
+            }
+            self._message_counts = {agent: len(convos) for agent, convos in conversations.items()}
+            self._context = dict(context)
+            self._summaries = dict(summaries or {})
+            # Jump past every "others" version handed out so far (each is at most messages_version)
+            # so that context rendered before the rebuild is never reused
+            self.messages_version += sum(self._message_counts.values()) + 1
+            self.context_version += 1
+            self._invalidate()
+            self.stats["rebuilds"] += 1
+
+    def add_message(self, agent_name: str, message: Dict[str, Any]):
+        with self._lock:
+            history = self._histories.get(agent_name)
+            if history is None:
+                history = self._histories[agent_name] = deque(maxlen=self.history_limit)
+            history.append(message)
+            self._message_counts[agent_name] = self._message_counts.get(agent_name, 0) + 1
+            self.messages_version += 1
+            self._all_conversations = None
+            self._agent_snapshots.clear()
+
+    def set_summary(self, agent_name: str, summary: Dict[str, Any], recent: List[Dict[str, Any]]):
+        """Record that an agent's older history was rolled into a summary; recent is what is left"""
+        with self._lock:
+            self._summaries[agent_name] = summary
+            self._histories[agent_name] = deque(recent[-self.history_limit:], maxlen=self.history_limit)
+            # Counts as a change by this agent, so only the other agents' context is invalidated
+            self._message_counts[agent_name] = self._message_counts.get(agent_name, 0) + 1
+            self.messages_version += 1
+            self._all_conversations = None
+            self._summaries_snapshot = None
+            self._agent_snapshots.clear()
+
+    def set_context(self, key: str, value: Any):
+        with self._lock:
+            self._context[key] = value
+            self.context_version += 1
+            self._shared_context = None
+            self._agent_snapshots.clear()
+
+    def _invalidate(self):
+        self._all_conversations = None
+        self._shared_context = None
+        self._summaries_snapshot = None
+        self._agent_snapshots.clear()
+
+    def get_agent_context(self, agent_name: str) -> Dict[str, Any]:
+        """Get the agent's context snapshot; callers must treat it as read-only.
+
+        versions["others"] changes only when another agent adds a message or has its history
+        summarized, which is all an agent's view of the other agents depends on.
+        """
+        with self._lock:
+            snapshot = self._agent_snapshots.get(agent_name)
+            if snapshot is not None:
+                self.stats["snapshot_hits"] += 1
+                return snapshot
+
+            if self._all_conversations is None:
+                self._all_conversations = {
+                    agent: list(history)[-self.recent_limit:] for agent, history in self._histories.items()
+                }
+            if self._shared_context is None:
+                self._shared_context = dict(self._context)
+            if self._summaries_snapshot is None:
+                self._summaries_snapshot = dict(self._summaries)
+            own_messages = self._message_counts.get(agent_name, 0)
+            snapshot = {
+                "agent_conversations": list(self._histories.get(agent_name, ())),
+                "all_conversations": self._all_conversations,
+                "shared_context": self._shared_context,
+                "summaries": self._summaries_snapshot,
+                "versions": {
+                    "agent": own_messages,
+                    "others": self.messages_version - own_messages,
+                    "context": self.context_version,
+                },
+            }
+            self._agent_snapshots[agent_name] = snapshot
+            self.stats["snapshot_builds"] += 1
+            return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "messages_version": self.messages_version,
+            "context_version": self.context_version,
+            **self.stats,
+        }
@@ -0,0 +1,269 @@
+"""Append-only journal storage engine for the agents' shared memory.
+
+Keeps the plain-file format but makes writes O(1): add_message and add_context append one JSON
+line to a journal instead of rewriting shared_memory.json. Reads are served from an in-memory
+index rebuilt at startup from the last snapshot plus the journal. When the journal grows past
+MEMORY_JOURNAL_COMPACT_BYTES a background thread folds it into a new snapshot. History that
+falls outside the retention window is dropped through a "trim" record carrying the new summary.
+
+Every record carries a sequence number and the snapshot stores the last one it contains, so a
+crash at any point of compaction never replays a record twice. The index lives in process
+memory: use the SQLite engine when several API workers share memory.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from memory.context_view import ContextView
+from memory.retention import RetentionPolicy, apply_summary
+from utils.config import get_memory_config
+from utils.metrics import STORAGE_BYTES_WRITTEN, STORAGE_IO_DURATION
+from utils.profiling import timed
+from utils.tracing import traced
+
+
+class JournalSharedMemory:
+    def __init__(self, journal_path: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 json_path: Optional[str] = None, compact_bytes: Optional[int] = None, fsync: Optional[bool] = None):
+        config = get_memory_config()
+        self.journal_path = journal_path or config["journal_path"]
+        self.snapshot_path = snapshot_path or config["snapshot_path"]
+        self.json_path = json_path or config["json_path"]
+        self.compact_bytes = compact_bytes if compact_bytes is not None else config["journal_compact_bytes"]
+        self.fsync = config["journal_fsync"] if fsync is None else fsync
+
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self.conversations: Dict[str, List[Dict[str, Any]]] = {}
+        self.context: Dict[str, Any] = {}
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        self.seq = 0
+        self.stats = {"appends": 0, "compactions": 0, "replayed": 0, "trimmed_messages": 0}
+        self.view = ContextView()
+        self.retention = RetentionPolicy()
+
+        self._load()
+        self._journal = open(self.journal_path, "a")
+        self._journal_bytes = os.path.getsize(self.journal_path)
+        # History loaded from an older snapshot or JSON file may predate the current limits
+        with self._lock:
+            for agent in list(self.conversations):
+                self._trim(agent)
+        self.view.rebuild(self.conversations, self.context, self.summaries)
+
+    def _load(self):
+        """Rebuild the in-memory index from the snapshot (or the legacy JSON file) and the journal"""
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        snapshot_seq = 0
+        source = self.snapshot_path if os.path.exists(self.snapshot_path) else self.json_path
+        if os.path.exists(source):
+            with open(source, "r") as f:
+                data = json.load(f)
+            self.conversations = data.get("conversations", {})
+            self.context = data.get("context", {})
+            self.summaries = data.get("summaries", {})
+            snapshot_seq = data.get("last_seq", 0)
+        self.seq = snapshot_seq
+
+        # A rotated journal is left behind if the process died while compacting
+        rotated = self.journal_path + ".compacting"
+        for path in (rotated, self.journal_path):
+            if os.path.exists(path):
+                self._replay(path, snapshot_seq)
+        if os.path.exists(rotated):
+            # Finish the interrupted compaction before a new one could overwrite the rotated file
+            self._write_snapshot(self._snapshot())
+            os.remove(rotated)
+            open(self.journal_path, "w").close()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            "conversations": {agent: list(convos) for agent, convos in self.conversations.items()},
+            "context": dict(self.context),
+            "summaries": dict(self.summaries),
+            "last_seq": self.seq,
+            "last_updated": str(datetime.now())
+        }
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        """Atomically replace the snapshot file"""
+        with STORAGE_IO_DURATION.time(component="shared_memory", operation="snapshot"):
+            data = json.dumps(snapshot)
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        STORAGE_BYTES_WRITTEN.inc(len(data.encode("utf-8")), component="shared_memory", operation="snapshot")
+
+    def _replay(self, path: str, snapshot_seq: int):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    print(f"Skipping unreadable journal record in {path}")
+                    continue
+                if record["seq"] <= snapshot_seq:
+                    continue
+                self._apply(record)
+                self.seq = max(self.seq, record["seq"])
+                self.stats["replayed"] += 1
+
+    def _apply(self, record: Dict[str, Any], update_view: bool = False):
+        if record["op"] == "message":
+            message = {
+                "timestamp": record["timestamp"],
+                "user_message": record["user_message"],
+                "agent_response": record["agent_response"]
+            }
+            self.conversations.setdefault(record["agent"], []).append(message)
+            if update_view:
+                self.view.add_message(record["agent"], message)
+        elif record["op"] == "context":
+            self.context[record["key"]] = record["value"]
+            if update_view:
+                self.view.set_context(record["key"], record["value"])
+        elif record["op"] == "trim":
+            apply_summary(self.conversations, self.summaries, record["agent"], record["count"], record["summary"])
+            self.stats["trimmed_messages"] += record["count"]
+            if update_view:
+                self.view.set_summary(record["agent"], record["summary"], self.conversations.get(record["agent"], []))
+
+    def _write_record(self, record: Dict[str, Any]) -> int:
+        """Write one record to the journal and apply it to the index; the caller holds the lock"""
+        self.seq += 1
+        record["seq"] = self.seq
+        line = json.dumps(record) + "\n"
+        with STORAGE_IO_DURATION.time(component="shared_memory", operation="journal_append"):
+            self._journal.write(line)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+        written = len(line.encode("utf-8"))
+        self._journal_bytes += written
+        self._apply(record, update_view=True)
+        self.stats["appends"] += 1
+        return written
+
+    def _trim(self, agent_name: str) -> int:
+        """Journal a trim of the agent's history that falls outside the retention window"""
+        messages = self.conversations.get(agent_name)
+        if not messages or not self.retention.enabled:
+            return 0
+        drop = self.retention.expired_count(messages)
+        if not drop:
+            return 0
+        summary = self.retention.summarize(messages[:drop], self.summaries.get(agent_name))
+        return self._write_record({"op": "trim", "agent": agent_name, "count": drop, "summary": summary})
+
+    def _append(self, record: Dict[str, Any]):
+        """Write one record to the journal and apply it to the index"""
+        with self._lock:
+            written = self._write_record(record)
+            if record["op"] == "message":
+                written += self._trim(record["agent"])
+            needs_compaction = self.compact_bytes and self._journal_bytes >= self.compact_bytes
+        STORAGE_BYTES_WRITTEN.inc(written, component="shared_memory", operation="journal_append")
+
+        if needs_compaction and not self._compacting.locked():
+            threading.Thread(target=self.compact, name="journal-compaction", daemon=True).start()
+
+    def compact(self):
+        """Fold the journal into a new snapshot.
+
+        The journal is rotated under the lock so appends continue into a fresh file while the
+        snapshot is written.
+        """
+        if not self._compacting.acquire(blocking=False):
+            return
+        try:
+            rotated = self.journal_path + ".compacting"
+            with self._lock:
+                # If an earlier compaction failed, its rotated file is only safe to drop once a
+                # snapshot covering it exists, so skip rotating this time
+                if not os.path.exists(rotated):
+                    self._journal.close()
+                    os.replace(self.journal_path, rotated)
+                    self._journal = open(self.journal_path, "a")
+                    self._journal_bytes = 0
+                snapshot = self._snapshot()
+
+            self._write_snapshot(snapshot)
+            os.remove(rotated)
+            self.stats["compactions"] += 1
+        except Exception as e:
+            print(f"Error compacting shared memory journal: {str(e)}")
+        finally:
+            self._compacting.release()
+
+    def close(self):
+        """Flush and close the journal file"""
+        with self._lock:
+            if not self._journal.closed:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._journal.close()
+
+    @timed()
+    @traced()
+    def add_message(self, agent_name, user_message, agent_response):
+        """Add a message to the conversation history"""
+        self._append({
+            "op": "message",
+            "agent": agent_name,
+            "timestamp": str(datetime.now()),
+            "user_message": user_message,
+            "agent_response": agent_response
+        })
+
+    @traced()
+    def get_conversation_history(self, agent_name, limit=10):
+        """Get the conversation history for a specific agent"""
+        return list(self.conversations.get(agent_name, [])[-limit:])
+
+    @traced()
+    def get_all_conversations(self, limit=5):
+        """Get recent conversations from all agents"""
+        with self._lock:
+            return {agent: convos[-limit:] for agent, convos in self.conversations.items()}
+
+    @traced()
+    def add_context(self, key, value):
+        """Add or update a context entry"""
+        self._append({"op": "context", "key": key, "value": value})
+
+    @traced()
+    def get_context(self, key=None):
+        """Get context entry or all context if key is None"""
+        if key is None:
+            return dict(self.context)
+        return self.context.get(key, None)
+
+    def get_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Get the rolled-up summary of each agent's trimmed history"""
+        return dict(self.summaries)
+
+    @timed()
+    @traced()
+    def get_agent_context(self, agent_name):
+        """Get all relevant context for an agent including its conversations and shared context"""
+        return self.view.get_agent_context(agent_name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "journal",
+            "context_view": self.view.get_stats(),
+            "path": self.journal_path,
+            "messages": sum(len(convos) for convos in self.conversations.values()),
+            "agents": len(self.conversations),
+            "context_keys": len(self.context),
+            "summaries": len(self.summaries),
+            "journal_bytes": self._journal_bytes,
+            "last_seq": self.seq,
+            **self.stats,
+        }
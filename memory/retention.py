@@ -0,0 +1,109 @@
+"""Bounded retention for the agents' conversation history.
+
+Each agent keeps at most MEMORY_RETENTION_MAX_MESSAGES exchanges, none older than
+MEMORY_RETENTION_MAX_AGE_DAYS and no more than MEMORY_RETENTION_MAX_BYTES of text. Exchanges that
+fall out of the window are folded into a rolling per-agent summary, which agents use as context
+instead of the raw transcript, so file size, resident memory and prompt size stay flat.
+
+Summaries are extractive (a clipped line per exchange, newest kept first when over the size
+limit) so trimming never waits on an LLM call.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from utils.config import get_retention_config
+
+USER_MESSAGE_CHARS = 120
+AGENT_RESPONSE_CHARS = 200
+
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def _message_bytes(message: Dict[str, Any]) -> int:
+    return len(message.get("user_message", "")) + len(message.get("agent_response", ""))
+
+
+class RetentionPolicy:
+    def __init__(self, max_messages: Optional[int] = None, max_age_days: Optional[float] = None,
+                 max_bytes: Optional[int] = None, trim_batch: Optional[int] = None,
+                 summary_max_chars: Optional[int] = None):
+        config = get_retention_config()
+        self.max_messages = config["max_messages"] if max_messages is None else max_messages
+        self.max_age_days = config["max_age_days"] if max_age_days is None else max_age_days
+        self.max_bytes = config["max_bytes"] if max_bytes is None else max_bytes
+        self.trim_batch = config["trim_batch"] if trim_batch is None else trim_batch
+        self.summary_max_chars = config["summary_max_chars"] if summary_max_chars is None else summary_max_chars
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_messages or self.max_age_days or self.max_bytes)
+
+    def expired_count(self, messages: List[Dict[str, Any]], now: Optional[datetime] = None) -> int:
+        """Number of oldest messages that fall outside the retention window"""
+        count = len(messages)
+        drop = 0
+        if self.max_messages and count > self.max_messages + self.trim_batch:
+            drop = count - self.max_messages
+
+        if self.max_age_days and drop < count:
+            # Timestamps are str(datetime), which sort chronologically as strings
+            cutoff = str((now or datetime.now()) - timedelta(days=self.max_age_days))
+            while drop < count and str(messages[drop].get("timestamp", "")) < cutoff:
+                drop += 1
+
+        if self.max_bytes and drop < count:
+            size = sum(_message_bytes(message) for message in messages[drop:])
+            if size > self.max_bytes:
+                # Trim well below the limit so the next few messages do not trigger another trim
+                target = self.max_bytes * 3 // 4
+                while drop < count - 1 and size > target:
+                    size -= _message_bytes(messages[drop])
+                    drop += 1
+        return drop
+
+    def summarize(self, dropped: List[Dict[str, Any]], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fold dropped exchanges into the agent's rolling summary"""
+        lines = previous["text"].splitlines() if previous else []
+        lines += [
+            f"- {_clip(message.get('user_message', ''), USER_MESSAGE_CHARS)} → "
+            f"{_clip(message.get('agent_response', ''), AGENT_RESPONSE_CHARS)}"
+            for message in dropped
+        ]
+        # Keep the newest lines that fit
+        kept, size = [], 0
+        for line in reversed(lines):
+            size += len(line) + 1
+            if kept and size > self.summary_max_chars:
+                break
+            kept.append(line)
+        kept.reverse()
+
+        return {
+            "text": "\n".join(kept),
+            "messages": (previous["messages"] if previous else 0) + len(dropped),
+            "first_timestamp": previous["first_timestamp"] if previous else str(dropped[0].get("timestamp", "")),
+            "last_timestamp": str(dropped[-1].get("timestamp", "")),
+            "updated_at": str(datetime.now()),
+        }
+
+    def apply(self, conversations: Dict[str, List[Dict[str, Any]]], summaries: Dict[str, Dict[str, Any]],
+              agent_name: str) -> int:
+        """Trim one agent's history in place, rolling what is dropped into its summary"""
+        messages = conversations.get(agent_name)
+        if not messages or not self.enabled:
+            return 0
+        drop = self.expired_count(messages)
+        if drop:
+            summaries[agent_name] = self.summarize(messages[:drop], summaries.get(agent_name))
+            del messages[:drop]
+        return drop
+
+
+def apply_summary(conversations: Dict[str, List[Dict[str, Any]]], summaries: Dict[str, Dict[str, Any]],
+                  agent_name: str, count: int, summary: Dict[str, Any]):
+    """Replay a trim that was recorded earlier (e.g. from the journal)"""
+    del conversations.get(agent_name, [])[:count]
+    summaries[agent_name] = summary
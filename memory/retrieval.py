@@ -0,0 +1,152 @@
+"""Semantic context retrieval backed by the Chroma memory store.
+
+Every chat exchange and project file is indexed into a Chroma collection from a background
+thread, so embedding never runs on the request path. Before an agent answers, the top-k
+snippets closest to the incoming message replace the "latest exchange of every agent" context,
+keeping prompts small and on topic. The store is Chroma or the built-in NumPy index (see
+MEMORY_STORAGE_BACKEND); with neither available retrieval is disabled and agents fall back to
+the recency-based context.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.config import get_retrieval_config
+from utils.metrics import RETRIEVAL_INDEX_DROPPED
+from utils.tracing import traced
+
+CHROMADB_AVAILABLE = importlib.util.find_spec("chromadb") is not None
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+# Upserts drained from the queue per Chroma call; embedding in batches is much cheaper
+INDEX_BATCH_SIZE = 64
+
+
+class ContextRetriever:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or get_retrieval_config()
+        self.enabled = self.config["enabled"] and (CHROMADB_AVAILABLE or NUMPY_AVAILABLE)
+        self._storage = None
+        self._storage_lock = threading.Lock()
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=self.config["queue_size"])
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"indexed": 0, "dropped": 0, "queries": 0, "errors": 0}
+
+    @property
+    def storage(self):
+        """The vector store, created on first use"""
+        if self._storage is None:
+            with self._storage_lock:
+                if self._storage is None:
+                    from memory.chromadb_memory import create_memory_storage
+                    self._storage = create_memory_storage(self.config["collection"], self.config["path"])
+        return self._storage
+
+    def _submit(self, operation: tuple):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="retrieval-indexer", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(operation)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            RETRIEVAL_INDEX_DROPPED.inc(kind=operation[0])
+            if self.stats["dropped"] % 100 == 1:
+                print(f"Retrieval index queue is full; dropped a queued {operation[0]} operation "
+                      f"({self.stats['dropped']} dropped so far)")
+
+    def _run(self):
+        while True:
+            operations = [self._queue.get()]
+            while len(operations) < INDEX_BATCH_SIZE:
+                try:
+                    operations.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(operations)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error indexing retrieval context: {str(e)}")
+
+    def _apply(self, operations: List[tuple]):
+        """Run queued operations in order, merging consecutive upserts into one call.
+
+        An operation is ("upsert", ids, documents, metadatas) or ("replace", where, ids, documents,
+        metadatas), which first deletes the documents matching where.
+        """
+        ids, documents, metadatas = [], [], []
+        for operation in operations + [("flush",)]:
+            if operation[0] != "upsert" and ids:
+                self.storage.upsert(ids, documents, metadatas)
+                self.stats["indexed"] += len(ids)
+                ids, documents, metadatas = [], [], []
+            if operation[0] == "replace":
+                self.storage.delete(operation[1])
+                operation = ("upsert",) + operation[2:]
+            if operation[0] == "upsert":
+                ids.extend(operation[1])
+                documents.extend(operation[2])
+                metadatas.extend(operation[3])
+
+    def index_exchange(self, agent_name: str, user_message: str, agent_response: str,
+                       timestamp: Optional[str] = None):
+        """Queue a chat exchange for indexing"""
+        timestamp = timestamp or str(datetime.now())
+        doc_id = "exchange:" + hashlib.sha1(f"{agent_name}\0{timestamp}\0{user_message}".encode("utf-8")).hexdigest()
+        self._submit(("upsert", [doc_id], [f"{agent_name} discussed: {user_message} → {agent_response}"],
+                      [{"kind": "exchange", "agent": agent_name, "timestamp": timestamp}]))
+
+    def index_artifact(self, project_name: str, file_path: str, content: str):
+        """Queue a project file for indexing, replacing the chunks of its previous version"""
+        chunk_chars = self.config["chunk_chars"]
+        chunks = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or [""]
+        prefix = f"artifact:{project_name}:{file_path}"
+        # One operation, so the old chunks are never deleted without the new ones being indexed
+        self._submit(("replace", {"$and": [{"project": project_name}, {"path": file_path}]},
+                      [f"{prefix}:{index}" for index in range(len(chunks))],
+                      [f"{project_name}/{file_path}:\n{chunk}" for chunk in chunks],
+                      [{"kind": "artifact", "agent": "", "project": project_name, "path": file_path, "chunk": index}
+                       for index in range(len(chunks))]))
+
+    @traced()
+    def retrieve(self, query: str, k: Optional[int] = None, exclude_agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the k indexed snippets most relevant to query, nearest first"""
+        if not self.enabled or not query:
+            return []
+        self.stats["queries"] += 1
+        where = {"agent": {"$ne": exclude_agent}} if exclude_agent else None
+        try:
+            results = self.storage.query(query, k or self.config["top_k"], where)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Error retrieving context: {str(e)}")
+            return []
+        max_distance = self.config["max_distance"]
+        return [result for result in results if not max_distance or result["distance"] <= max_distance]
+
+    async def aretrieve(self, query: str, k: Optional[int] = None, exclude_agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        """retrieve() in a worker thread, since embedding the query is CPU-bound"""
+        if not self.enabled:
+            return []
+        return await asyncio.to_thread(self.retrieve, query, k, exclude_agent)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "chromadb_available": CHROMADB_AVAILABLE,
+            "backend": type(self._storage).__name__ if self._storage is not None else None,
+            "collection": self.config["collection"],
+            "queued": self._queue.qsize(),
+            **self.stats,
+        }
+
+
+# Create a singleton instance
+retriever = ContextRetriever()
@@ -1,11 +1,52 @@
 import os
 import json
+import atexit
+import threading
 from datetime import datetime
+from memory.context_view import ContextView
+from memory.retention import RetentionPolicy
+from utils.config import get_memory_config
+from utils.metrics import STORAGE_BYTES_WRITTEN, STORAGE_IO_DURATION
+from utils.profiling import timed
+from utils.tracing import traced
 
 class SharedMemory:
-    def __init__(self):
-        self.memory_file = os.path.join(os.path.dirname(__file__), "shared_memory.json")
+    """Conversation and context memory stored in a JSON file.
+    
+    Reads are served from an in-process copy of the file that is reloaded only when the file's
+    mtime/size show it was changed by someone else. Writes update that copy and are flushed to
+    disk either immediately ("sync" durability) or in the background in batches ("batch"), so a
+    chat request never waits on serializing the full history. Pending changes are flushed at
+    shutdown and re-applied on top of the file if it was modified externally in the meantime.
+    """
+    def __init__(self, memory_file=None, durability=None, flush_interval=None, flush_max_pending=None):
+        config = get_memory_config()
+        self.memory_file = memory_file or config["json_path"]
+        self.durability = durability or config["durability"]
+        self.flush_interval = flush_interval if flush_interval is not None else config["flush_interval"]
+        self.flush_max_pending = flush_max_pending if flush_max_pending is not None else config["flush_max_pending"]
+        if self.durability not in ("sync", "batch"):
+            raise ValueError(f"Unknown memory durability level: {self.durability}")
+        
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._cache = None
+        self._file_signature = None
+        # Changes not yet on disk, kept so they can be replayed onto an externally modified file
+        self._pending = []
+        self._flush_requested = threading.Event()
+        self._closed = False
+        self._flusher = None
+        self.view = ContextView()
+        self.retention = RetentionPolicy()
+        self.stats = {"cache_hits": 0, "reloads": 0, "external_changes": 0, "flushes": 0, "flushed_changes": 0,
+                      "trimmed_messages": 0}
+        
         self._initialize_memory()
+        if self.durability == "batch":
+            self._flusher = threading.Thread(target=self._flush_loop, name="shared-memory-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
         
     def _initialize_memory(self):
         """Initialize the memory file if it doesn't exist"""
@@ -14,40 +55,174 @@ class SharedMemory:
                 json.dump({
                     "conversations": {},
                     "context": {},
+                    "summaries": {},
                     "last_updated": str(datetime.now())
                 }, f, indent=2)
     
-    def _load_memory(self):
-        """Load the memory from the file"""
+    def _signature(self):
         try:
-            with open(self.memory_file, "r") as f:
-                return json.load(f)
-        except:
-            self._initialize_memory()
-            with open(self.memory_file, "r") as f:
-                return json.load(f)
+            stat = os.stat(self.memory_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    @timed()
+    @traced()
+    def _load_memory(self):
+        """Get the in-memory copy, reloading it only if the file changed on disk"""
+        with self._lock:
+            signature = self._signature()
+            if self._cache is not None and signature == self._file_signature:
+                self.stats["cache_hits"] += 1
+                return self._cache
+            
+            if self._cache is not None:
+                self.stats["external_changes"] += 1
+            with STORAGE_IO_DURATION.time(component="shared_memory", operation="load"):
+                try:
+                    with open(self.memory_file, "r") as f:
+                        memory = json.load(f)
+                except:
+                    self._initialize_memory()
+                    with open(self.memory_file, "r") as f:
+                        memory = json.load(f)
+            
+            for change in self._pending:
+                self._apply(memory, change)
+            summaries = memory.setdefault("summaries", {})
+            for agent in list(memory["conversations"]):
+                self.stats["trimmed_messages"] += self.retention.apply(memory["conversations"], summaries, agent)
+            self._cache = memory
+            self.view.rebuild(memory["conversations"], memory["context"], summaries)
+            self._file_signature = self._signature()
+            self.stats["reloads"] += 1
+            return memory
     
+    @timed()
+    @traced()
     def _save_memory(self, memory_data):
-        """Save the memory to the file"""
-        memory_data["last_updated"] = str(datetime.now())
-        with open(self.memory_file, "w") as f:
-            json.dump(memory_data, f, indent=2)
+        """Replace the whole memory and write it to the file"""
+        with self._lock:
+            memory_data.setdefault("summaries", {})
+            self._cache = memory_data
+            self._pending = []
+            self._write_file(memory_data)
+            self.view.rebuild(memory_data["conversations"], memory_data["context"], memory_data.get("summaries"))
     
+    def _write_file(self, memory_data, data=None):
+        """Write the memory to the file, serializing it unless data is given"""
+        with STORAGE_IO_DURATION.time(component="shared_memory", operation="save"):
+            if data is None:
+                memory_data["last_updated"] = str(datetime.now())
+                data = json.dumps(memory_data, indent=2)
+            # Write a temporary file and rename it so readers never see a partial document
+            tmp_path = f"{self.memory_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.memory_file)
+            self._file_signature = self._signature()
+        STORAGE_BYTES_WRITTEN.inc(len(data.encode("utf-8")), component="shared_memory", operation="save")
+    
+    @staticmethod
+    def _apply(memory, change):
+        kind, key, value = change
+        if kind == "message":
+            memory["conversations"].setdefault(key, []).append(value)
+        elif kind == "context":
+            memory["context"][key] = value
+    
+    def _update_view(self, change):
+        kind, key, value = change
+        if kind == "message":
+            self.view.add_message(key, value)
+        elif kind == "context":
+            self.view.set_context(key, value)
+    
+    def _trim(self, memory, agent_name):
+        """Roll the agent's history that falls outside the retention window into its summary"""
+        dropped = self.retention.apply(memory["conversations"], memory["summaries"], agent_name)
+        if dropped:
+            self.view.set_summary(agent_name, memory["summaries"][agent_name], memory["conversations"][agent_name])
+            self.stats["trimmed_messages"] += dropped
+    
+    def _record(self, change):
+        """Apply a change to the in-memory copy and write it according to the durability level"""
+        with self._lock:
+            memory = self._load_memory()
+            self._apply(memory, change)
+            self._update_view(change)
+            self._pending.append(change)
+            if change[0] == "message":
+                self._trim(memory, change[1])
+            if self.durability == "batch" and len(self._pending) >= self.flush_max_pending:
+                self._flush_requested.set()
+        if self.durability == "sync":
+            # After releasing the lock: flush() takes _flush_lock before _lock
+            self.flush()
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing shared memory: {str(e)}")
+    
+    def flush(self, attempts=3):
+        """Write pending changes to disk"""
+        with self._flush_lock:
+            for _ in range(attempts):
+                with self._lock:
+                    if not self._pending:
+                        return
+                    # Reload first if someone else changed the file; pending changes are re-applied on top
+                    memory = self._load_memory()
+                    flushed = len(self._pending)
+                    snapshot = {
+                        "conversations": {agent: list(convos) for agent, convos in memory["conversations"].items()},
+                        "context": dict(memory["context"]),
+                        "summaries": dict(memory["summaries"]),
+                        "last_updated": str(datetime.now())
+                    }
+                
+                # Serialize outside the lock so chat requests are not blocked by a large history
+                data = json.dumps(snapshot, indent=2)
+                
+                with self._lock:
+                    if self._signature() == self._file_signature:
+                        self._write_file(snapshot, data)
+                        del self._pending[:flushed]
+                        self.stats["flushes"] += 1
+                        self.stats["flushed_changes"] += flushed
+                        return
+                # Changed externally while serializing; reload and try again
+            
+            # Still pending; written by the next flush (the next change in "sync" mode, or close())
+            print(f"Shared memory file {self.memory_file} kept changing during flush; {len(self._pending)} changes pending")
+            self._flush_requested.set()
+    
+    def close(self):
+        """Stop the background flusher and write any pending changes"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_requested.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self.flush(attempts=10)
+    
+    @timed()
+    @traced()
     def add_message(self, agent_name, user_message, agent_response):
         """Add a message to the conversation history"""
-        memory = self._load_memory()
-        
-        if agent_name not in memory["conversations"]:
-            memory["conversations"][agent_name] = []
-            
-        memory["conversations"][agent_name].append({
+        self._record(("message", agent_name, {
             "timestamp": str(datetime.now()),
             "user_message": user_message,
             "agent_response": agent_response
-        })
-        
-        self._save_memory(memory)
+        }))
     
+    @traced()
     def get_conversation_history(self, agent_name, limit=10):
         """Get the conversation history for a specific agent"""
         memory = self._load_memory()
@@ -57,44 +232,74 @@ class SharedMemory:
             
         return memory["conversations"][agent_name][-limit:]
     
+    @traced()
     def get_all_conversations(self, limit=5):
         """Get recent conversations from all agents"""
         memory = self._load_memory()
         result = {}
         
-        for agent, conversations in memory["conversations"].items():
+        for agent, conversations in list(memory["conversations"].items()):
             result[agent] = conversations[-limit:]
             
         return result
     
+    @traced()
     def add_context(self, key, value):
         """Add or update a context entry"""
-        memory = self._load_memory()
-        memory["context"][key] = value
-        self._save_memory(memory)
+        self._record(("context", key, value))
     
+    @traced()
     def get_context(self, key=None):
         """Get context entry or all context if key is None"""
         memory = self._load_memory()
         
         if key is None:
-            return memory["context"]
+            return dict(memory["context"])
         
         return memory["context"].get(key, None)
     
+    def get_summaries(self):
+        """Get the rolled-up summary of each agent's trimmed history"""
+        return dict(self._load_memory()["summaries"])
+    
+    @timed()
+    @traced()
     def get_agent_context(self, agent_name):
         """Get all relevant context for an agent including its conversations and shared context"""
-        all_conversations = self.get_all_conversations()
-        context = self.get_context()
-        
-        # Get this agent's conversations
-        agent_conversations = self.get_conversation_history(agent_name)
-        
+        with self._lock:
+            # Picks up external changes to the file; the view is rebuilt when that happens
+            self._load_memory()
+            return self.view.get_agent_context(agent_name)
+
+    def get_stats(self):
+        """Get storage statistics"""
+        memory = self._load_memory()
         return {
-            "agent_conversations": agent_conversations,
-            "all_conversations": all_conversations,
-            "shared_context": context
+            "backend": "json",
+            "path": self.memory_file,
+            "messages": sum(len(convos) for convos in memory["conversations"].values()),
+            "agents": len(memory["conversations"]),
+            "context_keys": len(memory["context"]),
+            "summaries": len(memory["summaries"]),
+            "file_bytes": os.path.getsize(self.memory_file) if os.path.exists(self.memory_file) else 0,
+            "durability": self.durability,
+            "pending_changes": len(self._pending),
+            "context_view": self.view.get_stats(),
+            **self.stats
         }
 
+def create_shared_memory(config=None):
+    """Create the shared memory for the storage engine selected by MEMORY_BACKEND"""
+    config = config or get_memory_config()
+    if config["backend"] == "sqlite":
+        from memory.sqlite_memory import SQLiteSharedMemory
+        return SQLiteSharedMemory(config["sqlite_path"], config["json_path"])
+    if config["backend"] == "journal":
+        from memory.journal_memory import JournalSharedMemory
+        return JournalSharedMemory(config["journal_path"], config["snapshot_path"], config["json_path"])
+    if config["backend"] == "json":
+        return SharedMemory(config["json_path"])
+    raise ValueError(f"Unknown memory backend: {config['backend']}")
+
 # Create a singleton instance
-shared_memory = SharedMemory() 
\ No newline at end of file
+shared_memory = create_shared_memory() 
\ No newline at end of file
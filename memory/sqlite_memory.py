@@ -0,0 +1,295 @@
+"""SQLite storage engine for the agents' shared memory.
+
+Same public API as the JSON-file SharedMemory, but messages are single-row inserts and history
+reads are indexed range queries, so their cost does not grow with the size of the history.
+WAL mode lets readers run alongside a writer, and every write is its own transaction, so
+concurrent writers (including other API workers) no longer lose updates.
+
+Context snapshots for agents come from an in-process ContextView that is rebuilt whenever
+`PRAGMA data_version` shows another connection (e.g. another worker) committed a change.
+Every MEMORY_RETENTION_TRIM_BATCH inserts an agent's history is checked against the retention
+policy and what falls outside it is rolled into the summaries table.
+
+Run `python -m memory.sqlite_memory` to migrate an existing shared_memory.json.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from memory.context_view import ContextView
+from memory.retention import RetentionPolicy
+from utils.config import get_memory_config
+from utils.metrics import STORAGE_IO_DURATION
+from utils.profiling import timed
+from utils.tracing import traced
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    agent_response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_agent_id ON conversations (agent, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_agent_timestamp ON conversations (agent, timestamp);
+CREATE TABLE IF NOT EXISTS context (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    agent TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SQLiteSharedMemory:
+    def __init__(self, db_path: Optional[str] = None, json_path: Optional[str] = None, migrate: bool = True):
+        config = get_memory_config()
+        self.db_path = db_path or config["sqlite_path"]
+        self.json_path = json_path or config["json_path"]
+        self._local = threading.local()
+        # Serializes this process's writes with view rebuilds so no message is applied twice
+        self._view_lock = threading.Lock()
+        self.view = ContextView()
+        self.retention = RetentionPolicy()
+        self._inserts_since_trim: Dict[str, int] = {}
+        self.stats = {"trimmed_messages": 0}
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if migrate:
+            self.migrate_from_json(self.json_path)
+        if self.retention.enabled:
+            for (agent,) in conn.execute("SELECT DISTINCT agent FROM conversations").fetchall():
+                self._trim(agent)
+        self._refresh_view(force=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_message(row) -> Dict[str, Any]:
+        return {"timestamp": row[0], "user_message": row[1], "agent_response": row[2]}
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """Import conversations and context from a shared_memory.json file once.
+
+        Returns the number of imported messages; later calls are no-ops.
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return 0
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, "r") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading {json_path} for migration: {str(e)}")
+            return 0
+
+        rows = [
+            (agent, str(message.get("timestamp", "")), message.get("user_message", ""), message.get("agent_response", ""))
+            for agent, messages in data.get("conversations", {}).items()
+            for message in messages
+        ]
+        # Keep the original chronological order across agents
+        rows.sort(key=lambda row: row[1])
+        now = str(datetime.now())
+
+        with conn:
+            # Another worker may have migrated while this one was reading the file
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return 0
+            conn.executemany(
+                "INSERT INTO conversations (agent, timestamp, user_message, agent_response) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO context (key, value, updated_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key, value in data.get("context", {}).items()]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (json.dumps({
+                "source": json_path, "messages": len(rows), "migrated_at": now
+            }),))
+
+        print(f"📦 Migrated {len(rows)} messages from {json_path} to {self.db_path}")
+        return len(rows)
+
+    def _refresh_view(self, force: bool = False):
+        """Rebuild the context view if another connection committed since this thread last looked"""
+        conn = self._connect()
+        with self._view_lock:
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if not force and data_version == getattr(self._local, "data_version", None):
+                return
+            self._local.data_version = data_version
+            conversations = {}
+            for (agent,) in conn.execute("SELECT agent FROM conversations GROUP BY agent ORDER BY MIN(id)").fetchall():
+                rows = conn.execute(
+                    "SELECT timestamp, user_message, agent_response FROM conversations "
+                    "WHERE agent = ? ORDER BY id DESC LIMIT ?",
+                    (agent, self.view.history_limit)
+                ).fetchall()
+                conversations[agent] = [self._row_to_message(row) for row in reversed(rows)]
+            self.view.rebuild(conversations, self.get_context(), self.get_summaries())
+
+    def _trim(self, agent_name: str) -> int:
+        """Roll the agent's history that falls outside the retention window into its summary"""
+        conn = self._connect()
+        with self._view_lock:
+            # Take the write lock up front so two workers never summarize the same messages
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, timestamp, user_message, agent_response FROM conversations WHERE agent = ? ORDER BY id",
+                    (agent_name,)
+                ).fetchall()
+                messages = [self._row_to_message(row[1:]) for row in rows]
+                drop = self.retention.expired_count(messages)
+                if drop:
+                    previous = conn.execute("SELECT value FROM summaries WHERE agent = ?", (agent_name,)).fetchone()
+                    summary = self.retention.summarize(messages[:drop], json.loads(previous[0]) if previous else None)
+                    conn.execute("DELETE FROM conversations WHERE agent = ? AND id <= ?", (agent_name, rows[drop - 1][0]))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO summaries (agent, value) VALUES (?, ?)", (agent_name, json.dumps(summary))
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if drop:
+                self.view.set_summary(agent_name, summary, messages[drop:])
+                self.stats["trimmed_messages"] += drop
+        return drop
+
+    def close(self):
+        """Close this thread's database connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @timed()
+    @traced()
+    def add_message(self, agent_name, user_message, agent_response):
+        """Add a message to the conversation history"""
+        with STORAGE_IO_DURATION.time(component="shared_memory", operation="save"):
+            conn = self._connect()
+            message = {"timestamp": str(datetime.now()), "user_message": user_message, "agent_response": agent_response}
+            with self._view_lock:
+                with conn:
+                    conn.execute(
+                        "INSERT INTO conversations (agent, timestamp, user_message, agent_response) VALUES (?, ?, ?, ?)",
+                        (agent_name, message["timestamp"], user_message, agent_response)
+                    )
+                self.view.add_message(agent_name, message)
+
+        if self.retention.enabled:
+            inserts = self._inserts_since_trim.get(agent_name, 0) + 1
+            if inserts >= max(1, self.retention.trim_batch):
+                inserts = 0
+                self._trim(agent_name)
+            self._inserts_since_trim[agent_name] = inserts
+
+    @traced()
+    def get_conversation_history(self, agent_name, limit=10):
+        """Get the conversation history for a specific agent"""
+        with STORAGE_IO_DURATION.time(component="shared_memory", operation="load"):
+            rows = self._connect().execute(
+                "SELECT timestamp, user_message, agent_response FROM conversations "
+                "WHERE agent = ? ORDER BY id DESC LIMIT ?",
+                (agent_name, limit)
+            ).fetchall()
+        return [self._row_to_message(row) for row in reversed(rows)]
+
+    @traced()
+    def get_all_conversations(self, limit=5):
+        """Get recent conversations from all agents"""
+        with STORAGE_IO_DURATION.time(component="shared_memory", operation="load"):
+            conn = self._connect()
+            agents = [row[0] for row in conn.execute(
+                "SELECT agent FROM conversations GROUP BY agent ORDER BY MIN(id)"
+            ).fetchall()]
+            result = {}
+            for agent in agents:
+                rows = conn.execute(
+                    "SELECT timestamp, user_message, agent_response FROM conversations "
+                    "WHERE agent = ? ORDER BY id DESC LIMIT ?",
+                    (agent, limit)
+                ).fetchall()
+                result[agent] = [self._row_to_message(row) for row in reversed(rows)]
+        return result
+
+    @traced()
+    def add_context(self, key, value):
+        """Add or update a context entry"""
+        conn = self._connect()
+        with self._view_lock:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO context (key, value, updated_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), str(datetime.now()))
+                )
+            self.view.set_context(key, value)
+
+    @traced()
+    def get_context(self, key=None):
+        """Get context entry or all context if key is None"""
+        conn = self._connect()
+        if key is None:
+            return {row[0]: json.loads(row[1]) for row in conn.execute("SELECT key, value FROM context").fetchall()}
+
+        row = conn.execute("SELECT value FROM context WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """Get the rolled-up summary of each agent's trimmed history"""
+        rows = self._connect().execute("SELECT agent, value FROM summaries").fetchall()
+        return {agent: json.loads(value) for agent, value in rows}
+
+    @timed()
+    @traced()
+    def get_agent_context(self, agent_name):
+        """Get all relevant context for an agent including its conversations and shared context"""
+        self._refresh_view()
+        return self.view.get_agent_context(agent_name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        migration = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.db_path,
+            "messages": conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0],
+            "agents": conn.execute("SELECT COUNT(DISTINCT agent) FROM conversations").fetchone()[0],
+            "context_keys": conn.execute("SELECT COUNT(*) FROM context").fetchone()[0],
+            "summaries": conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0],
+            "migration": json.loads(migration[0]) if migration else None,
+            "context_view": self.view.get_stats(),
+            **self.stats,
+        }
+
+
+if __name__ == "__main__":
+    memory = SQLiteSharedMemory(migrate=False)
+    count = memory.migrate_from_json(memory.json_path)
+    print(f"Imported {count} messages" if count else "Nothing to migrate (already migrated or no JSON file)")
+    print(memory.get_stats())
@@ -0,0 +1,514 @@
+"""Built-in vector index with the MemoryStorage interface, for deployments without Chroma.
+
+Embeddings come from a local feature-hashing function, so nothing is downloaded and no service
+is needed. Vectors are normalized float32 rows appended to a memory-mapped file and searched with
+one matrix-vector product (cosine similarity) plus argpartition for the top k. Documents and
+metadata live in an append-only JSONL log; replaced and deleted rows are tombstoned and dropped
+by compact().
+
+With VECTOR_INDEX_PQ_SUBSPACES set, a product quantizer is trained once enough vectors exist.
+Search then scans one byte per subspace per row instead of the full vectors and rescores only
+a shortlist exactly, so the float32 file is mostly left on disk.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; use a single API worker there
+    fcntl = None
+
+from memory.chromadb_memory import MemoryStorage
+from utils.config import get_vector_index_config
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+# Compact once tombstoned rows outnumber live ones (and there are at least this many)
+COMPACT_MIN_DEAD_ROWS = 1024
+
+# Data files of an index generation, e.g. vectors.f32, records.3.jsonl or pq_codes.3.u8
+GENERATION_FILE = re.compile(r"^(vectors(\.\d+)?\.f32|records(\.\d+)?\.jsonl|pq_codes(\.\d+)?\.u8)$")
+
+
+@lru_cache(maxsize=65536)
+def _feature_slot(feature: str, dim: int) -> Tuple[int, float]:
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+class HashingEmbedding:
+    """Offline embedding: signed feature hashing of word unigrams and bigrams, L2-normalized"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(input), self.dim), dtype=np.float32)
+        for row, text in enumerate(input):
+            tokens = TOKEN_PATTERN.findall(str(text).lower())
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                slot, sign = _feature_slot(feature, self.dim)
+                vectors[row, slot] += sign
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of Chroma's metadata filter syntax the app uses"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class ProductQuantizer:
+    """Splits vectors into subspaces and encodes each as the index of its nearest k-means centroid"""
+
+    def __init__(self, dim: int, subspaces: int, centroids: int = 256, iterations: int = 12):
+        if dim % subspaces:
+            raise ValueError(f"Vector dimension {dim} is not divisible by {subspaces} PQ subspaces")
+        self.subspaces = subspaces
+        self.sub_dim = dim // subspaces
+        self.centroids = centroids
+        self.iterations = iterations
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (centers ** 2).sum(axis=1) - 2 * vectors @ centers.T
+        return distances.argmin(axis=1)
+
+    def train(self, vectors: np.ndarray):
+        rng = np.random.default_rng(0)
+        k = min(self.centroids, len(vectors))
+        codebooks = np.empty((self.subspaces, k, self.sub_dim), dtype=np.float32)
+        for j in range(self.subspaces):
+            sub = np.ascontiguousarray(vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim])
+            centers = sub[rng.choice(len(sub), k, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._nearest(sub, centers)
+                sums = np.zeros_like(centers)
+                np.add.at(sums, assignment, sub)
+                counts = np.bincount(assignment, minlength=k)
+                filled = counts > 0
+                centers[filled] = sums[filled] / counts[filled, None]
+            codebooks[j] = centers
+        self.codebooks = codebooks
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = self._nearest(vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim], self.codebooks[j])
+        return codes
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate inner products of query with every encoded vector"""
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.subspaces, self.sub_dim))
+        return table[np.arange(self.subspaces), codes].sum(axis=1)
+
+
+class VectorIndex:
+    """Append-only store of normalized float32 vectors with documents and metadata.
+
+    Rows in vectors.f32 line up with the "add" records in records.jsonl. compact() writes a new
+    generation of both files and switches to it by replacing manifest.json last, so a crash leaves
+    either the old pair or the new one in use, never a mix. Writers hold an exclusive lock on the
+    directory and first catch up on rows other processes appended, so API workers can share it.
+    """
+
+    def __init__(self, directory: str, dim: int, pq_subspaces: int = 0, pq_train_size: int = 2048,
+                 pq_rerank: int = 4):
+        self.directory = directory
+        self.dim = dim
+        self.pq_train_size = pq_train_size
+        self.pq_rerank = pq_rerank
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.codebooks_path = os.path.join(directory, "pq_codebooks.npy")
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self.quantizer = ProductQuantizer(dim, pq_subspaces) if pq_subspaces else None
+        self.stats = {"searches": 0, "compactions": 0}
+        self._reset(0)
+        with self._locked():
+            self._sync()
+            # Files of a compaction that crashed before switching generations
+            self._remove_other_generations()
+
+    @property
+    def count(self) -> int:
+        return len(self.rows)
+
+    def _paths(self, generation: int) -> Tuple[str, str, str]:
+        """Vector, record and PQ code files of a generation (generation 0 keeps the original names)"""
+        suffix = f".{generation}" if generation else ""
+        return (os.path.join(self.directory, f"vectors{suffix}.f32"),
+                os.path.join(self.directory, f"records{suffix}.jsonl"),
+                os.path.join(self.directory, f"pq_codes{suffix}.u8"))
+
+    def _reset(self, generation: int):
+        self.generation = generation
+        self.vectors_path, self.records_path, self.codes_path = self._paths(generation)
+        self.ids: List[Optional[str]] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._vectors: Optional[np.ndarray] = None
+        self._codes = np.zeros((0, self.quantizer.subspaces if self.quantizer else 1), dtype=np.uint8)
+        # Bytes of records.jsonl already applied
+        self._records_offset = 0
+
+    @contextmanager
+    def _locked(self):
+        """Hold the in-process lock and an exclusive lock on the directory shared with other processes"""
+        with self._lock:
+            if self._lock_file is not None or fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_file = lock_file
+                try:
+                    yield
+                finally:
+                    self._lock_file = None
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_generation(self) -> int:
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)["generation"]
+        except FileNotFoundError:
+            return 0
+
+    def _write_manifest(self, generation: int):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"generation": generation, "dim": self.dim}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _remove_other_generations(self):
+        current = set(self._paths(self.generation))
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if GENERATION_FILE.match(name) and path not in current:
+                os.remove(path)
+
+    def _stale(self) -> bool:
+        """Whether another process appended records or compacted since the last sync"""
+        try:
+            return os.path.getsize(self.records_path) != self._records_offset
+        except FileNotFoundError:
+            return self._records_offset != 0
+
+    def _sync(self):
+        """Apply records appended since the last sync and repair what a crashed writer left behind.
+
+        Must be called with the directory lock held.
+        """
+        generation = self._read_generation()
+        if generation != self.generation or self._stale() and not os.path.exists(self.records_path):
+            self._reset(generation)
+            self._remove_other_generations()
+
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        if os.path.exists(self.records_path):
+            with open(self.records_path, "rb") as f:
+                f.seek(self._records_offset)
+                data = f.read()
+            complete = data.rfind(b"\n") + 1
+            for line in data[:complete].splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record["op"] == "add" and record["row"] == len(self.ids) and record["row"] < vector_rows:
+                    self._add_row(record["id"], record["document"], record["metadata"])
+                elif record["op"] == "delete":
+                    self._remove(record["id"])
+            self._records_offset += complete
+            if complete < len(data):
+                # A torn final record from a crash mid-append; cut it off so the next append starts a new line
+                with open(self.records_path, "r+b") as f:
+                    f.truncate(self._records_offset)
+        # Vectors written without a matching record are ignored, and cut off so rows stay aligned
+        if vector_rows > len(self.ids):
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(len(self.ids) * self.dim * 4)
+        self._sync_codes()
+
+    def _sync_codes(self):
+        if self.quantizer is None:
+            return
+        if not self.quantizer.trained and os.path.exists(self.codebooks_path):
+            self.quantizer.codebooks = np.load(self.codebooks_path)
+        if not self.quantizer.trained or len(self._codes) == len(self.ids):
+            return
+        stored = np.fromfile(self.codes_path, dtype=np.uint8) if os.path.exists(self.codes_path) else np.zeros(0, dtype=np.uint8)
+        stored = stored[:len(stored) - len(stored) % self.quantizer.subspaces].reshape(-1, self.quantizer.subspaces)
+        if len(stored) >= len(self.ids):
+            self._codes = stored[:len(self.ids)]
+        else:
+            # Encode whatever a crash left unencoded
+            self._codes = np.concatenate([stored, self.quantizer.encode(np.asarray(self._map()[len(stored):]))])
+        self._codes.tofile(self.codes_path)
+
+    def _add_row(self, doc_id: str, document: str, metadata: Dict[str, Any]):
+        self._remove(doc_id)
+        row = len(self.ids)
+        self.ids.append(doc_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        self.rows[doc_id] = row
+        if row >= len(self._alive):
+            grown = np.zeros(max(1024, 2 * len(self._alive)), dtype=bool)
+            grown[:len(self._alive)] = self._alive
+            self._alive = grown
+        self._alive[row] = True
+
+    def _remove(self, doc_id: str) -> bool:
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self._alive[row] = False
+        self.documents[row] = None
+        self.metadatas[row] = None
+        return True
+
+    def _map(self) -> np.ndarray:
+        """Memory-map the vector file, remapping when rows were appended since the last map"""
+        rows = len(self.ids)
+        if self._vectors is None or len(self._vectors) != rows:
+            if rows == 0:
+                self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            else:
+                self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._vectors
+
+    def _append_records(self, records: List[Dict[str, Any]]):
+        with open(self.records_path, "ab") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+            self._records_offset = f.tell()
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], vectors: np.ndarray):
+        """Append vectors; an existing id is replaced by its new row"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got shape {vectors.shape}")
+        vectors = _normalize(vectors)
+
+        with self._locked():
+            self._sync()
+            start = len(self.ids)
+            # Vectors go first: on load, records without a vector row are ignored
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self._append_records([
+                {"op": "add", "id": doc_id, "row": start + offset, "document": document, "metadata": metadata or {}}
+                for offset, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+            ])
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                self._add_row(doc_id, document, metadata or {})
+
+            if self.quantizer is not None:
+                if self.quantizer.trained:
+                    codes = self.quantizer.encode(vectors)
+                    with open(self.codes_path, "ab") as f:
+                        f.write(codes.tobytes())
+                    self._codes = np.concatenate([self._codes, codes])
+                elif self.count >= self.pq_train_size:
+                    self._train_quantizer()
+
+            if len(self.ids) - self.count > max(self.count, COMPACT_MIN_DEAD_ROWS):
+                self.compact()
+
+    def _train_quantizer(self):
+        vectors = np.asarray(self._map())
+        self.quantizer.train(vectors[self._alive[:len(vectors)]])
+        self._codes = self.quantizer.encode(vectors)
+        self._codes.tofile(self.codes_path)
+        # Codebooks go last and by rename: once they exist, every row has a code or gets one on load
+        with open(self.codebooks_path + ".tmp", "wb") as f:
+            np.save(f, self.quantizer.codebooks)
+        os.replace(self.codebooks_path + ".tmp", self.codebooks_path)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> int:
+        with self._locked():
+            self._sync()
+            if ids is None:
+                ids = [doc_id for doc_id, row in self.rows.items() if _matches(self.metadatas[row], where)]
+            removed = [doc_id for doc_id in ids if self._remove(doc_id)]
+            if removed:
+                self._append_records([{"op": "delete", "id": doc_id} for doc_id in removed])
+            return len(removed)
+
+    def refresh(self):
+        """Pick up rows added, deleted or compacted by other processes"""
+        with self._lock:
+            if not self._stale() and self._read_generation() == self.generation:
+                return
+            with self._locked():
+                self._sync()
+
+    def get(self, ids: List[str]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        self.refresh()
+        with self._lock:
+            return [
+                (doc_id, self.documents[self.rows[doc_id]], self.metadatas[self.rows[doc_id]])
+                for doc_id in ids if doc_id in self.rows
+            ]
+
+    def search(self, vector: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Get the k nearest live documents matching where, with their cosine distance"""
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        self.refresh()
+        with self._lock:
+            vectors = self._map()
+            rows = len(vectors)
+            mask = self._alive[:rows].copy()
+            if where:
+                for row in np.flatnonzero(mask):
+                    mask[row] = _matches(self.metadatas[row], where)
+            candidates = np.flatnonzero(mask)
+            if not len(candidates) or k <= 0:
+                return []
+            self.stats["searches"] += 1
+
+            if self.quantizer is not None and self.quantizer.trained and len(candidates) > k * self.pq_rerank:
+                # Shortlist with the compact codes, then rescore the shortlist exactly
+                approximate = self.quantizer.scores(query, self._codes[candidates])
+                shortlist = np.argpartition(-approximate, k * self.pq_rerank - 1)[:k * self.pq_rerank]
+                candidates = candidates[shortlist]
+
+            scores = np.asarray(vectors[candidates]) @ query
+            k = min(k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {"id": self.ids[candidates[i]], "document": self.documents[candidates[i]],
+                 "metadata": self.metadatas[candidates[i]], "distance": float(1.0 - scores[i])}
+                for i in top
+            ]
+
+    def compact(self):
+        """Rewrite the files without replaced or deleted rows, as a new generation"""
+        with self._locked():
+            self._sync()
+            live = [row for row in range(len(self.ids)) if self._alive[row]]
+            vectors = np.asarray(self._map())[live] if live else np.zeros((0, self.dim), dtype=np.float32)
+            records = [(self.ids[row], self.documents[row], self.metadatas[row]) for row in live]
+            codes = self._codes[live] if self.quantizer is not None and self.quantizer.trained else None
+
+            generation = self.generation + 1
+            vectors_path, records_path, codes_path = self._paths(generation)
+            with open(vectors_path, "wb") as f:
+                f.write(vectors.tobytes())
+                os.fsync(f.fileno())
+            with open(records_path, "wb") as f:
+                f.write("".join(
+                    json.dumps({"op": "add", "id": doc_id, "row": row, "document": document, "metadata": metadata}) + "\n"
+                    for row, (doc_id, document, metadata) in enumerate(records)
+                ).encode("utf-8"))
+                os.fsync(f.fileno())
+            if codes is not None:
+                codes.tofile(codes_path)
+            # The switch: until the manifest names the new generation, loads keep using the old files
+            self._write_manifest(generation)
+
+            self._reset(generation)
+            self._sync()
+            self._remove_other_generations()
+            self.stats["compactions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": self.count,
+            "rows": len(self.ids),
+            "dim": self.dim,
+            "generation": self.generation,
+            "file_bytes": os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0,
+            "pq_trained": bool(self.quantizer and self.quantizer.trained),
+            "pq_code_bytes": int(self._codes.nbytes) if self.quantizer else 0,
+            **self.stats,
+        }
+
+
+class VectorMemoryStorage(MemoryStorage):
+    """MemoryStorage backed by the built-in VectorIndex instead of a Chroma collection"""
+
+    def __init__(self, collection_name: Optional[str] = None, path: Optional[str] = None,
+                 batch_size: Optional[int] = None, embedding_function: Optional[Callable[[List[str]], Any]] = None):
+        super().__init__(collection_name, path, batch_size)
+        config = get_vector_index_config()
+        self.embedding_function = embedding_function or HashingEmbedding(config["dim"])
+        self.index = VectorIndex(
+            os.path.join(self.path, "vector_index", self.collection_name),
+            getattr(self.embedding_function, "dim", config["dim"]),
+            pq_subspaces=config["pq_subspaces"],
+            pq_train_size=config["pq_train_size"],
+            pq_rerank=config["pq_rerank"]
+        )
+
+    def _batches(self, count: int):
+        for start in range(0, count, self.batch_size):
+            yield slice(start, start + self.batch_size)
+
+    def get_task_results(self, task_names: List[str]) -> Dict[str, str]:
+        return {doc_id: document for doc_id, document, _ in self.index.get(task_names)}
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        for batch in self._batches(len(ids)):
+            self.index.add(
+                ids[batch],
+                documents[batch],
+                metadatas[batch] if metadatas else [{}] * len(ids[batch]),
+                self.embedding_function(documents[batch])
+            )
+
+    def delete(self, where: Dict[str, Any]):
+        self.index.delete(where=where)
+
+    def query(self, text: str, n_results: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        vector = np.asarray(self.embedding_function([text]), dtype=np.float32)[0]
+        return self.index.search(vector, n_results, where)
@@ -1,55 +1,39 @@
-from memory.chromadb_memory import MemoryStorage
-
-memory = MemoryStorage()
-
-# Store results in memory
-
 # tasks/migration_tasks.py
 
-from agents.chief_architect import ChiefArchitect
-from agents.frontend_engineer import FrontendEngineer
-from agents.backend_engineer import BackendEngineer
-from agents.devops_engineer import DevOpsEngineer
-from agents.ai_ml_engineer import aIMLEngineer
-from agents.product_manager import ProductManager
-from agents.ui_ux_designer import uIUXDesigner
-from agents.technical_writer import TechnicalWriter
-from agents.customer_success import CustomerSuccess
-from agents.marketing_sales import MarketingSales
-from agents.legal_compliance import legalCompliance
-
-# Initialize all agents
-chief_architect = ChiefArchitect()
-frontend_engineer = FrontendEngineer()
-backend_engineer = BackendEngineer()
-devops_engineer = DevOpsEngineer()
-ai_ml_engineer = aIMLEngineer()
-product_manager = ProductManager()
-ui_ux_designer = uIUXDesigner()
-technical_writer = TechnicalWriter()
-customer_success = CustomerSuccess()
-marketing_sales = MarketingSales()
-legal_compliance = legalCompliance()
-
-# Define tasks for the Avatar migration project
-tasks = {
-    "System Architecture": chief_architect.run("Design the Avatar migration system with scalability & efficiency."),
-    "Frontend Development": frontend_engineer.run("Develop Next.js UI for the Avatar migration dashboard."),
-    "Backend Development": backend_engineer.run("Develop secure backend APIs for Avatar migration using Java/Node.js."),
-    "DevOps Deployment": devops_engineer.run("Set up CI/CD, infrastructure, and cloud deployment for Avatar."),
-    "AI Model Optimization": ai_ml_engineer.run("Optimize AI/ML models for Avatar migration automation."),
-    "Product Roadmap": product_manager.run("Define the roadmap & milestones for Avatar."),
-    "UI/UX Design": ui_ux_designer.run("Create user-friendly designs & wireframes for Avatar."),
-    "Documentation": technical_writer.run("Write user guides & developer documentation for Avatar."),
-    "Customer Support": customer_success.run("Assist clients in the migration process."),
-    "marketing&Sales": marketing_sales.run("Develop a marketing strategy for Avatar migration."),
-    "legalCompliance": legal_compliance.run("Ensure security, compliance, and legal adherence for Avatar."),
+import asyncio
+
+from agents.registry import AgentRegistry
+from memory.chromadb_memory import create_memory_storage
+
+# Tasks for the Avatar migration project: task name -> (agent, task description)
+TASKS = {
+    "System Architecture": ("chiefArchitect", "Design the Avatar migration system with scalability & efficiency."),
+    "Frontend Development": ("frontendEngineer", "Develop Next.js UI for the Avatar migration dashboard."),
+    "Backend Development": ("backendEngineer", "Develop secure backend APIs for Avatar migration using Java/Node.js."),
+    "DevOps Deployment": ("devopsEngineer", "Set up CI/CD, infrastructure, and cloud deployment for Avatar."),
+    "AI Model Optimization": ("aiMlEngineer", "Optimize AI/ML models for Avatar migration automation."),
+    "Product Roadmap": ("productManager", "Define the roadmap & milestones for Avatar."),
+    "UI/UX Design": ("uiUxDesigner", "Create user-friendly designs & wireframes for Avatar."),
+    "Documentation": ("technicalWriter", "Write user guides & developer documentation for Avatar."),
+    "Customer Support": ("customerSuccess", "Assist clients in the migration process."),
+    "marketing&Sales": ("marketingSales", "Develop a marketing strategy for Avatar migration."),
+    "legalCompliance": ("legalCompliance", "Ensure security, compliance, and legal adherence for Avatar."),
 }
 
 
+async def run_migration_tasks():
+    """Run every task concurrently and store all results in one bulk write"""
+    agents = AgentRegistry()
+    names = list(TASKS)
+    outcomes = await asyncio.gather(*(agents[TASKS[name][0]].execute(TASKS[name][1]) for name in names))
+
+    # execute() returns False when a task fails
+    results = {name: str(outcome) for name, outcome in zip(names, outcomes) if outcome is not False}
+    memory = create_memory_storage()
+    await memory.asave_task_results(results)
+    return results
 
-# Store results
-results = {task: result for task, result in tasks.items()}
 
-for task_name, result in tasks.items():
-    memory.save_task_result(task_name, result)
\ No newline at end of file
+if __name__ == "__main__":
+    results = asyncio.run(run_migration_tasks())
+    print(f"Stored {len(results)} of {len(TASKS)} task results")
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pytest
+
+from memory.vector_index import HashingEmbedding, VectorIndex
+
+DIM = 64
+embed = HashingEmbedding(DIM)
+
+
+def add_documents(index, documents):
+    ids = list(documents)
+    texts = [documents[doc_id] for doc_id in ids]
+    index.add(ids, texts, [{"n": i} for i in range(len(ids))], embed(texts))
+
+
+def assert_aligned(index, documents):
+    """Every document is found as its own nearest neighbour, so vectors and records line up"""
+    for doc_id, text in documents.items():
+        best = index.search(embed([text])[0], 1)[0]
+        assert best["id"] == doc_id
+        assert best["document"] == text
+        assert best["distance"] == pytest.approx(0.0, abs=1e-5)
+    assert index.count == len(documents)
+
+
+def make_documents(prefix, count):
+    return {f"{prefix}{i}": f"{prefix} document number {i} about topic{i} and subject{i * 7}" for i in range(count)}
+
+
+def test_reload_keeps_rows_aligned(tmp_path):
+    documents = make_documents("doc", 20)
+    add_documents(VectorIndex(str(tmp_path), DIM), documents)
+    assert_aligned(VectorIndex(str(tmp_path), DIM), documents)
+
+
+def test_crash_before_compaction_switch_keeps_old_generation(tmp_path, monkeypatch):
+    index = VectorIndex(str(tmp_path), DIM)
+    documents = make_documents("doc", 30)
+    add_documents(index, documents)
+    # Replace half the documents so compaction has tombstones to drop and shifts rows
+    replaced = {doc_id: text + " revised" for doc_id, text in list(documents.items())[:15]}
+    add_documents(index, replaced)
+    documents.update(replaced)
+
+    def crash(generation):
+        raise OSError("simulated crash")
+
+    monkeypatch.setattr(index, "_write_manifest", crash)
+    with pytest.raises(OSError):
+        index.compact()
+
+    reloaded = VectorIndex(str(tmp_path), DIM)
+    assert reloaded.generation == 0
+    assert_aligned(reloaded, documents)
+    # The half-written generation is cleaned up
+    assert sorted(os.listdir(tmp_path)) == [".lock", "records.jsonl", "vectors.f32"]
+
+
+def test_crash_after_compaction_switch_uses_new_generation(tmp_path, monkeypatch):
+    index = VectorIndex(str(tmp_path), DIM)
+    documents = make_documents("doc", 30)
+    add_documents(index, documents)
+    index.delete(ids=[f"doc{i}" for i in range(10)])
+    for i in range(10):
+        del documents[f"doc{i}"]
+
+    # Crash after the manifest names the new generation but before the old files are removed
+    monkeypatch.setattr(index, "_remove_other_generations", lambda: None)
+    index.compact()
+
+    reloaded = VectorIndex(str(tmp_path), DIM)
+    assert reloaded.generation == 1
+    assert reloaded.get_stats()["rows"] == 20
+    assert_aligned(reloaded, documents)
+    assert not os.path.exists(tmp_path / "vectors.f32")
+
+
+def test_torn_final_record_is_discarded(tmp_path):
+    index = VectorIndex(str(tmp_path), DIM)
+    documents = make_documents("doc", 10)
+    add_documents(index, documents)
+
+    # A crash mid-add: the vector row made it to disk, its record only partly
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(embed(["lost document"]).tobytes())
+    with open(tmp_path / "records.jsonl", "a") as f:
+        f.write('{"op": "add", "id": "lost", "row": 10, "docu')
+
+    reloaded = VectorIndex(str(tmp_path), DIM)
+    assert_aligned(reloaded, documents)
+    assert os.path.getsize(tmp_path / "vectors.f32") == 10 * DIM * 4
+
+    # The next record starts on a fresh line instead of being glued to the torn one
+    more = make_documents("more", 3)
+    add_documents(reloaded, more)
+    documents.update(more)
+    assert_aligned(VectorIndex(str(tmp_path), DIM), documents)
+
+
+def test_two_processes_appending_stay_aligned(tmp_path):
+    # Two instances stand in for two API workers sharing the directory
+    first = VectorIndex(str(tmp_path), DIM)
+    second = VectorIndex(str(tmp_path), DIM)
+    documents = {}
+    for round_number in range(3):
+        for prefix, index in (("first", first), ("second", second)):
+            batch = make_documents(f"{prefix}{round_number}x", 4)
+            add_documents(index, batch)
+            documents.update(batch)
+
+    assert_aligned(first, documents)
+    assert_aligned(second, documents)
+    assert_aligned(VectorIndex(str(tmp_path), DIM), documents)
+
+
+def test_other_process_compaction_is_picked_up(tmp_path):
+    first = VectorIndex(str(tmp_path), DIM)
+    second = VectorIndex(str(tmp_path), DIM)
+    documents = make_documents("doc", 20)
+    add_documents(first, documents)
+    first.delete(ids=["doc0", "doc1"])
+    del documents["doc0"], documents["doc1"]
+    assert_aligned(second, documents)
+
+    first.compact()
+    assert_aligned(second, documents)
+    assert second.generation == 1
+    assert np.asarray(second._map()).shape == (18, DIM)
@@ -1,13 +1,12 @@
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 from typing import Dict, Any, Optional, Literal
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Define model providers
-ModelProvider = Literal["gemini", "deepseek", "llama3", "openrouter", "openai"]
+ModelProvider = Literal["gemini", "deepseek", "llama3", "openrouter", "openai", "mock"]
 
 def get_gemini_config():
     """Get Gemini API configuration"""
@@ -15,7 +14,8 @@ def get_gemini_config():
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables")
     
-    # Configure the Gemini API
+    # Configure the Gemini API; the SDK is only imported once Gemini is actually used
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     
     return {
@@ -34,6 +34,7 @@ def get_deepseek_config():
     
     return {
         "api_key": api_key,
+        "base_url": os.getenv('DEEPSEEK_BASE_URL', "https://api.deepseek.com/v1"),
         "temperature": 0.7,
         "top_p": 0.9,
         "max_tokens": 2048,
@@ -47,6 +48,7 @@ def get_llama3_config():
     
     return {
         "api_key": api_key,
+        "base_url": os.getenv('LLAMA3_BASE_URL', "https://api.meta.ai/v1"),
         "temperature": 0.7,
         "top_p": 0.9,
         "max_tokens": 2048,
@@ -60,6 +62,7 @@ def get_openrouter_config():
     
     return {
         "api_key": api_key,
+        "base_url": os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1"),
         "temperature": 0.7,
         "top_p": 0.9,
         "max_tokens": 2048,
@@ -73,11 +76,225 @@ def get_openai_config():
     
     return {
         "api_key": api_key,
+        "base_url": os.getenv('OPENAI_BASE_URL', "https://api.openai.com/v1"),
         "temperature": 0.7,
         "top_p": 0.9,
         "max_tokens": 2048,
     }
 
+def get_mock_config():
+    """Get configuration for the local mock provider (see utils/mock_llm_server.py)"""
+    return {
+        "api_key": os.getenv('MOCK_LLM_API_KEY', "mock-key"),
+        "base_url": os.getenv('MOCK_LLM_BASE_URL', "http://127.0.0.1:8100/v1"),
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "max_tokens": 2048,
+    }
+
+def get_http_client_config() -> Dict[str, Any]:
+    """Get connection pool and timeout settings shared by the provider HTTP clients"""
+    return {
+        "connect_timeout": float(os.getenv('LLM_CONNECT_TIMEOUT', "10")),
+        "read_timeout": float(os.getenv('LLM_READ_TIMEOUT', "120")),
+        "write_timeout": float(os.getenv('LLM_WRITE_TIMEOUT', "30")),
+        "pool_timeout": float(os.getenv('LLM_POOL_TIMEOUT', "10")),
+        "max_connections": int(os.getenv('LLM_MAX_CONNECTIONS', "100")),
+        "max_keepalive_connections": int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', "20")),
+        "keepalive_expiry": float(os.getenv('LLM_KEEPALIVE_EXPIRY', "30")),
+        "http2": os.getenv('LLM_HTTP2', "true").lower() in ("1", "true", "yes"),
+    }
+
+def get_rate_limit_config(provider: str) -> Dict[str, Any]:
+    """Get rate limit and retry settings for a provider (0 means no limit until one is discovered)"""
+    prefix = provider.upper()
+    return {
+        "requests_per_minute": float(os.getenv(f'{prefix}_REQUESTS_PER_MINUTE', "0")),
+        "tokens_per_minute": float(os.getenv(f'{prefix}_TOKENS_PER_MINUTE', "0")),
+        "max_retries": int(os.getenv('LLM_MAX_RETRIES', "3")),
+        "backoff_base": float(os.getenv('LLM_BACKOFF_BASE', "0.5")),
+        "backoff_max": float(os.getenv('LLM_BACKOFF_MAX', "30")),
+    }
+
+def get_hedging_config() -> Dict[str, Any]:
+    """Get settings for hedged requests and latency-based provider failover"""
+    return {
+        "enabled": os.getenv('LLM_HEDGING_ENABLED', "false").lower() in ("1", "true", "yes"),
+        "fallback_provider": os.getenv('LLM_HEDGE_PROVIDER') or None,
+        "fallback_model": os.getenv('LLM_HEDGE_MODEL') or None,
+        "percentile": float(os.getenv('LLM_HEDGE_PERCENTILE', "95")),
+        "min_delay": float(os.getenv('LLM_HEDGE_MIN_DELAY', "0.5")),
+        "max_delay": float(os.getenv('LLM_HEDGE_MAX_DELAY', "10")),
+        "default_delay": float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', "2")),
+        "min_samples": int(os.getenv('LLM_HEDGE_MIN_SAMPLES', "20")),
+        "window_size": int(os.getenv('LLM_LATENCY_WINDOW', "200")),
+        "failover_error_rate": float(os.getenv('LLM_FAILOVER_ERROR_RATE', "0.5")),
+        "failover_probe_every": int(os.getenv('LLM_FAILOVER_PROBE_EVERY', "10")),
+    }
+
+def get_executor_config() -> Dict[str, Any]:
+    """Get concurrency and timeout settings for running agent tasks"""
+    return {
+        "max_concurrency": int(os.getenv('AGENT_MAX_CONCURRENCY', "4")),
+        # Seconds per agent task; 0 disables the timeout
+        "task_timeout": float(os.getenv('AGENT_TASK_TIMEOUT', "120")),
+    }
+
+def get_tracing_config() -> Dict[str, Any]:
+    """Get settings for request tracing, span export and the slow-request log"""
+    logs_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs")
+    return {
+        "enabled": os.getenv('TRACING_ENABLED', "true").lower() in ("1", "true", "yes"),
+        # "none", "file" (JSON lines) or "otlp" (OTLP/HTTP JSON to a collector)
+        "exporter": os.getenv('TRACING_EXPORTER', "none").lower(),
+        "file_path": os.getenv('TRACING_FILE_PATH', os.path.join(logs_dir, "traces.jsonl")),
+        "otlp_endpoint": os.getenv('TRACING_OTLP_ENDPOINT', "http://127.0.0.1:4318/v1/traces"),
+        "service_name": os.getenv('TRACING_SERVICE_NAME', "avatar-team-api"),
+        "slow_threshold": float(os.getenv('TRACING_SLOW_THRESHOLD', "2.0")),
+        "slow_log_path": os.getenv('TRACING_SLOW_LOG_PATH', os.path.join(logs_dir, "slow_requests.log")),
+        # Providers we operate ourselves that may receive our traceparent header; trace IDs are
+        # never sent to third-party APIs unless they are listed here
+        "propagate_providers": [name.strip() for name in os.getenv('TRACING_PROPAGATE_PROVIDERS', "mock").split(",") if name.strip()],
+    }
+
+def get_profiling_config() -> Dict[str, Any]:
+    """Get settings for on-demand request profiling"""
+    return {
+        "enabled": os.getenv('PROFILING_ENABLED', "false").lower() in ("1", "true", "yes"),
+        # When set, profiling requests must send it in the X-Profile-Token header
+        "token": os.getenv('PROFILING_TOKEN') or None,
+        "sample_interval": float(os.getenv('PROFILING_SAMPLE_INTERVAL', "0.005")),
+        "max_window_seconds": float(os.getenv('PROFILING_MAX_WINDOW', "60")),
+        "max_profiles": int(os.getenv('PROFILING_MAX_PROFILES', "20")),
+    }
+
+def get_startup_config() -> Dict[str, Any]:
+    """Get settings controlling what is initialized when the API starts"""
+    return {
+        # Build agents on first use instead of at import time
+        "lazy_agents": os.getenv('AGENT_LAZY_INIT', "true").lower() in ("1", "true", "yes"),
+        # Agents to build at startup even in lazy mode, e.g. "chiefArchitect,backendEngineer"
+        "preload_agents": [name.strip() for name in os.getenv('AGENT_PRELOAD', "").split(",") if name.strip()],
+    }
+
+def get_state_config() -> Dict[str, Any]:
+    """Get the backend for state shared between API workers"""
+    memory_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory")
+    workers = int(os.getenv('API_WORKERS', "1"))
+    return {
+        "workers": workers,
+        # Per-process memory only works with a single worker, so default to SQLite otherwise
+        "backend": os.getenv('STATE_BACKEND', "sqlite" if workers > 1 else "memory").lower(),
+        "sqlite_path": os.getenv('STATE_SQLITE_PATH', os.path.join(memory_dir, "state.sqlite3")),
+        "file_directory": os.getenv('STATE_FILE_DIR', os.path.join(memory_dir, "state")),
+    }
+
+def get_memory_config() -> Dict[str, Any]:
+    """Get the storage engine for the agents' shared conversation memory"""
+    memory_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory")
+    return {
+        # "json" (shared_memory.json), "sqlite" or "journal" (append-only JSONL plus snapshot)
+        "backend": os.getenv('MEMORY_BACKEND', "json").lower(),
+        "json_path": os.getenv('MEMORY_JSON_PATH', os.path.join(memory_dir, "shared_memory.json")),
+        "sqlite_path": os.getenv('MEMORY_SQLITE_PATH', os.path.join(memory_dir, "shared_memory.sqlite3")),
+        "journal_path": os.getenv('MEMORY_JOURNAL_PATH', os.path.join(memory_dir, "shared_memory.journal.jsonl")),
+        "snapshot_path": os.getenv('MEMORY_SNAPSHOT_PATH', os.path.join(memory_dir, "shared_memory.snapshot.json")),
+        "journal_compact_bytes": int(os.getenv('MEMORY_JOURNAL_COMPACT_BYTES', str(4 * 1024 * 1024))),
+        "journal_fsync": os.getenv('MEMORY_JOURNAL_FSYNC', "false").lower() in ("1", "true", "yes"),
+        # JSON engine write-behind cache: "sync" writes on every change, "batch" flushes in the
+        # background after MEMORY_FLUSH_MAX_PENDING changes or MEMORY_FLUSH_INTERVAL seconds
+        "durability": os.getenv('MEMORY_DURABILITY', "batch").lower(),
+        "flush_interval": float(os.getenv('MEMORY_FLUSH_INTERVAL', "1.0")),
+        "flush_max_pending": int(os.getenv('MEMORY_FLUSH_MAX_PENDING', "50")),
+    }
+
+def get_project_cache_config() -> Dict[str, Any]:
+    """Get the write-behind settings for cached project configuration files"""
+    workers = int(os.getenv('API_WORKERS', "1"))
+    return {
+        # "sync" writes project_config.json on every change, "batch" coalesces changes and flushes
+        # them in the background; other workers only see flushed changes, so default to sync there
+        "durability": os.getenv('PROJECT_CONFIG_DURABILITY', "sync" if workers > 1 else "batch").lower(),
+        "flush_interval": float(os.getenv('PROJECT_CONFIG_FLUSH_INTERVAL', "1.0")),
+        "flush_max_pending": int(os.getenv('PROJECT_CONFIG_FLUSH_MAX_PENDING', "100")),
+    }
+
+def get_retention_config() -> Dict[str, Any]:
+    """Get the retention limits for conversation history (0 disables a limit)"""
+    return {
+        # Per-agent limits on the shared memory; older exchanges are rolled into a summary
+        "max_messages": int(os.getenv('MEMORY_RETENTION_MAX_MESSAGES', "200")),
+        "max_age_days": float(os.getenv('MEMORY_RETENTION_MAX_AGE_DAYS', "30")),
+        "max_bytes": int(os.getenv('MEMORY_RETENTION_MAX_BYTES', str(512 * 1024))),
+        # Let history grow this many messages past max_messages before trimming, so trims are rare
+        "trim_batch": int(os.getenv('MEMORY_RETENTION_TRIM_BATCH', "20")),
+        "summary_max_chars": int(os.getenv('MEMORY_SUMMARY_MAX_CHARS', "2000")),
+        # Cap on each agent's own execute/chat log in the state store
+        "agent_conversations_max": int(os.getenv('AGENT_CONVERSATIONS_MAX', "100")),
+    }
+
+def get_chroma_config() -> Dict[str, Any]:
+    """Get settings for the Chroma memory store"""
+    return {
+        # "chroma", "numpy" (built-in vector index, see memory/vector_index.py) or "auto", which
+        # uses Chroma when chromadb is installed
+        "backend": os.getenv('MEMORY_STORAGE_BACKEND', "auto").lower(),
+        "path": os.getenv('CHROMA_PATH', "memory/"),
+        "collection": os.getenv('CHROMA_COLLECTION', "avatar_project"),
+        # Documents per add/get call; larger batches amortize embedding and indexing work
+        "batch_size": int(os.getenv('CHROMA_BATCH_SIZE', "256")),
+    }
+
+def get_vector_index_config() -> Dict[str, Any]:
+    """Get settings for the built-in NumPy vector index"""
+    return {
+        # Dimensions of the local hashing embedding
+        "dim": int(os.getenv('VECTOR_INDEX_DIM', "384")),
+        # Product quantization subspaces (0 disables); must divide dim
+        "pq_subspaces": int(os.getenv('VECTOR_INDEX_PQ_SUBSPACES', "0")),
+        # Vectors needed before the quantizer is trained; exact search is used until then
+        "pq_train_size": int(os.getenv('VECTOR_INDEX_PQ_TRAIN_SIZE', "2048")),
+        # Quantized search shortlists top_k * rerank candidates and rescores them exactly
+        "pq_rerank": int(os.getenv('VECTOR_INDEX_PQ_RERANK', "4")),
+    }
+
+def get_retrieval_config() -> Dict[str, Any]:
+    """Get settings for semantic context retrieval from the Chroma memory store"""
+    return {
+        # Uses the store selected by MEMORY_STORAGE_BACKEND
+        "enabled": os.getenv('RETRIEVAL_ENABLED', "true").lower() in ("1", "true", "yes"),
+        "top_k": int(os.getenv('RETRIEVAL_TOP_K', "4")),
+        # Drop matches further away than this (0 keeps all top-k matches); the numpy index reports
+        # cosine distance, Chroma its collection's distance (L2 by default)
+        "max_distance": float(os.getenv('RETRIEVAL_MAX_DISTANCE', "0")),
+        "collection": os.getenv('RETRIEVAL_COLLECTION', "agent_context"),
+        "path": os.getenv('RETRIEVAL_CHROMA_PATH', os.getenv('CHROMA_PATH', "memory/")),
+        "chunk_chars": int(os.getenv('RETRIEVAL_CHUNK_CHARS', "1500")),
+        "queue_size": int(os.getenv('RETRIEVAL_QUEUE_SIZE', "1000")),
+    }
+
+def get_cache_config() -> Dict[str, Any]:
+    """Get settings for the LLM response cache"""
+    default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "memory", "llm_cache.sqlite3")
+    return {
+        "enabled": os.getenv('LLM_CACHE_ENABLED', "true").lower() in ("1", "true", "yes"),
+        "max_entries": int(os.getenv('LLM_CACHE_MAX_ENTRIES', "1024")),
+        "ttl_seconds": float(os.getenv('LLM_CACHE_TTL', "3600")),
+        "disk_path": os.getenv('LLM_CACHE_PATH', default_path),
+        "disk_max_bytes": int(os.getenv('LLM_CACHE_DISK_MAX_BYTES', str(64 * 1024 * 1024))),
+        "disk_ttl_seconds": float(os.getenv('LLM_CACHE_DISK_TTL', str(7 * 24 * 3600))),
+    }
+
+def get_context_budget_config(role: Optional[str] = None) -> Dict[str, Any]:
+    """Get the token budget for context from other agents, optionally overridden per agent role"""
+    max_tokens = int(os.getenv('AGENT_CONTEXT_TOKEN_BUDGET', "1500"))
+    if role:
+        max_tokens = int(os.getenv(f'{role.upper()}_CONTEXT_TOKEN_BUDGET', str(max_tokens)))
+    return {
+        "max_tokens": max_tokens,
+        "max_entry_tokens": int(os.getenv('AGENT_CONTEXT_MAX_ENTRY_TOKENS', "400")),
+    }
+
 def get_model_config(provider: ModelProvider = "deepseek") -> Dict[str, Any]:
     """Get configuration for the specified model provider"""
     config_functions = {
@@ -86,6 +303,7 @@ def get_model_config(provider: ModelProvider = "deepseek") -> Dict[str, Any]:
         "llama3": get_llama3_config,
         "openrouter": get_openrouter_config,
         "openai": get_openai_config,
+        "mock": get_mock_config,
     }
     
     if provider not in config_functions:
@@ -93,153 +311,25 @@ def get_model_config(provider: ModelProvider = "deepseek") -> Dict[str, Any]:
     
     return config_functions[provider]()
 
-def get_gemini_response(prompt, model="gemini-1.5-flash", provider: ModelProvider = "deepseek"):
-    """Generate a response from the specified model provider API"""
+def get_gemini_response(prompt, model="gemini-1.5-flash"):
+    """Generate a response from the Gemini API (other providers go through utils/llm_clients.py)"""
+    from utils.provider_sessions import provider_sessions
     
-    if provider == "gemini":
-        # Ensure API is configured
-        config = get_gemini_config()
-        
-        # Create the model
-        generation_model = genai.GenerativeModel(model)
-        
-        # Generate the response
-        response = generation_model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": config["temperature"],
-                "top_p": config["top_p"],
-                "top_k": config["top_k"],
-                "max_output_tokens": config["max_output_tokens"],
-            }
-        )
-        
-        return response.text
+    # Reuse the configured SDK and cached model handle
+    generation_model = provider_sessions.get_gemini_model(model)
     
-    # For other providers, use their respective APIs (to be implemented)
-    elif provider == "deepseek":
-        return get_response_from_deepseek(prompt)
-    elif provider == "llama3":
-        return get_response_from_llama3(prompt)
-    elif provider == "openrouter":
-        return get_response_from_openrouter(prompt)
-    elif provider == "openai":
-        return get_response_from_openai(prompt, model="o3-mini")
-    else:
-        raise ValueError(f"Unsupported model provider: {provider}")
-
-def get_response_from_deepseek(prompt: str) -> str:
-    """Generate a response from DeepSeek API"""
-    # TODO: Implement DeepSeek API integration
-    import requests
-    
-    config = get_deepseek_config()
+    # Generate the response
+    response = generation_model.generate_content(prompt)
     
-    # DeepSeek API URL (update with actual endpoint)
-    url = "https://api.deepseek.com/v1/chat/completions"
-    
-    headers = {
-        "Authorization": f"Bearer {config['api_key']}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "deepseek-chat",  # Update with appropriate model name
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": config["temperature"],
-        "top_p": config["top_p"],
-        "max_tokens": config["max_tokens"]
-    }
-    
-    try:
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except Exception as e:
-        print(f"Error calling DeepSeek API: {str(e)}")
-        return f"Error generating response: {str(e)}"
-
-def get_response_from_llama3(prompt: str) -> str:
-    """Generate a response from Llama 3 API"""
-    # TODO: Implement Llama 3 API integration
-    import requests
-    
-    config = get_llama3_config()
-    
-    # Llama 3 API URL (update with actual endpoint)
-    url = "https://api.meta.ai/v1/chat/completions"  # Update with correct endpoint
-    
-    headers = {
-        "Authorization": f"Bearer {config['api_key']}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "llama-3-70b-chat",  # Update with appropriate model name
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": config["temperature"],
-        "top_p": config["top_p"],
-        "max_tokens": config["max_tokens"]
-    }
-    
-    try:
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except Exception as e:
-        print(f"Error calling Llama 3 API: {str(e)}")
-        return f"Error generating response: {str(e)}"
-
-def get_response_from_openrouter(prompt: str) -> str:
-    """Generate a response from OpenRouter API"""
-    # TODO: Implement OpenRouter API integration
-    import requests
-    
-    config = get_openrouter_config()
-    
-    # OpenRouter API URL
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    
-    headers = {
-        "Authorization": f"Bearer {config['api_key']}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "openrouter/auto",  # or specify a specific model
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": config["temperature"],
-        "top_p": config["top_p"],
-        "max_tokens": config["max_tokens"]
-    }
-    
-    try:
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except Exception as e:
-        print(f"Error calling OpenRouter API: {str(e)}")
-        return f"Error generating response: {str(e)}"
-
-def get_response_from_openai(prompt: str, model: str = "o3-mini") -> str:
-    """Generate a response from OpenAI API"""
-    # TODO: Implement OpenAI API integration
-    import openai
-    
-    config = get_openai_config()
+    return response.text
+
+def stream_gemini_response(prompt, model="gemini-1.5-flash"):
+    """Yield response text chunks from the Gemini API as they are generated"""
+    from utils.provider_sessions import provider_sessions
     
-    # Configure OpenAI client
-    openai.api_key = config["api_key"]
+    generation_model = provider_sessions.get_gemini_model(model)
+    response = generation_model.generate_content(prompt, stream=True)
     
-    try:
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=config["temperature"],
-            top_p=config["top_p"],
-            max_tokens=config["max_tokens"]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"Error calling OpenAI API: {str(e)}")
-        return f"Error generating response: {str(e)}" 
\ No newline at end of file
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
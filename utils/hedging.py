@@ -0,0 +1,163 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ProviderStats:
+    """Rolling window of call latencies and outcomes for one provider/model"""
+
+    def __init__(self, window_size: int = 200):
+        self.latencies = deque(maxlen=window_size)
+        self.outcomes = deque(maxlen=window_size)
+        self.total_calls = 0
+        self.total_errors = 0
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.total_calls += 1
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.total_calls += 1
+        self.total_errors += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latency at percentile p (0-100) of recent successful calls"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self.latencies),
+            "total_calls": self.total_calls,
+            "total_errors": self.total_errors,
+            "error_rate": self.error_rate(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class LatencyTracker:
+    """Rolling latency and error statistics kept per provider/model"""
+
+    def __init__(self, window_size: int = 200):
+        self.window_size = window_size
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def get(self, provider: str, model: str) -> ProviderStats:
+        key = f"{provider}/{model}"
+        if key not in self._stats:
+            self._stats[key] = ProviderStats(self.window_size)
+        return self._stats[key]
+
+    async def track(self, provider: str, model: str, call: Callable[[], Awaitable[str]]) -> str:
+        """Await call and record its latency or failure; cancelled calls are not counted"""
+        stats = self.get(provider, model)
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.record_failure()
+            raise
+        stats.record_success(time.perf_counter() - started)
+        return result
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {key: stats.get_stats() for key, stats in self._stats.items()}
+
+
+class HedgedRequestRunner:
+    """Sends a backup request to a fallback provider when the primary is slower than its usual tail latency"""
+
+    def __init__(self, tracker: LatencyTracker, config: Dict[str, Any]):
+        self.tracker = tracker
+        self.config = config
+        self._failover_count = 0
+        self.stats = {
+            "requests": 0,
+            "hedges_sent": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "failovers": 0,
+        }
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        """How long to wait for the primary before sending the hedge"""
+        stats = self.tracker.get(provider, model)
+        delay = None
+        if len(stats.latencies) >= self.config["min_samples"]:
+            # None when there are no samples at all, which LLM_HEDGE_MIN_SAMPLES=0 allows
+            delay = stats.percentile(self.config["percentile"])
+        if delay is None:
+            delay = self.config["default_delay"]
+        return min(self.config["max_delay"], max(self.config["min_delay"], delay))
+
+    def should_fail_over(self, provider: str, model: str) -> bool:
+        """Skip an unhealthy primary entirely when its recent error rate is too high.
+
+        Every Nth request still goes through the primary so it can recover.
+        """
+        stats = self.tracker.get(provider, model)
+        unhealthy = (
+            len(stats.outcomes) >= self.config["min_samples"]
+            and stats.error_rate() >= self.config["failover_error_rate"]
+        )
+        if not unhealthy:
+            return False
+        self._failover_count += 1
+        return self._failover_count % max(1, self.config["failover_probe_every"]) != 0
+
+    async def run(self, primary: Tuple[str, str], fallback: Tuple[str, str],
+                  call: Callable[[str, str], Awaitable[str]]) -> str:
+        """Race primary against a delayed fallback; the first success wins and the loser is cancelled"""
+        self.stats["requests"] += 1
+
+        def start(target: Tuple[str, str]) -> asyncio.Task:
+            provider, model = target
+            return asyncio.ensure_future(self.tracker.track(provider, model, lambda: call(provider, model)))
+
+        if self.should_fail_over(*primary):
+            self.stats["failovers"] += 1
+            return await start(fallback)
+
+        primary_task = start(primary)
+        pending = {primary_task}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay(*primary))
+            if primary_task in done and primary_task.exception() is None:
+                self.stats["primary_wins"] += 1
+                return primary_task.result()
+
+            # Primary is slow or already failed: send the hedge
+            self.stats["hedges_sent"] += 1
+            hedge_task = start(fallback)
+            pending.add(hedge_task)
+
+            last_error: Optional[BaseException] = primary_task.exception() if primary_task in done else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.stats["hedge_wins" if task is hedge_task else "primary_wins"] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from utils.config import get_cache_config
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so prompts that differ only in formatting share a cache entry"""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(provider: str, model: str, params: Dict[str, Any], prompt: str) -> str:
+    """Build a cache key from the provider, model, generation parameters and prompt"""
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    payload = json.dumps(
+        {"provider": provider, "model": model, "params": params, "prompt": prompt_hash},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LLM response cache: an in-memory LRU with TTL backed by a size-bounded SQLite file"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or get_cache_config()
+        self.enabled: bool = config["enabled"]
+        self.max_entries: int = config["max_entries"]
+        self.ttl_seconds: float = config["ttl_seconds"]
+        self.disk_path: Optional[str] = config["disk_path"]
+        self.disk_max_bytes: int = config["disk_max_bytes"]
+        self.disk_ttl_seconds: float = config["disk_ttl_seconds"]
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    # In-memory tier
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: str, stored_at: Optional[float] = None):
+        with self._lock:
+            self._memory[key] = (value, stored_at or time.time())
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.stats["memory_evictions"] += 1
+
+    # On-disk tier
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        """Open the cache database on first use"""
+        if not self.disk_path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            db = self._get_db()
+            if db is None:
+                return None
+            row = db.execute("SELECT response, size, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, size, created_at = row
+            now = time.time()
+            if now - created_at > self.disk_ttl_seconds:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                self._disk_bytes -= size
+                return None
+            db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+            return response, created_at
+
+    def _disk_set(self, key: str, value: str):
+        with self._lock:
+            db = self._get_db()
+            if db is None:
+                return
+            size = len(value.encode("utf-8"))
+            if size > self.disk_max_bytes:
+                return
+            now = time.time()
+            old = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+            self._evict_disk(db)
+            db.commit()
+
+    def _evict_disk(self, db: sqlite3.Connection):
+        """Drop least recently used rows until the file is back under its size bound"""
+        while self._disk_bytes > self.disk_max_bytes:
+            rows = db.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC LIMIT 64").fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            for key, size in rows:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                self.stats["disk_evictions"] += 1
+                if self._disk_bytes <= self.disk_max_bytes:
+                    break
+
+    # Public API
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a response in memory, then on disk"""
+        value = self._memory_get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        entry = self._disk_get(key)
+        if entry is not None:
+            value, created_at = entry
+            self.stats["disk_hits"] += 1
+            self._memory_set(key, value, created_at)
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: str):
+        """Store a response in both tiers"""
+        self._memory_set(key, value)
+        self._disk_set(key, value)
+        self.stats["stores"] += 1
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Look up a response without blocking the event loop on disk reads"""
+        value = self._memory_get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        """Store a response without blocking the event loop on disk writes"""
+        await asyncio.to_thread(self.set, key, value)
+
+    def record_bypass(self):
+        """Count a request that skipped the cache"""
+        self.stats["bypassed"] += 1
+
+    def clear(self):
+        """Remove every cached response from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            db = self._get_db()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+                self._disk_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_max_entries": self.max_entries,
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+        }
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, Optional
+
+import httpx
+
+from utils.config import (
+    ModelProvider,
+    get_gemini_response,
+    get_http_client_config,
+    stream_gemini_response
+)
+from utils.metrics import PROVIDER_ERRORS, PROVIDER_REQUEST_DURATION, PROVIDER_TOKENS
+from utils.provider_sessions import provider_sessions
+from utils.rate_limiter import (
+    ProviderError,
+    RateLimitError,
+    is_retryable_status,
+    parse_retry_after,
+    rate_limiters
+)
+from utils.tracing import tracer
+
+# HTTP/2 needs the optional "h2" package; fall back to HTTP/1.1 keep-alive without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Providers that speak the OpenAI-compatible chat completions protocol
+OPENAI_COMPATIBLE_PROVIDERS = ("deepseek", "llama3", "openrouter", "openai", "mock")
+
+
+class ProviderClient:
+    """Async client for an OpenAI-compatible chat completions API backed by a shared connection pool"""
+
+    def __init__(self, provider: ModelProvider, http_config: Optional[Dict[str, Any]] = None):
+        self.provider = provider
+        self.http_config = http_config or get_http_client_config()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client on first use (and again if the event loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._loop = loop
+            config = self.http_config
+            self._client = httpx.AsyncClient(
+                http2=config["http2"] and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=config["max_connections"],
+                    max_keepalive_connections=config["max_keepalive_connections"],
+                    keepalive_expiry=config["keepalive_expiry"],
+                ),
+                timeout=httpx.Timeout(
+                    connect=config["connect_timeout"],
+                    read=config["read_timeout"],
+                    write=config["write_timeout"],
+                    pool=config["pool_timeout"],
+                ),
+            )
+        return self._client
+
+    def _build_request(self, prompt: str, model: str, stream: bool = False) -> Dict[str, Any]:
+        """Build the URL, headers and JSON body for a chat completion request"""
+        config = provider_sessions.get_config(self.provider)
+        headers = {
+            "Authorization": f"Bearer {config['api_key']}",
+            "Content-Type": "application/json"
+        }
+        if self.provider in tracer.config["propagate_providers"]:
+            tracer.inject_headers(headers)
+        request = {
+            "url": f"{config['base_url']}/chat/completions",
+            "headers": headers,
+            "json": {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": config["temperature"],
+                "top_p": config["top_p"],
+                "max_tokens": config["max_tokens"]
+            }
+        }
+        if stream:
+            request["json"]["stream"] = True
+        return request
+
+    def _estimate_tokens(self, request: Dict[str, Any]) -> int:
+        """Rough token reservation for rate limiting: prompt size plus the completion budget"""
+        body = request["json"]
+        prompt_chars = sum(len(message["content"]) for message in body["messages"])
+        return prompt_chars // 4 + body.get("max_tokens", 0)
+
+    async def _send(self, request: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """Send a request under the provider's rate limits, retrying throttling and transient failures.
+
+        Returns a successful response; streamed responses must be closed by the caller.
+        """
+        limiter = rate_limiters.get(self.provider)
+        policy = limiter.retry_policy
+        estimated_tokens = self._estimate_tokens(request)
+        client = self._get_client()
+
+        attempt = 0
+        while True:
+            await limiter.acquire(estimated_tokens)
+            retry_after = None
+            try:
+                http_request = client.build_request(
+                    "POST",
+                    request["url"],
+                    json=request["json"],
+                    headers=request["headers"]
+                )
+                response = await client.send(http_request, stream=stream)
+            except httpx.TransportError as e:
+                error = ProviderError(self.provider, f"Error calling {self.provider} API: {str(e)}", retryable=True)
+            else:
+                limiter.update_from_headers(response.headers)
+                if response.status_code < 400:
+                    return response
+
+                body = (await response.aread()).decode("utf-8", "replace")[:200]
+                await response.aclose()
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                message = f"Error calling {self.provider} API: HTTP {response.status_code} {body}"
+                if response.status_code == 429:
+                    limiter.stats["rate_limited"] += 1
+                    limiter.block_for(policy.compute_delay(attempt, retry_after))
+                    error = RateLimitError(self.provider, message, retry_after=retry_after)
+                else:
+                    if response.status_code >= 500:
+                        limiter.stats["server_errors"] += 1
+                    error = ProviderError(
+                        self.provider,
+                        message,
+                        status_code=response.status_code,
+                        retryable=is_retryable_status(response.status_code),
+                        retry_after=retry_after
+                    )
+
+            if not error.retryable or attempt >= policy.max_retries:
+                raise error
+
+            limiter.stats["retries"] += 1
+            await asyncio.sleep(policy.compute_delay(attempt, retry_after))
+            attempt += 1
+
+    async def chat_completion(self, prompt: str, model: str) -> str:
+        """Send a chat completion request and return the generated text"""
+        request = self._build_request(prompt, model)
+        response = await self._send(request)
+        data = response.json()
+
+        usage = data.get("usage") or {}
+        rate_limiters.get(self.provider).record_usage(self._estimate_tokens(request), usage.get("total_tokens"))
+        if usage:
+            PROVIDER_TOKENS.inc(usage.get("prompt_tokens", 0), provider=self.provider, model=model, type="prompt")
+            PROVIDER_TOKENS.inc(usage.get("completion_tokens", 0), provider=self.provider, model=model, type="completion")
+        return data["choices"][0]["message"]["content"]
+
+    async def stream_chat_completion(self, prompt: str, model: str) -> AsyncIterator[str]:
+        """Send a streaming chat completion request and yield text deltas as they arrive"""
+        request = self._build_request(prompt, model, stream=True)
+        response = await self._send(request, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                # Server-sent events: payload lines start with "data:"
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                if not choices:
+                    continue
+                token = (choices[0].get("delta") or {}).get("content")
+                if token:
+                    yield token
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        """Close the underlying connection pool"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+class ProviderClientPool:
+    """Registry of per-provider clients so connections are reused across requests"""
+
+    def __init__(self):
+        self._clients: Dict[ModelProvider, ProviderClient] = {}
+
+    def get(self, provider: ModelProvider) -> ProviderClient:
+        """Get the shared client for a provider, creating it if needed"""
+        if provider not in OPENAI_COMPATIBLE_PROVIDERS:
+            raise ValueError(f"Unsupported model provider: {provider}")
+
+        if provider not in self._clients:
+            self._clients[provider] = ProviderClient(provider)
+        return self._clients[provider]
+
+    async def aclose(self):
+        """Close every provider connection pool"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients = {}
+
+
+def _record_provider_error(provider: str, model: str, error: Exception):
+    """Count a failed provider call by kind (rate_limited, http_<status> or exception name)"""
+    if isinstance(error, RateLimitError):
+        kind = "rate_limited"
+    elif isinstance(error, ProviderError) and error.status_code:
+        kind = f"http_{error.status_code}"
+    else:
+        kind = type(error).__name__
+    PROVIDER_ERRORS.inc(provider=provider, model=model, kind=kind)
+
+
+async def generate_completion(prompt: str, model: str, provider: ModelProvider = "deepseek") -> str:
+    """Generate a response from the specified provider without blocking the event loop"""
+    started = time.perf_counter()
+    try:
+        if provider == "gemini":
+            # The Gemini SDK is synchronous, so run it in a worker thread
+            return await asyncio.to_thread(get_gemini_response, prompt, model)
+
+        return await provider_clients.get(provider).chat_completion(prompt, model)
+    except Exception as e:
+        _record_provider_error(provider, model, e)
+        raise
+    finally:
+        PROVIDER_REQUEST_DURATION.observe(time.perf_counter() - started, provider=provider, model=model, mode="complete")
+
+
+async def _iterate_in_thread(iterator_factory) -> AsyncIterator[str]:
+    """Drive a blocking iterator in a worker thread and yield its items on the event loop"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterator_factory():
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Let the worker thread stop at the next chunk if the consumer went away
+        stop.set()
+
+
+async def stream_completion(prompt: str, model: str, provider: ModelProvider = "deepseek") -> AsyncIterator[str]:
+    """Yield response text from the specified provider as it is generated"""
+    started = time.perf_counter()
+    try:
+        if provider == "gemini":
+            tokens = _iterate_in_thread(lambda: stream_gemini_response(prompt, model))
+        else:
+            tokens = provider_clients.get(provider).stream_chat_completion(prompt, model)
+        async for token in tokens:
+            yield token
+    except Exception as e:
+        _record_provider_error(provider, model, e)
+        raise
+    finally:
+        PROVIDER_REQUEST_DURATION.observe(time.perf_counter() - started, provider=provider, model=model, mode="stream")
+
+
+# Create a singleton instance
+provider_clients = ProviderClientPool()
@@ -1,19 +1,38 @@
 import os
-from typing import Dict, List, Optional, Union
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
 from utils.config import (
     ModelProvider,
-    get_gemini_response,
-    get_model_config
+    get_hedging_config
 )
+from utils.hedging import HedgedRequestRunner, LatencyTracker
+from utils.llm_cache import ResponseCache, make_cache_key
+from utils.llm_clients import generate_completion, provider_clients, stream_completion
+from utils.metrics import (
+    CACHE_DISK_BYTES,
+    CACHE_ENTRIES,
+    CACHE_HIT_RATIO,
+    CACHE_LOOKUPS,
+    COALESCED_REQUESTS,
+    metrics
+)
+from utils.provider_sessions import provider_sessions
+from utils.rate_limiter import ProviderError, rate_limiters
+from utils.single_flight import SingleFlight
+from utils.state_store import state_store
+from utils.token_budget import estimate_tokens, token_usage
+from utils.tracing import tracer
+
+# Provider/model selection read during the current request, so the state store is queried once
+_request_settings: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_request_settings", default=None)
 
 class LLMManager:
     """Class to manage LLM model configurations and settings"""
     
     def __init__(self):
         # Load default provider from environment variables
-        self.default_provider: ModelProvider = os.getenv("DEFAULT_LLM_PROVIDER", "deepseek-chat")
-        self.current_provider: ModelProvider = self.default_provider
+        self.default_provider: ModelProvider = os.getenv("DEFAULT_LLM_PROVIDER", "deepseek")
         
         # Available models for each provider
         self.available_models: Dict[ModelProvider, List[str]] = {
@@ -21,17 +40,62 @@ class LLMManager:
             "deepseek": ["deepseek-chat", "deepseek-coder"],
             "llama3": ["llama-3-8b-chat", "llama-3-70b-chat"],
             "openrouter": ["openrouter/auto", "anthropic/claude-3-opus", "anthropic/claude-3-sonnet"],
-            "openai": ["o3-mini", "gpt-4o", "gpt-4-turbo"]
+            "openai": ["o3-mini", "gpt-4o", "gpt-4-turbo"],
+            "mock": ["mock-model"]
         }
         
-        # Current model for each provider
-        self.current_models: Dict[ModelProvider, str] = {
+        # Default model for each provider; selections live in the shared state store
+        self.default_models: Dict[ModelProvider, str] = {
             "gemini": "gemini-1.5-flash",
             "deepseek": "deepseek-chat",
             "llama3": "llama-3-70b-chat",
             "openrouter": "openrouter/auto",
-            "openai": "o3-mini"
+            "openai": "o3-mini",
+            "mock": "mock-model"
         }
+        
+        # Response cache shared by all requests
+        self.cache = ResponseCache()
+        
+        # Identical concurrent requests share a single provider call
+        self.coalesce_requests = os.getenv("LLM_COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes")
+        self.single_flight = SingleFlight()
+        
+        # Rolling latency/error statistics drive hedging and failover to a fallback provider
+        self.hedging_config = get_hedging_config()
+        self.latency_tracker = LatencyTracker(self.hedging_config["window_size"])
+        self.hedging = HedgedRequestRunner(self.latency_tracker, self.hedging_config)
+    
+    def begin_request(self):
+        """Start a request scope: the provider/model selection is read at most once within it"""
+        _request_settings.set({})
+    
+    def _settings(self) -> Dict[str, Any]:
+        settings = _request_settings.get()
+        if settings:
+            return settings
+        loaded = {
+            "provider": state_store.get("llm_settings", "current_provider", self.default_provider),
+            "models": {**self.default_models, **state_store.get("llm_settings", "current_models", {})},
+        }
+        if settings is not None:
+            settings.update(loaded)
+        return loaded
+    
+    def _invalidate_settings(self):
+        settings = _request_settings.get()
+        if settings is not None:
+            settings.clear()
+    
+    @property
+    def current_provider(self) -> ModelProvider:
+        """The selected provider, shared by all API workers"""
+        return self._settings()["provider"]
+    
+    @property
+    def current_models(self) -> Dict[ModelProvider, str]:
+        """The selected model for each provider, shared by all API workers"""
+        return dict(self._settings()["models"])
     
     def get_available_providers(self) -> List[ModelProvider]:
         """Get list of available model providers"""
@@ -49,7 +113,10 @@ class LLMManager:
         if provider not in self.available_models:
             return False
         
-        self.current_provider = provider
+        state_store.set("llm_settings", "current_provider", provider)
+        self._invalidate_settings()
+        # Pick up fresh configuration and model handles for the newly selected provider
+        provider_sessions.invalidate(provider)
         return True
     
     def set_model(self, provider: ModelProvider, model: str) -> bool:
@@ -57,7 +124,10 @@ class LLMManager:
         if provider not in self.available_models or model not in self.available_models[provider]:
             return False
         
-        self.current_models[provider] = model
+        # Merge into a new dict in one atomic update, so concurrent selections by other workers are kept
+        state_store.update("llm_settings", "current_models", lambda selected: {**(selected or {}), provider: model}, {})
+        self._invalidate_settings()
+        provider_sessions.invalidate(provider)
         return True
     
     def get_current_provider(self) -> ModelProvider:
@@ -71,18 +141,191 @@ class LLMManager:
         
         return self.current_models.get(provider, "")
     
-    def generate_response(self, prompt: str, provider: Optional[ModelProvider] = None, model: Optional[str] = None) -> str:
-        """Generate a response using the current or specified provider and model"""
+    def configure_hedging(self, enabled: bool, fallback_provider: Optional[ModelProvider] = None,
+                          fallback_model: Optional[str] = None, percentile: Optional[float] = None) -> bool:
+        """Enable or disable hedged requests to a fallback provider/model"""
+        if fallback_provider is not None and fallback_provider not in self.available_models:
+            return False
+        if fallback_model is not None:
+            provider = fallback_provider or self.hedging_config["fallback_provider"]
+            if fallback_model not in self.available_models.get(provider, []):
+                return False
+        if percentile is not None and not 0 < percentile <= 100:
+            return False
+        
+        self.hedging_config["enabled"] = enabled
+        if fallback_provider is not None:
+            self.hedging_config["fallback_provider"] = fallback_provider
+        if fallback_model is not None:
+            self.hedging_config["fallback_model"] = fallback_model
+        if percentile is not None:
+            self.hedging_config["percentile"] = percentile
+        return True
+    
+    def _get_fallback(self, provider: ModelProvider, model: str):
+        """Get the hedge target, or None when hedging is off or would hit the same provider/model"""
+        if not self.hedging_config["enabled"] or not self.hedging_config["fallback_provider"]:
+            return None
+        fallback_provider = self.hedging_config["fallback_provider"]
+        fallback_model = self.hedging_config["fallback_model"] or self.current_models.get(fallback_provider, "")
+        if (fallback_provider, fallback_model) == (provider, model):
+            return None
+        return fallback_provider, fallback_model
+    
+    async def _complete(self, prompt: str, provider: ModelProvider, model: str) -> str:
+        """Call the provider, hedging against the fallback provider when configured"""
+        async def call(target_provider: ModelProvider, target_model: str) -> str:
+            with tracer.span("provider.generate_completion", provider=target_provider, model=target_model):
+                return await generate_completion(prompt, model=target_model, provider=target_provider)
+        
+        fallback = self._get_fallback(provider, model)
+        if fallback is None:
+            return await self.latency_tracker.track(provider, model, lambda: call(provider, model))
+        return await self.hedging.run((provider, model), fallback, call)
+    
+    def get_hedging_stats(self) -> Dict[str, Any]:
+        """Get hedging settings, counters and per-provider latency statistics"""
+        return {
+            "config": dict(self.hedging_config),
+            "counters": self.hedging.get_stats(),
+            "providers": self.latency_tracker.get_stats()
+        }
+    
+    def _get_cache_key(self, prompt: str, provider: ModelProvider, model: str) -> str:
+        """Build the response cache key for a prompt and its generation settings"""
+        try:
+            config = provider_sessions.get_config(provider)
+        except ValueError:
+            config = {}
+        params = {k: v for k, v in config.items() if k not in ("api_key", "base_url")}
+        return make_cache_key(provider, model, params, prompt)
+    
+    async def _lookup_cache(self, prompt: str, provider: ModelProvider, model: str, use_cache: bool):
+        """Return (cache_key, cached_response); the key is None when the cache is skipped"""
+        if not self.cache.enabled:
+            return None, None
+        if not use_cache:
+            self.cache.record_bypass()
+            return None, None
+        
+        cache_key = self._get_cache_key(prompt, provider, model)
+        return cache_key, await self.cache.aget(cache_key)
+    
+    def record_token_usage(self, prompt: str, response: str, provider: ModelProvider, model: str, agent: Optional[str] = None):
+        """Record estimated prompt and completion tokens for a provider call"""
+        token_usage.record(
+            provider, model,
+            estimate_tokens(prompt, provider, model),
+            estimate_tokens(response, provider, model),
+            agent
+        )
+    
+    async def generate_response(self, prompt: str, provider: Optional[ModelProvider] = None, model: Optional[str] = None, use_cache: bool = True,
+                                agent: Optional[str] = None) -> str:
+        """Generate a response using the current or specified provider and model.
+        
+        Raises ProviderError (or RateLimitError) when the provider call fails after retries.
+        """
         if provider is None:
             provider = self.current_provider
         
         if model is None:
             model = self.current_models.get(provider, "")
         
-        try:
-            return get_gemini_response(prompt, model=model, provider=provider)
-        except Exception as e:
-            return f"Error generating response with {provider}/{model}: {str(e)}"
+        with tracer.span("LLMManager.generate_response", provider=provider, model=model, agent=agent or ""):
+            return await self._generate_response(prompt, provider, model, use_cache, agent)
+    
+    async def _generate_response(self, prompt: str, provider: ModelProvider, model: str, use_cache: bool,
+                                 agent: Optional[str]) -> str:
+        """Serve from the cache or call the provider, coalescing identical in-flight requests"""
+        with tracer.span("LLMManager.cache_lookup"):
+            cache_key, cached = await self._lookup_cache(prompt, provider, model, use_cache)
+        tracer.set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            return cached
+        
+        async def call_provider() -> str:
+            try:
+                response = await self._complete(prompt, provider, model)
+            except ProviderError:
+                raise
+            except Exception as e:
+                raise ProviderError(provider, f"Error generating response with {provider}/{model}: {str(e)}") from e
+            self.record_token_usage(prompt, response, provider, model, agent)
+            
+            # Only successful responses are cached
+            if cache_key is not None:
+                await self.cache.aset(cache_key, response)
+            return response
+        
+        if not self.coalesce_requests:
+            return await call_provider()
+        
+        flight_key = cache_key or self._get_cache_key(prompt, provider, model)
+        return await self.single_flight.do(flight_key, call_provider)
+    
+    async def stream_response(self, prompt: str, provider: Optional[ModelProvider] = None, model: Optional[str] = None, use_cache: bool = True,
+                              agent: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream a response token by token using the current or specified provider and model"""
+        if provider is None:
+            provider = self.current_provider
+        
+        if model is None:
+            model = self.current_models.get(provider, "")
+        
+        cache_key, cached = await self._lookup_cache(prompt, provider, model, use_cache)
+        if cached is not None:
+            yield cached
+            return
+        
+        chunks = []
+        async for token in stream_completion(prompt, model=model, provider=provider):
+            chunks.append(token)
+            yield token
+        
+        self.record_token_usage(prompt, "".join(chunks), provider, model, agent)
+        if cache_key is not None:
+            await self.cache.aset(cache_key, "".join(chunks))
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get response cache hit/miss statistics"""
+        return self.cache.get_stats()
+    
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """Get per-provider rate limiter and retry statistics"""
+        return rate_limiters.get_stats()
+    
+    def get_session_stats(self) -> Dict[str, Any]:
+        """Get provider SDK configuration and model handle cache statistics"""
+        return provider_sessions.get_stats()
+    
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """Get request coalescing statistics"""
+        return {"enabled": self.coalesce_requests, **self.single_flight.get_stats()}
+    
+    def get_token_usage_stats(self) -> Dict[str, Any]:
+        """Get prompt/completion token totals per provider/model and per agent"""
+        return token_usage.get_stats()
+    
+    def collect_metrics(self):
+        """Mirror cache and coalescing counters into the metrics registry at scrape time"""
+        cache = self.cache.get_stats()
+        CACHE_LOOKUPS.set(cache["memory_hits"], result="memory_hit")
+        CACHE_LOOKUPS.set(cache["disk_hits"], result="disk_hit")
+        CACHE_LOOKUPS.set(cache["misses"], result="miss")
+        CACHE_LOOKUPS.set(cache["bypassed"], result="bypass")
+        CACHE_HIT_RATIO.set(cache["hit_ratio"])
+        CACHE_ENTRIES.set(cache["memory_entries"])
+        CACHE_DISK_BYTES.set(cache["disk_bytes"])
+        COALESCED_REQUESTS.set(self.single_flight.get_stats()["coalesced"])
+    
+    def clear_cache(self):
+        """Remove all cached responses"""
+        self.cache.clear()
+    
+    async def close(self):
+        """Close the pooled provider connections"""
+        await provider_clients.aclose()
     
     def get_provider_display_name(self, provider: ModelProvider) -> str:
         """Get a user-friendly display name for a provider"""
@@ -91,9 +334,11 @@ class LLMManager:
             "deepseek": "DeepSeek R1",
             "llama3": "Meta Llama 3",
             "openrouter": "OpenRouter",
-            "openai": "OpenAI o3-mini"
+            "openai": "OpenAI o3-mini",
+            "mock": "Mock Provider (local)"
         }
         return display_names.get(provider, provider)
 
 # Create a singleton instance
-llm_manager = LLMManager() 
\ No newline at end of file
+llm_manager = LLMManager()
+metrics.register_collector(llm_manager.collect_metrics) 
\ No newline at end of file
@@ -0,0 +1,212 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Default latency buckets in seconds, from fast file I/O up to long LLM completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirror a cumulative count kept elsewhere (used by scrape-time collectors)"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    type_name = "gauge"
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution of observed values"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], Dict[str, object]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(series["counts"]), series["sum"], series["count"]) for key, series in self._series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics and renders them in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], None]):
+        """Register a callback that refreshes gauges/counters from other components at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Create a singleton instance
+metrics = MetricsRegistry()
+
+# HTTP layer
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "HTTP requests by route, method and status", ["method", "route", "status"])
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and method", ["method", "route"])
+
+# Agents
+AGENT_REQUEST_DURATION = metrics.histogram(
+    "agent_request_duration_seconds", "Agent request latency by role and operation", ["role", "operation"])
+AGENT_ERRORS = metrics.counter(
+    "agent_errors_total", "Failed agent requests by role and operation", ["role", "operation"])
+AGENT_CONTEXT_TOKENS = metrics.histogram(
+    "agent_context_tokens", "Estimated tokens of other agents' context included in a prompt", ["role"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+
+# LLM providers
+PROVIDER_REQUEST_DURATION = metrics.histogram(
+    "llm_provider_request_duration_seconds", "LLM provider call latency", ["provider", "model", "mode"])
+PROVIDER_ERRORS = metrics.counter(
+    "llm_provider_errors_total", "Failed LLM provider calls", ["provider", "model", "kind"])
+PROVIDER_TOKENS = metrics.counter(
+    "llm_tokens_total", "Tokens reported or estimated per provider and model", ["provider", "model", "type"])
+
+# LLM response cache and request coalescing (mirrored from their own counters at scrape time)
+CACHE_LOOKUPS = metrics.counter(
+    "llm_cache_lookups_total", "LLM response cache lookups by result", ["result"])
+CACHE_HIT_RATIO = metrics.gauge(
+    "llm_cache_hit_ratio", "Fraction of LLM response cache lookups served from the cache")
+CACHE_ENTRIES = metrics.gauge(
+    "llm_cache_entries", "Entries held in the in-memory cache tier")
+CACHE_DISK_BYTES = metrics.gauge(
+    "llm_cache_disk_bytes", "Bytes held in the on-disk cache tier")
+COALESCED_REQUESTS = metrics.counter(
+    "llm_coalesced_requests_total", "LLM requests that shared an in-flight provider call")
+
+# Storage
+STORAGE_IO_DURATION = metrics.histogram(
+    "storage_io_duration_seconds", "SharedMemory and ProjectManager I/O latency", ["component", "operation"])
+STORAGE_BYTES_WRITTEN = metrics.counter(
+    "storage_bytes_written_total", "Bytes written by SharedMemory and ProjectManager", ["component", "operation"])
+
+# Retrieval
+RETRIEVAL_INDEX_DROPPED = metrics.counter(
+    "retrieval_index_dropped_total", "Retrieval indexing operations dropped because the queue was full", ["kind"])
@@ -0,0 +1,254 @@
+"""OpenAI-compatible stand-in LLM provider for offline load testing.
+
+Run it with:
+
+    python -m utils.mock_llm_server --port 8100 --latency lognormal:-1.2,0.4 --tokens-per-second 80
+
+and point the API at it with DEFAULT_LLM_PROVIDER=mock (MOCK_LLM_BASE_URL defaults to
+http://127.0.0.1:8100/v1). Every setting can also be changed at runtime via POST /mock/config.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Vocabulary used to build deterministic canned responses
+WORDS = (
+    "the service architecture uses an API gateway with stateless workers behind a load balancer "
+    "deploy containers through a CI pipeline and monitor latency error rates and throughput "
+    "design the schema with indexes on hot columns cache reads and batch writes to reduce cost "
+    "document each endpoint with examples and keep the onboarding guide short and practical"
+).split()
+
+
+def get_mock_server_config() -> Dict[str, Any]:
+    """Get mock provider behaviour from environment variables"""
+    return {
+        "latency": os.getenv('MOCK_LLM_LATENCY', "fixed:0.05"),
+        "tokens_per_second": float(os.getenv('MOCK_LLM_TOKENS_PER_SECOND', "0")),
+        "response_words": int(os.getenv('MOCK_LLM_RESPONSE_WORDS', "60")),
+        "error_rate": float(os.getenv('MOCK_LLM_ERROR_RATE', "0")),
+        "rate_limit_rate": float(os.getenv('MOCK_LLM_RATE_LIMIT_RATE', "0")),
+        "retry_after": float(os.getenv('MOCK_LLM_RETRY_AFTER', "1")),
+        "requests_per_minute": int(os.getenv('MOCK_LLM_REQUESTS_PER_MINUTE', "0")),
+        "seed": int(os.getenv('MOCK_LLM_SEED', "42")),
+        "responses_file": os.getenv('MOCK_LLM_RESPONSES_FILE') or None,
+    }
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """Sample a delay in seconds from a spec such as "fixed:0.2", "uniform:0.1,0.5",
+    "normal:0.3,0.05", "lognormal:-1.2,0.4" or "exponential:0.3" (mean)"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "fixed":
+        delay = values[0]
+    elif kind == "uniform":
+        delay = rng.uniform(values[0], values[1])
+    elif kind == "normal":
+        delay = rng.gauss(values[0], values[1])
+    elif kind == "lognormal":
+        delay = rng.lognormvariate(values[0], values[1])
+    elif kind == "exponential":
+        delay = rng.expovariate(1.0 / values[0])
+    else:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    return max(0.0, delay)
+
+
+class MockProvider:
+    """State and behaviour of the mock provider: canned responses, fault injection and counters"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or get_mock_server_config()
+        self.rng = random.Random(self.config["seed"])
+        self.canned: Dict[str, str] = {}
+        self.window_started = time.monotonic()
+        self.window_requests = 0
+        self.stats = {"requests": 0, "streams": 0, "errors_injected": 0, "rate_limited": 0}
+        self.load_canned_responses()
+
+    def load_canned_responses(self):
+        """Load {"prompt substring": "response"} pairs from the configured JSON file"""
+        path = self.config.get("responses_file")
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.canned = json.load(f)
+
+    def update(self, changes: Dict[str, Any]):
+        for key, value in changes.items():
+            if key in self.config:
+                self.config[key] = value
+        if "seed" in changes:
+            self.rng = random.Random(self.config["seed"])
+        if "responses_file" in changes:
+            self.load_canned_responses()
+
+    def build_response(self, prompt: str) -> str:
+        """Deterministic response for a prompt: a canned match or words seeded by the prompt hash"""
+        for fragment, response in self.canned.items():
+            if fragment in prompt:
+                return response
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        words = random.Random(seed).choices(WORDS, k=self.config["response_words"])
+        return " ".join(words).capitalize() + "."
+
+    def rate_limit_headers(self) -> Dict[str, str]:
+        limit = self.config["requests_per_minute"]
+        if not limit:
+            return {}
+        reset = max(0.0, 60 - (time.monotonic() - self.window_started))
+        return {
+            "x-ratelimit-limit-requests": str(limit),
+            "x-ratelimit-remaining-requests": str(max(0, limit - self.window_requests)),
+            "x-ratelimit-reset-requests": f"{reset:.0f}s",
+        }
+
+    def check_faults(self) -> Optional[JSONResponse]:
+        """Return an injected 429/500 response, or None if the request should succeed"""
+        now = time.monotonic()
+        if now - self.window_started >= 60:
+            self.window_started = now
+            self.window_requests = 0
+        self.window_requests += 1
+
+        limit = self.config["requests_per_minute"]
+        over_limit = bool(limit) and self.window_requests > limit
+        if over_limit or self.rng.random() < self.config["rate_limit_rate"]:
+            self.stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit_error"}},
+                headers={"Retry-After": str(self.config["retry_after"]), **self.rate_limit_headers()}
+            )
+        if self.rng.random() < self.config["error_rate"]:
+            self.stats["errors_injected"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Injected server error (mock)", "type": "server_error"}}
+            )
+        return None
+
+    def token_delay(self) -> float:
+        tps = self.config["tokens_per_second"]
+        return 1.0 / tps if tps > 0 else 0.0
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> FastAPI:
+    """Create the mock provider application"""
+    app = FastAPI(title="Mock LLM Provider")
+    provider = MockProvider(config)
+    app.state.provider = provider
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: Dict[str, Any] = Body(...)):
+        provider.stats["requests"] += 1
+        messages: List[Dict[str, Any]] = body.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        model = body.get("model", "mock-model")
+
+        fault = provider.check_faults()
+        await asyncio.sleep(sample_latency(provider.config["latency"], provider.rng))
+        if fault is not None:
+            return fault
+
+        text = provider.build_response(prompt)
+        tokens = text.split(" ")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // 4),
+            "completion_tokens": len(tokens),
+            "total_tokens": max(1, len(prompt) // 4) + len(tokens),
+        }
+
+        if body.get("stream"):
+            provider.stats["streams"] += 1
+
+            async def event_stream():
+                for i, token in enumerate(tokens):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": token if i == 0 else " " + token}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    delay = provider.token_delay()
+                    if delay:
+                        await asyncio.sleep(delay)
+                final = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(event_stream(), media_type="text/event-stream", headers=provider.rate_limit_headers())
+
+        # Simulate generation time for the whole completion
+        delay = provider.token_delay()
+        if delay:
+            await asyncio.sleep(delay * len(tokens))
+
+        return JSONResponse(
+            content={
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            },
+            headers=provider.rate_limit_headers()
+        )
+
+    @app.get("/mock/stats")
+    async def get_stats():
+        return {"config": provider.config, "stats": provider.stats}
+
+    @app.post("/mock/config")
+    async def update_config(changes: Dict[str, Any] = Body(...)):
+        provider.update(changes)
+        return {"config": provider.config}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the OpenAI-compatible mock LLM provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", help='e.g. "fixed:0.2", "uniform:0.1,0.5", "lognormal:-1.2,0.4"')
+    parser.add_argument("--tokens-per-second", type=float)
+    parser.add_argument("--response-words", type=int)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--rate-limit-rate", type=float)
+    parser.add_argument("--requests-per-minute", type=int)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--responses-file")
+    args = parser.parse_args()
+
+    config = get_mock_server_config()
+    for key in ("latency", "tokens_per_second", "response_words", "error_rate",
+                "rate_limit_rate", "requests_per_minute", "seed", "responses_file"):
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+
+    import uvicorn
+    print(f"🤖 Mock LLM provider listening on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
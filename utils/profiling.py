@@ -0,0 +1,212 @@
+"""On-demand profiling of live requests and always-on timing of hot functions.
+
+A single request is profiled by sending an X-Profile header ("cprofile" or "sample"); a time
+window is profiled through the admin endpoints. cProfile results are kept as pstats dumps
+(loadable by snakeviz, gprof2dot or pstats) and sampling results as collapsed stacks, the
+input format of flamegraph.pl and speedscope.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import get_profiling_config
+from utils.metrics import metrics
+
+PROFILE_MODES = ("cprofile", "sample")
+
+FUNCTION_DURATION = metrics.histogram(
+    "function_duration_seconds", "Latency of instrumented hot functions", ["function"])
+
+
+def timed(name: Optional[str] = None):
+    """Decorator recording every call's duration in the function_duration_seconds histogram"""
+    def decorator(func: Callable):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    FUNCTION_DURATION.observe(time.perf_counter() - started, function=label)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                FUNCTION_DURATION.observe(time.perf_counter() - started, function=label)
+        return wrapper
+    return decorator
+
+
+class SamplingProfiler:
+    """Samples the stacks of selected threads at a fixed interval and aggregates collapsed stacks.
+
+    By default it samples the thread that started it (the event loop thread for requests) and
+    the asyncio default executor threads, where asyncio.to_thread work runs.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_ids: Optional[List[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids or [threading.get_ident()])
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _target_threads(self) -> Dict[int, str]:
+        targets = {}
+        for thread in threading.enumerate():
+            if thread.ident in self.thread_ids or thread.name.startswith("asyncio_"):
+                targets[thread.ident] = thread.name
+        return targets
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            targets = self._target_threads()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in targets:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(targets[thread_id])
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class ProfileSession:
+    """One running or finished profile (a single request or a time window)"""
+
+    def __init__(self, mode: str, label: str, sample_interval: float):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.label = label
+        self.started_at = datetime.now().isoformat()
+        self.duration: Optional[float] = None
+        self._started = time.perf_counter()
+        self._profiler = cProfile.Profile() if mode == "cprofile" else SamplingProfiler(sample_interval)
+        self._pstats: Optional[bytes] = None
+        self._text: Optional[str] = None
+
+    def start(self):
+        if self.mode == "cprofile":
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+
+    def stop(self):
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            self._profiler.create_stats()
+            self._pstats = marshal.dumps(self._profiler.stats)
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            self._text = out.getvalue()
+        else:
+            self._profiler.stop()
+        self.duration = time.perf_counter() - self._started
+
+    def render(self, output_format: str):
+        """Return the result as "pstats" (bytes), "text" or "collapsed" (str)"""
+        if self.mode == "cprofile":
+            if output_format == "pstats":
+                return self._pstats
+            if output_format == "text":
+                return self._text
+            raise ValueError("cProfile results are available as 'pstats' or 'text'")
+        if output_format == "collapsed":
+            return self._profiler.collapsed()
+        raise ValueError("Sampling results are available as 'collapsed'")
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "id": self.id,
+            "mode": self.mode,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "formats": ["pstats", "text"] if self.mode == "cprofile" else ["collapsed"],
+        }
+        if self.mode == "sample":
+            summary["samples"] = self._profiler.samples
+        return summary
+
+
+class ProfilerManager:
+    """Runs at most one profile at a time and keeps the most recent results"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or get_profiling_config()
+        self._profiles: "OrderedDict[str, ProfileSession]" = OrderedDict()
+        # cProfile cannot nest and overlapping samples would mix requests, so profiles are exclusive
+        self._active = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config["enabled"]
+
+    def is_authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and (self.config["token"] is None or token == self.config["token"])
+
+    def begin(self, mode: str, label: str) -> Optional[ProfileSession]:
+        """Start a profile, or return None if another one is already running"""
+        if not self._active.acquire(blocking=False):
+            return None
+        try:
+            session = ProfileSession(mode, label, self.config["sample_interval"])
+            session.start()
+        except Exception:
+            self._active.release()
+            raise
+        return session
+
+    def end(self, session: ProfileSession):
+        try:
+            session.stop()
+        finally:
+            self._active.release()
+        self._profiles[session.id] = session
+        while len(self._profiles) > self.config["max_profiles"]:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[ProfileSession]:
+        return self._profiles.get(profile_id)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        return [session.summary() for session in reversed(self._profiles.values())]
+
+
+# Create a singleton instance
+profiler = ProfilerManager()
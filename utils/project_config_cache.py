@@ -0,0 +1,264 @@
+import os
+import json
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from utils.config import get_project_cache_config
+from utils.metrics import STORAGE_BYTES_WRITTEN, STORAGE_IO_DURATION
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking on Windows; use a single API worker there
+    fcntl = None
+
+class ProjectConfigCache:
+    """Parsed project_config.json files, shared by every ProjectManager in the process.
+
+    A config is parsed once and then served from memory until the file's mtime/size show it was
+    changed by someone else. Changes mark the config dirty and are written either immediately
+    ("sync" durability) or in the background ("batch"), where every change made to a project
+    within a flush interval ends up in a single write. Files are written to a temporary file and
+    renamed, so readers never see a partial document.
+
+    Changes are kept as mutations (functions from the old config to the new one) until they are
+    written. When another process changed the file in the meantime, the pending mutations are
+    re-applied to its version instead of overwriting it. Writes hold an exclusive lock on the
+    project directory, so workers sharing the projects directory cannot lose each other's updates.
+    """
+    def __init__(self, durability=None, flush_interval=None, flush_max_pending=None):
+        config = get_project_cache_config()
+        self.durability = durability or config["durability"]
+        self.flush_interval = flush_interval if flush_interval is not None else config["flush_interval"]
+        self.flush_max_pending = flush_max_pending if flush_max_pending is not None else config["flush_max_pending"]
+        if self.durability not in ("sync", "batch"):
+            raise ValueError(f"Unknown project config durability level: {self.durability}")
+
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        # Config path -> {"config", "signature", "version", "flushed_version", "mutations"}; an entry
+        # is dirty while its version is ahead of the last version written to disk, and "mutations"
+        # holds the (version, mutator) pairs not written yet
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending = 0
+        self._flush_requested = threading.Event()
+        self._closed = False
+        self._flusher = None
+        self.stats = {"cache_hits": 0, "loads": 0, "external_changes": 0, "conflicts": 0, "dropped_changes": 0,
+                      "changes": 0, "writes": 0, "write_errors": 0}
+
+        if self.durability == "batch":
+            self._flusher = threading.Thread(target=self._flush_loop, name="project-config-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    @staticmethod
+    def _signature(path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # Files are replaced by renaming, so a write by another process always changes the inode
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        with STORAGE_IO_DURATION.time(component="project_manager", operation="config_read"):
+            with open(path, "r") as f:
+                return json.load(f)
+
+    @contextmanager
+    def _locked_directory(self, path: str):
+        """Hold an exclusive lock on the directory of path, shared with the other worker processes"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.dirname(path), os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _is_dirty(entry: Dict[str, Any]) -> bool:
+        return entry["version"] != entry["flushed_version"]
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Get the config stored at path, or None if there is none; the result is shared and read-only"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and self._is_dirty(entry):
+                # Keep the unwritten changes, on top of the version on disk if someone else changed it
+                if not self._rebase(path, entry):
+                    self.stats["cache_hits"] += 1
+                return entry["config"]
+
+            signature = self._signature(path)
+            if signature is None:
+                self._entries.pop(path, None)
+                return None
+            if entry is not None and signature == entry["signature"]:
+                self.stats["cache_hits"] += 1
+                return entry["config"]
+
+            if entry is not None:
+                self.stats["external_changes"] += 1
+            config = self._read(path)
+            self._entries[path] = {"config": config, "signature": signature, "version": 0, "flushed_version": 0,
+                                   "mutations": []}
+            self.stats["loads"] += 1
+            return config
+
+    def _rebase(self, path: str, entry: Dict[str, Any]) -> bool:
+        """Re-apply an entry's unwritten mutations to the file on disk if it changed since it was read.
+
+        Must be called with the lock held. Returns whether the entry's config was replaced.
+        """
+        signature = self._signature(path)
+        if signature is None or signature == entry["signature"]:
+            return False
+        config = self._read(path)
+        mutations = []
+        for version, mutator in entry["mutations"]:
+            try:
+                config = mutator(config)
+                mutations.append((version, mutator))
+            except Exception as e:
+                # The change no longer applies (e.g. its task was removed by another worker)
+                self.stats["dropped_changes"] += 1
+                print(f"Dropping a change to project config {path} that conflicts with another worker: {str(e)}")
+        entry["config"] = config
+        entry["signature"] = signature
+        entry["mutations"] = mutations
+        self.stats["conflicts"] += 1
+        return True
+
+    def update(self, path: str, mutator: Callable[[Dict[str, Any]], Dict[str, Any]], flush: bool = False) -> Dict[str, Any]:
+        """Change the config at path to mutator(config) and return the new config.
+
+        mutator gets the shared config and must return a new one instead of modifying it. It may be
+        called again later on a newer version of the file, so it must not depend on anything else that
+        can change in between.
+        Raises FileNotFoundError if there is no config at path.
+        """
+        with self._lock:
+            config = self.get(path)
+            if config is None:
+                raise FileNotFoundError(f"Project config {path} does not exist")
+            config = mutator(config)
+            self._store(path, config, mutator)
+            write_now = flush or self.durability == "sync" or self._closed
+        if write_now:
+            self.flush(path)
+        return config
+
+    def put(self, path: str, config: Dict[str, Any], flush: bool = False):
+        """Store a whole config, replacing whatever is on disk; it is written now if flush is set or durability is "sync".
+
+        The cache keeps config as is, so the caller must not modify it afterwards.
+        """
+        with self._lock:
+            self._store(path, config, lambda current: config)
+            write_now = flush or self.durability == "sync" or self._closed
+        if write_now:
+            self.flush(path)
+
+    def _store(self, path: str, config: Dict[str, Any], mutator: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        entry = self._entries.get(path)
+        if entry is None:
+            entry = self._entries[path] = {"config": config, "signature": None, "version": 0, "flushed_version": 0,
+                                           "mutations": []}
+        entry["config"] = config
+        entry["version"] += 1
+        entry["mutations"].append((entry["version"], mutator))
+        self._pending += 1
+        self.stats["changes"] += 1
+        if self.durability == "batch" and self._pending >= self.flush_max_pending:
+            self._flush_requested.set()
+
+    def discard(self, path: str):
+        """Forget a config, dropping any unwritten changes (e.g. when its project is deleted)"""
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing project configs: {str(e)}")
+
+    def flush(self, path: Optional[str] = None):
+        """Write dirty configs to disk (only the one at path, if given)"""
+        with self._flush_lock:
+            with self._lock:
+                dirty = [(entry_path, entry, entry["config"], entry["version"]) for entry_path, entry in self._entries.items()
+                         if self._is_dirty(entry) and (path is None or entry_path == path)]
+                if path is None:
+                    self._pending = 0
+
+            for entry_path, entry, config, version in dirty:
+                try:
+                    self._write(entry_path, entry, config, version)
+                except Exception as e:
+                    # The entry stays dirty and is retried on the next flush
+                    self.stats["write_errors"] += 1
+                    print(f"Error writing project config {entry_path}: {str(e)}")
+
+    def _write(self, path: str, entry: Dict[str, Any], config: Dict[str, Any], version: int):
+        # Stored configs are never modified in place, so they can be serialized and written to the
+        # temporary file without holding the lock; it is only taken to swap the file in
+        with STORAGE_IO_DURATION.time(component="project_manager", operation="config_write"):
+            data = json.dumps(config, indent=2)
+            if not os.path.isdir(os.path.dirname(path)):
+                # The project was deleted; there is nowhere to write its config
+                self.discard(path)
+                return
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+
+            with self._locked_directory(path), self._lock:
+                if self._entries.get(path) is not entry:
+                    os.remove(tmp_path)
+                    return
+                self._rebase(path, entry)
+                if entry["config"] is not config:
+                    # Rebased on another worker's version (or changed again) since the snapshot
+                    config, version = entry["config"], entry["version"]
+                    data = json.dumps(config, indent=2)
+                    with open(tmp_path, "w") as f:
+                        f.write(data)
+                os.replace(tmp_path, path)
+                entry["signature"] = self._signature(path)
+                entry["flushed_version"] = max(entry["flushed_version"], version)
+                entry["mutations"] = [(v, mutator) for v, mutator in entry["mutations"] if v > version]
+                self.stats["writes"] += 1
+        STORAGE_BYTES_WRITTEN.inc(len(data.encode("utf-8")), component="project_manager", operation="config_write")
+
+    def close(self):
+        """Stop the background flusher and write any dirty configs"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_requested.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            dirty = sum(1 for entry in self._entries.values() if self._is_dirty(entry))
+            return {
+                "durability": self.durability,
+                "cached": len(self._entries),
+                "dirty": dirty,
+                **self.stats,
+            }
+
+# Create a singleton instance
+project_config_cache = ProjectConfigCache()
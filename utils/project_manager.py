@@ -1,9 +1,15 @@
 import os
-import json
+import copy
 import uuid
 import shutil
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable
 from datetime import datetime
+from memory.retrieval import retriever
+from utils.metrics import STORAGE_BYTES_WRITTEN, STORAGE_IO_DURATION
+from utils.profiling import timed
+from utils.project_config_cache import project_config_cache
+from utils.state_store import state_store
+from utils.tracing import traced
 
 class ProjectManager:
     """Manages project configurations, files, and tasks."""
@@ -11,13 +17,40 @@ class ProjectManager:
     def __init__(self, base_directory: str):
         self.base_directory = base_directory
         self._ensure_base_directory()
-        self.current_project = None
+    
+    @property
+    def current_project(self) -> Optional[str]:
+        """The project being worked on, shared by all API workers"""
+        return state_store.get("projects", "current_project")
+    
+    @current_project.setter
+    def current_project(self, name: Optional[str]):
+        state_store.set("projects", "current_project", name)
     
     def _ensure_base_directory(self):
         """Ensure the base directory exists."""
         if not os.path.exists(self.base_directory):
             os.makedirs(self.base_directory)
     
+    def _config_path(self, project_name: str) -> str:
+        return os.path.join(self.base_directory, project_name, "project_config.json")
+    
+    @timed()
+    @traced()
+    def _save_config(self, project_name: str, config: Dict[str, Any], flush: bool = False):
+        """Store a project's configuration; the config cache writes it to disk (now, if flush is set)."""
+        project_config_cache.put(self._config_path(project_name), config, flush=flush)
+    
+    @timed()
+    @traced()
+    def _write_content(self, full_path: str, content: str, encoding: Optional[str] = None):
+        """Write a project file's content."""
+        with STORAGE_IO_DURATION.time(component="project_manager", operation="file_write"):
+            with open(full_path, "w", encoding=encoding) as f:
+                f.write(content)
+        STORAGE_BYTES_WRITTEN.inc(len(content.encode(encoding or "utf-8")), component="project_manager", operation="file_write")
+    
+    @traced()
     def create_project(self, name: str, description: str) -> Dict[str, Any]:
         """Create a new project with the specified name and description."""
         project_id = str(uuid.uuid4())
@@ -52,28 +85,64 @@ class ProjectManager:
             }
         }
         
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(project_config, f, indent=2)
+        # Write the new config right away so the project is visible to other processes
+        self._save_config(name, project_config, flush=True)
         
         # Create README.md
         readme_path = os.path.join(project_dir, "README.md")
-        with open(readme_path, "w") as f:
-            f.write(f"# {name}\n\n{description}\n\n## Getting Started\n\nThis project is managed by the AI Avatar Team.")
+        self._write_content(readme_path, f"# {name}\n\n{description}\n\n## Getting Started\n\nThis project is managed by the AI Avatar Team.")
         
         self.current_project = name
         return project_config
     
+    @timed()
+    @traced()
     def get_project(self, name: str) -> Dict[str, Any]:
-        """Get project configuration by name."""
-        project_dir = os.path.join(self.base_directory, name)
-        config_file = os.path.join(project_dir, "project_config.json")
+        """Get project configuration by name (the cached copy, which must not be modified)."""
+        config = project_config_cache.get(self._config_path(name))
         
-        if not os.path.exists(config_file):
+        if config is None:
             raise FileNotFoundError(f"Project {name} does not exist")
         
-        with open(config_file, "r") as f:
-            return json.load(f)
+        return config
+    
+    @timed()
+    @traced()
+    def _update_config(self, project_name: str, mutate: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Apply mutate to a shallow copy of a project's configuration, store it and return mutate's result.
+        
+        Cached configs are shared with readers and the flusher, so they are never edited in place:
+        mutate copies each nested list or dict before changing it, and if it fails halfway its copy
+        is simply dropped. Copying only what changes keeps updates cheap for large projects. mutate
+        is re-applied if another worker changed the config first, so it must only depend on the
+        config it is given.
+        """
+        result = {}
+        
+        def mutator(config: Dict[str, Any]) -> Dict[str, Any]:
+            config = dict(config)
+            result["value"] = mutate(config)
+            return config
+        
+        try:
+            project_config_cache.update(self._config_path(project_name), mutator)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Project {project_name} does not exist")
+        return result["value"]
+    
+    @staticmethod
+    def _copy_structure_path(config: Dict[str, Any], directories: List[str], create: bool) -> Dict[str, Any]:
+        """Copy the structure nodes along a directory path and return the children of the deepest one reached."""
+        current = config["structure"] = dict(config["structure"])
+        for part in directories:
+            if part not in current:
+                if not create:
+                    break
+                current[part] = {"type": "directory", "children": {}}
+            else:
+                current[part] = {**current[part], "children": dict(current[part]["children"])}
+            current = current[part]["children"]
+        return current
     
     def list_projects(self) -> List[str]:
         """List all available projects."""
@@ -83,6 +152,8 @@ class ProjectManager:
         return [d for d in os.listdir(self.base_directory) 
                 if os.path.isdir(os.path.join(self.base_directory, d))]
     
+    @timed()
+    @traced()
     def create_file(self, project_name: str, file_path: str, content: str) -> Dict[str, Any]:
         """Create a new file in the project."""
         project_dir = os.path.join(self.base_directory, project_name)
@@ -92,37 +163,30 @@ class ProjectManager:
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
         
         # Write content to the file
-        with open(full_path, "w") as f:
-            f.write(content)
+        self._write_content(full_path, content)
+        retriever.index_artifact(project_name, file_path, content)
         
         # Update project config
-        config = self.get_project(project_name)
         file_info = {
             "id": str(uuid.uuid4()),
             "path": file_path,
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat(),
         }
-        config["files"].append(file_info)
-        
-        # Update structure
-        parts = file_path.split(os.sep)
-        current = config["structure"]
-        for i, part in enumerate(parts):
-            if i == len(parts) - 1:  # Last part (file)
-                current.setdefault(part, {"type": "file"})
-            else:  # Directory
-                if part not in current:
-                    current[part] = {"type": "directory", "children": {}}
-                current = current[part]["children"]
-        
-        # Save updated config
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
+        
+        def add_file(config: Dict[str, Any]):
+            config["files"] = config["files"] + [file_info]
+            
+            # Update structure
+            parts = file_path.split(os.sep)
+            current = self._copy_structure_path(config, parts[:-1], create=True)
+            current.setdefault(parts[-1], {"type": "file"})
+        
+        self._update_config(project_name, add_file)
         
         return file_info
     
+    @traced()
     def read_file(self, project_name: str, file_path: str) -> str:
         """Read a file from the project."""
         project_dir = os.path.join(self.base_directory, project_name)
@@ -134,6 +198,8 @@ class ProjectManager:
         with open(full_path, "r") as f:
             return f.read()
     
+    @timed()
+    @traced()
     def update_file(self, project_name: str, file_path: str, content: str) -> Dict[str, Any]:
         """Update a file in the project."""
         project_dir = os.path.join(self.base_directory, project_name)
@@ -143,34 +209,30 @@ class ProjectManager:
             raise FileNotFoundError(f"File {file_path} does not exist in project {project_name}")
         
         # Write content to the file
-        with open(full_path, "w") as f:
-            f.write(content)
+        self._write_content(full_path, content)
+        retriever.index_artifact(project_name, file_path, content)
         
         # Update project config
-        config = self.get_project(project_name)
-        file_info = None
-        for file in config["files"]:
-            if file["path"] == file_path:
-                file["updated_at"] = datetime.now().isoformat()
-                file_info = file
-                break
-        
-        if not file_info:
-            file_info = {
-                "id": str(uuid.uuid4()),
-                "path": file_path,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-            }
-            config["files"].append(file_info)
+        updated_at = datetime.now().isoformat()
+        new_file_info = {
+            "id": str(uuid.uuid4()),
+            "path": file_path,
+            "created_at": updated_at,
+            "updated_at": updated_at,
+        }
         
-        # Save updated config
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
+        def touch_file(config: Dict[str, Any]) -> Dict[str, Any]:
+            config["files"] = list(config["files"])
+            for i, file in enumerate(config["files"]):
+                if file["path"] == file_path:
+                    config["files"][i] = {**file, "updated_at": updated_at}
+                    return config["files"][i]
+            config["files"].append(new_file_info)
+            return new_file_info
         
-        return file_info
+        return self._update_config(project_name, touch_file)
     
+    @traced()
     def delete_file(self, project_name: str, file_path: str) -> bool:
         """Delete a file from the project."""
         project_dir = os.path.join(self.base_directory, project_name)
@@ -183,28 +245,21 @@ class ProjectManager:
         os.remove(full_path)
         
         # Update project config
-        config = self.get_project(project_name)
-        config["files"] = [f for f in config["files"] if f["path"] != file_path]
-        
-        # Remove from structure
-        parts = file_path.split(os.sep)
-        current = config["structure"]
-        for i, part in enumerate(parts[:-1]):
-            if part in current:
-                current = current[part]["children"]
-            else:
-                break
-        
-        if parts[-1] in current:
-            del current[parts[-1]]
+        def remove_file(config: Dict[str, Any]):
+            config["files"] = [f for f in config["files"] if f["path"] != file_path]
+            
+            # Remove from structure
+            parts = file_path.split(os.sep)
+            current = self._copy_structure_path(config, parts[:-1], create=False)
+            
+            if parts[-1] in current:
+                del current[parts[-1]]
         
-        # Save updated config
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
+        self._update_config(project_name, remove_file)
         
         return True
     
+    @traced()
     def list_files(self, project_name: str, directory: str = "") -> List[str]:
         """List files in a project directory."""
         project_dir = os.path.join(self.base_directory, project_name)
@@ -226,10 +281,9 @@ class ProjectManager:
         
         return files
     
+    @traced()
     def add_task(self, project_name: str, task: Dict[str, Any]) -> Dict[str, Any]:
         """Add a task to the project."""
-        config = self.get_project(project_name)
-        
         task_id = task.get("id", str(uuid.uuid4()))
         new_task = {
             "id": task_id,
@@ -241,39 +295,29 @@ class ProjectManager:
             "updated_at": datetime.now().isoformat(),
         }
         
-        config["tasks"].append(new_task)
+        def append_task(config: Dict[str, Any]):
+            config["tasks"] = config["tasks"] + [new_task]
         
-        # Save updated config
-        project_dir = os.path.join(self.base_directory, project_name)
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
+        self._update_config(project_name, append_task)
         
         return new_task
     
+    @traced()
     def update_task_status(self, project_name: str, task_id: str, status: str) -> Dict[str, Any]:
         """Update a task's status."""
-        config = self.get_project(project_name)
-        
-        task = None
-        for t in config["tasks"]:
-            if t["id"] == task_id:
-                t["status"] = status
-                t["updated_at"] = datetime.now().isoformat()
-                task = t
-                break
-        
-        if not task:
+        updated_at = datetime.now().isoformat()
+        
+        def set_status(config: Dict[str, Any]) -> Dict[str, Any]:
+            config["tasks"] = list(config["tasks"])
+            for i, t in enumerate(config["tasks"]):
+                if t["id"] == task_id:
+                    config["tasks"][i] = {**t, "status": status, "updated_at": updated_at}
+                    return config["tasks"][i]
             raise ValueError(f"Task {task_id} not found in project {project_name}")
         
-        # Save updated config
-        project_dir = os.path.join(self.base_directory, project_name)
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
-        
-        return task
+        return self._update_config(project_name, set_status)
     
+    @traced()
     def get_tasks(self, project_name: str) -> List[Dict[str, Any]]:
         """Get all tasks in a project."""
         config = self.get_project(project_name)
@@ -289,6 +333,7 @@ class ProjectManager:
         
         return None
     
+    @traced()
     def plan_project(self, project_name: str) -> Dict[str, Any]:
         """Create a project plan with tasks for team members."""
         # Create standard tasks for each team role
@@ -345,33 +390,31 @@ class ProjectManager:
         ]
         
         # Add tasks to project
-        config = self.get_project(project_name)
-        for task in tasks:
-            config["tasks"].append({
-                "id": task["id"],
-                "name": task["name"],
-                "description": task["description"],
-                "assigned_to": task["assigned_to"],
-                "status": task["status"],
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-            })
-        
-        # Save updated config
-        project_dir = os.path.join(self.base_directory, project_name)
-        config_file = os.path.join(project_dir, "project_config.json")
-        with open(config_file, "w") as f:
-            json.dump(config, f, indent=2)
+        new_tasks = [{
+            "id": task["id"],
+            "name": task["name"],
+            "description": task["description"],
+            "assigned_to": task["assigned_to"],
+            "status": task["status"],
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat(),
+        } for task in tasks]
         
-        return config
+        def append_tasks(config: Dict[str, Any]) -> Dict[str, Any]:
+            config["tasks"] = config["tasks"] + new_tasks
+            return config
+        
+        return self._update_config(project_name, append_tasks)
     
+    @timed()
+    @traced()
     def import_existing_project(self, source_dir: str, project_name: str, description: str) -> Dict[str, Any]:
         """Import an existing project directory into the manager."""
         if not os.path.exists(source_dir):
             raise FileNotFoundError(f"Source directory {source_dir} does not exist")
         
         # Create project config
-        project_config = self.create_project(project_name, description)
+        project_config = copy.deepcopy(self.create_project(project_name, description))
         
         # Copy files from source directory
         project_dir = os.path.join(self.base_directory, project_name)
@@ -436,8 +479,8 @@ class ProjectManager:
                                     content = f.read()
                                 
                                 # Write content to the destination
-                                with open(dest_path, "w", encoding="utf-8") as f:
-                                    f.write(content)
+                                self._write_content(dest_path, content, encoding="utf-8")
+                                retriever.index_artifact(project_name, rel_path, content)
                                 
                                 # Add file to project config
                                 file_info = {
@@ -474,9 +517,7 @@ class ProjectManager:
             }
             
             # Save updated config
-            config_file = os.path.join(project_dir, "project_config.json")
-            with open(config_file, "w") as f:
-                json.dump(project_config, f, indent=2)
+            self._save_config(project_name, project_config)
             
             # Set as current project
             self.current_project = project_name
@@ -484,6 +525,7 @@ class ProjectManager:
             return project_config
         except Exception as e:
             # If import fails, attempt to clean up
+            project_config_cache.discard(self._config_path(project_name))
             try:
                 if os.path.exists(project_dir):
                     shutil.rmtree(project_dir)
@@ -0,0 +1,79 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from utils.config import ModelProvider, get_model_config
+
+
+class ProviderSessionRegistry:
+    """Configures each provider SDK once and caches model handles per model and generation config"""
+
+    def __init__(self):
+        self._configs: Dict[ModelProvider, Dict[str, Any]] = {}
+        self._models: Dict[Tuple[ModelProvider, str, Tuple], Any] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "config_loads": 0,
+            "model_creations": 0,
+            "model_hits": 0,
+            "invalidations": 0,
+        }
+
+    def get_config(self, provider: ModelProvider) -> Dict[str, Any]:
+        """Get the provider configuration, loading it (and configuring the SDK) only once"""
+        config = self._configs.get(provider)
+        if config is not None:
+            return config
+
+        with self._lock:
+            if provider not in self._configs:
+                # get_gemini_config also runs genai.configure, so this happens once per load
+                self._configs[provider] = get_model_config(provider)
+                self.stats["config_loads"] += 1
+            return self._configs[provider]
+
+    def get_gemini_model(self, model: str, generation_config: Optional[Dict[str, Any]] = None):
+        """Get a cached genai.GenerativeModel for a model name and generation config"""
+        import google.generativeai as genai
+
+        config = self.get_config("gemini")
+        if generation_config is None:
+            generation_config = {
+                "temperature": config["temperature"],
+                "top_p": config["top_p"],
+                "top_k": config["top_k"],
+                "max_output_tokens": config["max_output_tokens"],
+            }
+
+        key = ("gemini", model, tuple(sorted(generation_config.items())))
+        handle = self._models.get(key)
+        if handle is not None:
+            self.stats["model_hits"] += 1
+            return handle
+
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(model, generation_config=generation_config)
+                self.stats["model_creations"] += 1
+            return self._models[key]
+
+    def invalidate(self, provider: Optional[ModelProvider] = None):
+        """Drop cached configuration and model handles for a provider, or for all providers"""
+        with self._lock:
+            if provider is None:
+                self._configs.clear()
+                self._models.clear()
+            else:
+                self._configs.pop(provider, None)
+                self._models = {key: handle for key, handle in self._models.items() if key[0] != provider}
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "configured_providers": list(self._configs.keys()),
+            "cached_models": len(self._models),
+        }
+
+
+# Create a singleton instance
+provider_sessions = ProviderSessionRegistry()
@@ -0,0 +1,240 @@
+import asyncio
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from utils.config import get_rate_limit_config
+
+
+class ProviderError(Exception):
+    """Raised when an LLM provider call fails after any retries"""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class RateLimitError(ProviderError):
+    """Raised when a provider keeps answering 429 Too Many Requests"""
+
+    def __init__(self, provider: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(provider, message, status_code=429, retryable=True, retry_after=retry_after)
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """Whether an HTTP status is worth retrying (throttling, timeouts and server errors)"""
+    return status_code in (408, 409, 429) or status_code >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse reset durations such as "1s", "6m0s", "20ms" or a plain number of seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously up to a per-minute capacity; a capacity of 0 disables it"""
+
+    def __init__(self, per_minute: float = 0):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.enabled:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.capacity / 60.0)
+        self.updated_at = now
+
+    def time_until_available(self, amount: float) -> float:
+        """Seconds to wait before amount tokens are available"""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+    def consume(self, amount: float):
+        if self.enabled:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.enabled:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_limit(self, per_minute: float):
+        """Resize the bucket, keeping the current fill level within the new capacity"""
+        if per_minute <= 0:
+            return
+        if not self.enabled:
+            self.tokens = per_minute
+        self.capacity = float(per_minute)
+        self.tokens = min(self.tokens, self.capacity)
+
+    def set_remaining(self, remaining: float):
+        """Trust the provider's view of how much is left in the current window"""
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that defers to Retry-After when the provider sends it"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number attempt (0-based)"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class ProviderRateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one provider"""
+
+    def __init__(self, provider: str, config: Optional[Dict[str, Any]] = None):
+        config = config or get_rate_limit_config(provider)
+        self.provider = provider
+        self.requests = TokenBucket(config["requests_per_minute"])
+        self.tokens = TokenBucket(config["tokens_per_minute"])
+        self.retry_policy = RetryPolicy(config["max_retries"], config["backoff_base"], config["backoff_max"])
+        self.blocked_until = 0.0
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "wait_seconds": 0.0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+        }
+
+    async def acquire(self, estimated_tokens: int = 0):
+        """Wait until a request of estimated_tokens fits in both buckets, then reserve it"""
+        throttled = False
+        while True:
+            wait = max(
+                self.blocked_until - time.monotonic(),
+                self.requests.time_until_available(1),
+                self.tokens.time_until_available(estimated_tokens),
+            )
+            if wait <= 0:
+                break
+            throttled = True
+            self.stats["wait_seconds"] += wait
+            await asyncio.sleep(wait)
+
+        if throttled:
+            self.stats["throttled"] += 1
+        self.stats["requests"] += 1
+        self.requests.consume(1)
+        self.tokens.consume(estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Return over-reserved tokens once the provider reports real usage"""
+        if actual_tokens is not None and actual_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def block_for(self, seconds: float):
+        """Pause all requests to this provider, e.g. after a 429"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Learn limits from x-ratelimit-* response headers (OpenAI and OpenRouter styles)"""
+        def header(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        limit_requests = header("x-ratelimit-limit-requests")
+        if limit_requests is None:
+            limit_requests = header("x-ratelimit-limit")
+        remaining_requests = header("x-ratelimit-remaining-requests")
+        if remaining_requests is None:
+            remaining_requests = header("x-ratelimit-remaining")
+        limit_tokens = header("x-ratelimit-limit-tokens")
+        remaining_tokens = header("x-ratelimit-remaining-tokens")
+
+        if limit_requests:
+            self.requests.set_limit(limit_requests)
+        if remaining_requests is not None:
+            self.requests.set_remaining(remaining_requests)
+        if limit_tokens:
+            self.tokens.set_limit(limit_tokens)
+        if remaining_tokens is not None:
+            self.tokens.set_remaining(remaining_tokens)
+
+        # When the window is exhausted, wait for its reset instead of burning a 429
+        if remaining_requests == 0:
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self.block_for(reset)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "requests_per_minute": self.requests.capacity or None,
+            "tokens_per_minute": self.tokens.capacity or None,
+            "blocked_for_seconds": max(0.0, self.blocked_until - time.monotonic()),
+        }
+
+
+class RateLimiterRegistry:
+    """Per-provider rate limiters shared by every client"""
+
+    def __init__(self):
+        self._limiters: Dict[str, ProviderRateLimiter] = {}
+
+    def get(self, provider: str) -> ProviderRateLimiter:
+        if provider not in self._limiters:
+            self._limiters[provider] = ProviderRateLimiter(provider)
+        return self._limiters[provider]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {provider: limiter.get_stats() for provider, limiter in self._limiters.items()}
+
+
+# Create a singleton instance
+rate_limiters = RateLimiterRegistry()
@@ -0,0 +1,48 @@
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Optional heavy dependencies whose import cost we want to keep off the startup path
+HEAVY_MODULES = ("google.generativeai", "chromadb", "openai", "litellm", "langchain", "numpy")
+
+
+class StartupReport:
+    """Records how long each startup phase took and which heavy modules were imported"""
+
+    def __init__(self):
+        # Falls back to the first mark when the process start time is unknown
+        self._started = time.perf_counter()
+        self._last = self._started
+        self.phases: List[Dict[str, Any]] = []
+        self.total_seconds: Optional[float] = None
+        self.details: Dict[str, Any] = {}
+
+    def mark(self, phase: str):
+        """Close the current phase, timing it since the previous mark"""
+        now = time.perf_counter()
+        self.phases.append({"phase": phase, "seconds": round(now - self._last, 4)})
+        self._last = now
+
+    def finish(self, **details) -> Dict[str, Any]:
+        self.total_seconds = round(time.perf_counter() - self._started, 4)
+        self.details.update(details)
+        return self.get_report()
+
+    def get_report(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": self.total_seconds,
+            "phases": list(self.phases),
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+            **self.details,
+        }
+
+    def print_report(self):
+        report = self.get_report()
+        phases = ", ".join(f"{phase['phase']} {phase['seconds']:.3f}s" for phase in report["phases"])
+        print(f"⏱️ Startup took {report['total_seconds']:.3f}s ({phases})")
+        if report["heavy_modules_loaded"]:
+            print(f"   Heavy modules loaded at startup: {', '.join(report['heavy_modules_loaded'])}")
+
+
+# Create a singleton instance
+startup_report = StartupReport()
@@ -0,0 +1,277 @@
+"""Shared mutable application state for multi-worker deployments.
+
+Agent conversation history, the selected LLM provider/models and the current project used to
+live in per-process attributes, so every uvicorn worker diverged. They now go through a
+StateStore. "memory" keeps the old single-process behaviour, while "sqlite" and "file" share
+state between all workers on a host.
+"""
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import get_state_config
+
+
+class StateStore(ABC):
+    """Namespaced key/value and append-only list storage"""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        pass
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any):
+        pass
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        pass
+
+    @abstractmethod
+    def update(self, namespace: str, key: str, updater: Callable[[Any], Any], default: Any = None) -> Any:
+        """Atomically replace a value with updater(current value) and return the new value"""
+        pass
+
+    @abstractmethod
+    def append(self, namespace: str, key: str, item: Any, max_length: Optional[int] = None):
+        """Append to a list, dropping the oldest items beyond max_length"""
+        pass
+
+    @abstractmethod
+    def get_list(self, namespace: str, key: str) -> List[Any]:
+        pass
+
+    @abstractmethod
+    def clear_list(self, namespace: str, key: str):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """Per-process state; only suitable for a single worker"""
+
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self._lists: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._values.get(f"{namespace}:{key}", default)
+
+    def set(self, namespace: str, key: str, value: Any):
+        self._values[f"{namespace}:{key}"] = value
+
+    def delete(self, namespace: str, key: str):
+        self._values.pop(f"{namespace}:{key}", None)
+
+    def update(self, namespace: str, key: str, updater: Callable[[Any], Any], default: Any = None) -> Any:
+        with self._lock:
+            value = self._values[f"{namespace}:{key}"] = updater(self._values.get(f"{namespace}:{key}", default))
+            return value
+
+    def append(self, namespace: str, key: str, item: Any, max_length: Optional[int] = None):
+        with self._lock:
+            items = self._lists.setdefault(f"{namespace}:{key}", [])
+            items.append(item)
+            if max_length and len(items) > max_length:
+                del items[:len(items) - max_length]
+
+    def get_list(self, namespace: str, key: str) -> List[Any]:
+        return list(self._lists.get(f"{namespace}:{key}", []))
+
+    def clear_list(self, namespace: str, key: str):
+        self._lists.pop(f"{namespace}:{key}", None)
+
+
+class SQLiteStateStore(StateStore):
+    """State in a SQLite database in WAL mode, shared by every process on the host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_values ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state_lists ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_state_lists_key ON state_lists (namespace, key, id)")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM state_values WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace: str, key: str, value: Any):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO state_values (namespace, key, value) VALUES (?, ?, ?)",
+            (namespace, key, json.dumps(value))
+        )
+        conn.commit()
+
+    def delete(self, namespace: str, key: str):
+        conn = self._connect()
+        conn.execute("DELETE FROM state_values WHERE namespace = ? AND key = ?", (namespace, key))
+        conn.commit()
+
+    def update(self, namespace: str, key: str, updater: Callable[[Any], Any], default: Any = None) -> Any:
+        conn = self._connect()
+        # Take the write lock before reading so no other worker can update the value in between
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM state_values WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            value = updater(json.loads(row[0]) if row else default)
+            conn.execute(
+                "INSERT OR REPLACE INTO state_values (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return value
+
+    def append(self, namespace: str, key: str, item: Any, max_length: Optional[int] = None):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO state_lists (namespace, key, value) VALUES (?, ?, ?)",
+            (namespace, key, json.dumps(item))
+        )
+        if max_length:
+            # Drop everything but the newest max_length items
+            conn.execute(
+                "DELETE FROM state_lists WHERE namespace = ? AND key = ? AND id IN ("
+                "SELECT id FROM state_lists WHERE namespace = ? AND key = ? ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                (namespace, key, namespace, key, max_length)
+            )
+        conn.commit()
+
+    def get_list(self, namespace: str, key: str) -> List[Any]:
+        rows = self._connect().execute(
+            "SELECT value FROM state_lists WHERE namespace = ? AND key = ? ORDER BY id", (namespace, key)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def clear_list(self, namespace: str, key: str):
+        conn = self._connect()
+        conn.execute("DELETE FROM state_lists WHERE namespace = ? AND key = ?", (namespace, key))
+        conn.commit()
+
+
+class FileStateStore(StateStore):
+    """State in one JSON file per namespace, guarded by an exclusive file lock across processes"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.directory, f"{namespace}.json")
+
+    @contextmanager
+    def _locked(self, namespace: str):
+        import fcntl
+
+        with self._lock, open(self._path(namespace) + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self, namespace: str) -> Dict[str, Any]:
+        try:
+            with open(self._path(namespace), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"values": {}, "lists": {}}
+
+    def _write(self, namespace: str, data: Dict[str, Any]):
+        # Write to a temporary file and rename so readers never see a partial file
+        path = self._path(namespace)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._locked(namespace):
+            return self._read(namespace)["values"].get(key, default)
+
+    def set(self, namespace: str, key: str, value: Any):
+        with self._locked(namespace):
+            data = self._read(namespace)
+            data["values"][key] = value
+            self._write(namespace, data)
+
+    def delete(self, namespace: str, key: str):
+        with self._locked(namespace):
+            data = self._read(namespace)
+            data["values"].pop(key, None)
+            self._write(namespace, data)
+
+    def update(self, namespace: str, key: str, updater: Callable[[Any], Any], default: Any = None) -> Any:
+        with self._locked(namespace):
+            data = self._read(namespace)
+            value = data["values"][key] = updater(data["values"].get(key, default))
+            self._write(namespace, data)
+            return value
+
+    def append(self, namespace: str, key: str, item: Any, max_length: Optional[int] = None):
+        with self._locked(namespace):
+            data = self._read(namespace)
+            items = data["lists"].setdefault(key, [])
+            items.append(item)
+            if max_length and len(items) > max_length:
+                del items[:len(items) - max_length]
+            self._write(namespace, data)
+
+    def get_list(self, namespace: str, key: str) -> List[Any]:
+        with self._locked(namespace):
+            return self._read(namespace)["lists"].get(key, [])
+
+    def clear_list(self, namespace: str, key: str):
+        with self._locked(namespace):
+            data = self._read(namespace)
+            data["lists"].pop(key, None)
+            self._write(namespace, data)
+
+
+def create_state_store(config: Optional[Dict[str, Any]] = None) -> StateStore:
+    """Create the state store selected by STATE_BACKEND ("memory", "sqlite" or "file")"""
+    config = config or get_state_config()
+    backend = config["backend"]
+    if backend == "sqlite":
+        return SQLiteStateStore(config["sqlite_path"])
+    if backend == "file":
+        return FileStateStore(config["file_directory"])
+    if backend == "memory":
+        return MemoryStateStore()
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+# Create a singleton instance
+state_store = create_state_store()
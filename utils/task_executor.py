@@ -0,0 +1,73 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional
+
+from utils.config import get_executor_config
+
+
+class AgentTaskExecutor:
+    """Runs agent tasks concurrently with a concurrency limit and a per-agent timeout"""
+
+    def __init__(self, max_concurrency: Optional[int] = None, task_timeout: Optional[float] = None):
+        config = get_executor_config()
+        self.max_concurrency = max(1, max_concurrency or config["max_concurrency"])
+        self.task_timeout = task_timeout if task_timeout is not None else config["task_timeout"]
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, role: str, agent: Any, task: str) -> Dict[str, Any]:
+        """Run a single agent task and describe how it finished"""
+        async with semaphore:
+            print(f"🛠️ [{role}] Task: {task} ...")
+            started = time.perf_counter()
+            try:
+                # A timeout of 0 disables it
+                result = await asyncio.wait_for(agent.execute(task), timeout=self.task_timeout or None)
+            except asyncio.TimeoutError:
+                elapsed = time.perf_counter() - started
+                print(f"⏱️ [{role}] Task timed out after {elapsed:.2f}s")
+                return {"status": "timeout", "error": f"Timed out after {self.task_timeout}s", "seconds": elapsed}
+            except Exception as e:
+                elapsed = time.perf_counter() - started
+                print(f"❌ [{role}] Task failed: {str(e)}")
+                return {"status": "error", "error": str(e), "seconds": elapsed}
+
+            elapsed = time.perf_counter() - started
+            # BaseAgent.execute returns False when the agent raised internally
+            if result is False:
+                print(f"❌ [{role}] Task failed")
+                return {"status": "error", "error": "Agent failed to execute the task", "seconds": elapsed}
+
+            print(f"✅ [{role}] Task completed in {elapsed:.2f}s!")
+            return {"status": "success", "result": result, "seconds": elapsed}
+
+    async def run(self, agents: Dict[str, Any], tasks: Dict[str, str]) -> Dict[str, Any]:
+        """Run every agent's task concurrently and collect results, errors and timings.
+
+        Cancelling the caller cancels all in-flight agent tasks.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+
+        roles = list(agents.keys())
+        outcomes = await asyncio.gather(*[
+            self._run_one(semaphore, role, agents[role], tasks.get(role, "No specific task assigned."))
+            for role in roles
+        ])
+
+        results = {}
+        errors = {}
+        timings = {}
+        for role, outcome in zip(roles, outcomes):
+            timings[role] = round(outcome["seconds"], 4)
+            if outcome["status"] == "success":
+                results[role] = outcome["result"]
+            else:
+                errors[role] = {"status": outcome["status"], "error": outcome["error"]}
+
+        return {
+            "results": results,
+            "errors": errors,
+            "timings": timings,
+            "total_seconds": round(time.perf_counter() - started, 4),
+            "max_concurrency": self.max_concurrency,
+            "task_timeout": self.task_timeout,
+        }
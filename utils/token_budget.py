@@ -0,0 +1,148 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Average characters per token when no tokenizer is available for a provider
+CHARS_PER_TOKEN = {
+    "gemini": 4.0,
+    "deepseek": 3.6,
+    "llama3": 3.8,
+    "openrouter": 3.8,
+    "openai": 4.0,
+    "mock": 4.0,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.8
+
+# Providers whose models use (or closely match) the cl100k_base vocabulary
+TIKTOKEN_PROVIDERS = ("openai", "deepseek", "openrouter")
+
+TRUNCATION_MARKER = " …"
+
+_encodings: Dict[str, Any] = {}
+
+
+def _get_encoding(name: str = "cl100k_base"):
+    if name not in _encodings:
+        _encodings[name] = tiktoken.get_encoding(name)
+    return _encodings[name]
+
+
+def estimate_tokens(text: str, provider: Optional[str] = None, model: Optional[str] = None) -> int:
+    """Estimate how many tokens a provider/model will count for text"""
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE and provider in TIKTOKEN_PROVIDERS:
+        try:
+            return len(_get_encoding().encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    ratio = CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+    return max(1, int(len(text) / ratio + 0.5))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, provider: Optional[str] = None, model: Optional[str] = None) -> str:
+    """Cut text down to roughly max_tokens, keeping the beginning"""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text, provider, model) <= max_tokens:
+        return text
+    ratio = CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+    end = int(max_tokens * ratio)
+    # Tokenizer counts can exceed the character estimate, so shrink until it fits
+    while end > 0 and estimate_tokens(text[:end], provider, model) > max_tokens:
+        end = int(end * 0.9)
+    return text[:end].rstrip() + TRUNCATION_MARKER
+
+
+class ContextBudget:
+    """Fits prioritized context sections into a fixed token budget.
+
+    Sections are added with a priority (lower is more important). build() keeps the most
+    important sections whole, trims the first one that does not fit, and drops the rest.
+    """
+
+    def __init__(self, max_tokens: int, provider: Optional[str] = None, model: Optional[str] = None,
+                 max_section_tokens: Optional[int] = None):
+        self.max_tokens = max_tokens
+        self.provider = provider
+        self.model = model
+        self.max_section_tokens = max_section_tokens
+        self._sections: List[Tuple[int, int, str, str]] = []
+        self.stats = {"sections": 0, "included": 0, "trimmed": 0, "dropped": 0,
+                      "requested_tokens": 0, "used_tokens": 0}
+
+    def add(self, name: str, text: str, priority: int = 0):
+        if text:
+            self._sections.append((priority, len(self._sections), name, text))
+
+    def build(self, separator: str = "\n") -> str:
+        parts = []
+        remaining = self.max_tokens
+        separator_tokens = estimate_tokens(separator, self.provider, self.model) if separator.strip() else 0
+        self.stats["sections"] = len(self._sections)
+
+        for _, _, name, text in sorted(self._sections):
+            tokens = estimate_tokens(text, self.provider, self.model)
+            self.stats["requested_tokens"] += tokens
+
+            if self.max_section_tokens and tokens > self.max_section_tokens:
+                text = truncate_to_tokens(text, self.max_section_tokens, self.provider, self.model)
+                tokens = estimate_tokens(text, self.provider, self.model)
+                self.stats["trimmed"] += 1
+
+            if tokens + separator_tokens > remaining:
+                # Trim the section into the space left if enough of it would survive to be useful
+                if remaining >= 32:
+                    text = truncate_to_tokens(text, remaining - separator_tokens, self.provider, self.model)
+                    tokens = estimate_tokens(text, self.provider, self.model)
+                    self.stats["trimmed"] += 1
+                else:
+                    self.stats["dropped"] += 1
+                    continue
+
+            parts.append(text)
+            remaining -= tokens + separator_tokens
+            self.stats["included"] += 1
+
+        self.stats["used_tokens"] = self.max_tokens - remaining
+        return separator.join(parts)
+
+
+class TokenUsageTracker:
+    """Per-request prompt/completion token accounting, aggregated by provider/model and agent"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_model: Dict[str, Dict[str, int]] = {}
+        self._by_agent: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _add(bucket: Dict[str, Dict[str, int]], key: str, prompt_tokens: int, completion_tokens: int):
+        totals = bucket.setdefault(key, {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "max_prompt_tokens": 0})
+        totals["requests"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["max_prompt_tokens"] = max(totals["max_prompt_tokens"], prompt_tokens)
+
+    def record(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int, agent: Optional[str] = None):
+        with self._lock:
+            self._add(self._by_model, f"{provider}/{model}", prompt_tokens, completion_tokens)
+            if agent:
+                self._add(self._by_agent, agent, prompt_tokens, completion_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tokenizer": "tiktoken" if TIKTOKEN_AVAILABLE else "heuristic",
+                "by_model": {key: dict(value) for key, value in self._by_model.items()},
+                "by_agent": {key: dict(value) for key, value in self._by_agent.items()},
+            }
+
+
+# Create a singleton instance
+token_usage = TokenUsageTracker()
@@ -0,0 +1,308 @@
+"""Lightweight request tracing with OpenTelemetry-style spans.
+
+Spans nest through a context variable, so a trace started by the HTTP middleware follows the
+request through agents, shared memory, the project manager and LLM calls (including work
+moved to threads with asyncio.to_thread). Finished traces are exported as JSON lines or
+OTLP/HTTP JSON, and traces slower than TRACING_SLOW_THRESHOLD are written to the slow-request
+log with their span breakdown.
+"""
+import functools
+import inspect
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import get_tracing_config
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.is_root = False
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        start_ns = int(self.start_time * 1e9)
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((self.duration or 0) * 1e9)),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.status == "error" else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _ExportWorker:
+    """Writes finished traces from a background thread so exporting never blocks a request"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=1000)
+        self._thread: Optional[threading.Thread] = None
+        self._client = None
+        self.dropped = 0
+
+    def submit(self, spans: List[Span]):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                if self.config["exporter"] == "file":
+                    self._write_file(spans)
+                elif self.config["exporter"] == "otlp":
+                    self._post_otlp(spans)
+            except Exception as e:
+                print(f"Error exporting trace: {str(e)}")
+
+    def _write_file(self, spans: List[Span]):
+        path = self.config["file_path"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def _post_otlp(self, spans: List[Span]):
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.Client(timeout=5.0)
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.config["service_name"]}}
+                ]},
+                "scopeSpans": [{"scope": {"name": "avatar-team"}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        }
+        self._client.post(self.config["otlp_endpoint"], json=payload).raise_for_status()
+
+
+class Tracer:
+    """Creates spans, collects them per trace and hands finished traces to the exporter"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = config or get_tracing_config()
+        self.enabled = self.config["enabled"]
+        self._traces: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+        self._exporter = _ExportWorker(self.config)
+        self.recent_slow: List[Dict[str, Any]] = []
+        self.stats = {"traces": 0, "spans": 0, "slow_traces": 0}
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = _current_span.get()
+        return span.trace_id if span else None
+
+    def set_attribute(self, key: str, value: Any):
+        """Set an attribute on the current span, if there is one"""
+        span = _current_span.get()
+        if span is not None:
+            span.set_attribute(key, value)
+
+    def start_span(self, name: str, traceparent: Optional[str] = None, **attributes) -> Span:
+        """Start a span under the current span, or a new trace (continuing traceparent if given)"""
+        parent = _current_span.get()
+        if parent is not None:
+            span = Span(name, parent.trace_id, parent.span_id, attributes)
+        else:
+            match = TRACEPARENT_PATTERN.match(traceparent or "")
+            trace_id, parent_id = (match.group(1), match.group(2)) if match else (secrets.token_hex(16), None)
+            span = Span(name, trace_id, parent_id, attributes)
+            span.is_root = True
+        with self._lock:
+            # Work that outlives its root span (e.g. background tasks) is not collected
+            if parent is None or span.trace_id in self._traces:
+                self._traces.setdefault(span.trace_id, []).append(span)
+        return span
+
+    def end_span(self, span: Span):
+        span.finish()
+        if span.is_root:
+            self._finish_trace(span)
+
+    @contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, **attributes):
+        """Trace a with-block as a span that is the current span for everything called inside it"""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, traceparent, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator that wraps a sync or async function in a span"""
+        def decorator(func: Callable):
+            span_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inject_headers(self, headers: Dict[str, str]) -> Dict[str, str]:
+        """Add a W3C traceparent header for the current span to outgoing request headers"""
+        span = _current_span.get()
+        if span is not None:
+            headers["traceparent"] = span.traceparent
+        return headers
+
+    def _finish_trace(self, root: Span):
+        with self._lock:
+            spans = self._traces.pop(root.trace_id, [])
+            self.stats["traces"] += 1
+            self.stats["spans"] += len(spans)
+
+        if self.config["exporter"] in ("file", "otlp"):
+            self._exporter.submit(spans)
+
+        if root.duration >= self.config["slow_threshold"]:
+            self._log_slow_trace(root, spans)
+
+    def _log_slow_trace(self, root: Span, spans: List[Span]):
+        breakdown = format_breakdown(spans)
+        self.stats["slow_traces"] += 1
+        self.recent_slow = (self.recent_slow + [{
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "duration": root.duration,
+            "timestamp": datetime.fromtimestamp(root.start_time).isoformat(),
+            "spans": [span.to_dict() for span in spans],
+        }])[-20:]
+
+        report = f"🐢 Slow request {root.name} took {root.duration:.3f}s (trace {root.trace_id})\n{breakdown}"
+        print(report)
+        path = self.config["slow_log_path"]
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with open(path, "a") as f:
+                    f.write(f"{datetime.now().isoformat()} {report}\n")
+            except OSError as e:
+                print(f"Error writing slow request log: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "exporter": self.config["exporter"],
+            "slow_threshold": self.config["slow_threshold"],
+            "open_traces": len(self._traces),
+            "dropped_exports": self._exporter.dropped,
+            **self.stats,
+        }
+
+
+def format_breakdown(spans: List[Span]) -> str:
+    """Render spans as an indented tree with durations and share of the root span"""
+    children: Dict[Optional[str], List[Span]] = {}
+    ids = {span.span_id for span in spans}
+    roots = []
+    for span in spans:
+        if span.parent_id in ids:
+            children.setdefault(span.parent_id, []).append(span)
+        else:
+            roots.append(span)
+
+    lines = []
+
+    def render(span: Span, depth: int, total: float):
+        duration = span.duration or 0.0
+        share = (duration / total * 100) if total else 0.0
+        error = f" [{span.error}]" if span.error else ""
+        lines.append(f"{'  ' * depth}- {span.name}: {duration * 1000:.1f}ms ({share:.0f}%){error}")
+        for child in sorted(children.get(span.span_id, []), key=lambda s: s.start_time):
+            render(child, depth + 1, total)
+
+    for root in roots:
+        render(root, 0, root.duration or 0.0)
+    return "\n".join(lines)
+
+
+# Create a singleton instance
+tracer = Tracer()
+traced = tracer.traced